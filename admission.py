@@ -0,0 +1,108 @@
+# Priority-aware admission control
+# Requests are split into classes - ingest, point reads and bulk scans - and
+# each class has its own concurrency limit and queue timeout. A request waits
+# for a slot of its class; if none frees up within the timeout it is rejected
+# with 503 so clients back off instead of piling up on worker threads.
+#
+# Scans are deprioritised: a scan does not start while ingest requests are
+# queued, and only one scan runs at a time once ingest uses half its slots.
+
+import os
+import threading
+import time
+
+from metrics import registry as metrics
+
+INGEST = 'ingest'
+READ = 'read'
+SCAN = 'scan'
+CLASSES = (INGEST, READ, SCAN)
+
+
+class AdmissionRejected(Exception):
+    # No slot became free within the class's queue timeout
+
+    def __init__(self, request_class, retry_after=1):
+        super().__init__(f'Server busy: {request_class} requests are queued too long, retry later')
+        self.request_class = request_class
+        self.status = 503
+        self.retry_after = retry_after
+
+
+class RequestClass:
+
+    def __init__(self, name, concurrency, queue_timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.queued = 0
+
+
+class AdmissionController:
+    # Per-class slots behind one condition so releases can wake any class
+
+    def __init__(self, limits):
+        # limits: {class: (concurrency, queue_timeout seconds)}
+        self.classes = {name: RequestClass(name, *limits[name]) for name in CLASSES}
+        self._cond = threading.Condition()
+
+    def _can_run(self, request_class):
+        if request_class.running >= request_class.concurrency:
+            return False
+        if request_class.name == SCAN:
+            ingest = self.classes[INGEST]
+            if ingest.queued:
+                return False
+            if ingest.running * 2 >= ingest.concurrency and request_class.running >= 1:
+                return False
+        return True
+
+    def acquire(self, name):
+        # Wait for a slot - raises AdmissionRejected after the queue timeout
+        request_class = self.classes[name]
+        started = time.perf_counter()
+        with self._cond:
+            if not self._can_run(request_class):
+                request_class.queued += 1
+                try:
+                    admitted = self._cond.wait_for(lambda: self._can_run(request_class), request_class.queue_timeout)
+                finally:
+                    request_class.queued -= 1
+                if not admitted:
+                    metrics.inc('admission_requests_total', (name, 'rejected'))
+                    # Queued scans may be waiting on this class's queue to drain
+                    self._cond.notify_all()
+                    raise AdmissionRejected(name)
+            request_class.running += 1
+        metrics.observe('admission_queue_seconds', (name,), time.perf_counter() - started)
+        metrics.inc('admission_requests_total', (name, 'admitted'))
+
+    def release(self, name):
+        with self._cond:
+            self.classes[name].running -= 1
+            self._cond.notify_all()
+
+    def gauges(self):
+        # Current in-flight and queued requests per class for /metrics
+        with self._cond:
+            classes = list(self.classes.values())
+            return [
+                ('admission_in_flight', 'Requests running per admission class',
+                 [((('class', c.name),), c.running) for c in classes]),
+                ('admission_queued', 'Requests waiting for a slot per admission class',
+                 [((('class', c.name),), c.queued) for c in classes]),
+            ]
+
+
+def create_admission_controller():
+    # ADMISSION_<CLASS>_CONCURRENCY and ADMISSION_<CLASS>_QUEUE_TIMEOUT_MS per class
+    defaults = {INGEST: (64, 5000), READ: (32, 2000), SCAN: (2, 10000)}
+    limits = {}
+    for name, (concurrency, timeout_ms) in defaults.items():
+        prefix = f'ADMISSION_{name.upper()}_'
+        limits[name] = (
+            int(os.getenv(prefix + 'CONCURRENCY', str(concurrency))),
+            float(os.getenv(prefix + 'QUEUE_TIMEOUT_MS', str(timeout_ms))) / 1000,
+        )
+    return AdmissionController(limits)
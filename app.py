@@ -1,47 +1,515 @@
-import sqlite3
+import time
+IMPORT_STARTED = time.perf_counter()  # Module import time is reported by GET /health/ready
+
+import atexit
+import base64
+import json
 import os
-from datetime import datetime
+import signal
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
 from functools import wraps
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
+from storage import (
+    DELTA_FIELDS, NOT_FOUND, PREFIX, SEARCH_MIN_SUBSTRING, SEARCH_SORT_COLUMNS, SUBSTRING, UPDATED,
+    SQLiteStatusStore, create_store, utc_now
+)
+from fleet_table import FleetTable, load_numpy, timestamp_to_epoch
+from ingest_log import create_ingest_log
+import bulk
+import click
+import snapshot
+import backup
+import replication
+import metrics
+import migrations
+from profiling import create_profiler, phase
+from json_provider import SummaryFragmentCache, create_json_provider
+from ingest_formats import PayloadError, decode_payload
+from compression import ResponseCompressor, decompress_body
+from registry import DeviceRegistry, GroupAggregates, validate_registration
+from tenants import DEFAULT_TENANT, Partition, QuotaExceeded, create_tenant_manager
+from startup import DeferredListener, Warmup
+from health import FAILING, create_health_monitor
+from admission import INGEST, READ, SCAN, AdmissionRejected, create_admission_controller
+from dedup import BLOOM, LRU, create_dedup_index
+from clock_skew import CLAMPED, REJECTED, create_skew_tracker
 
 app = Flask(__name__)
+app.json = create_json_provider(app)  # orjson when installed (JSON_ENCODER=auto|orjson|stdlib)
 
 # Database setup
-DATABASE = 'device_status.db'
+DATABASE = os.getenv('DATABASE_PATH', 'device_status.db')
+
+# Storage backend (STORAGE_BACKEND=sqlite|memory)
+store = create_store(DATABASE)
+
+# Optional columnar mirror of device_status for fleet-wide aggregates
+fleet_table = None
+fleet_table_listener = None
+if os.getenv('FLEET_TABLE', '').lower() in ('1', 'true', 'yes'):
+    fleet_table = FleetTable()
+    fleet_table_listener = DeferredListener(fleet_table.upsert)
+    store.add_listener(fleet_table_listener)
+
+# Optional write-ahead ingest log (INGEST_LOG_PATH) - truncated once it
+# grows past INGEST_LOG_MAX_BYTES and everything in it is in storage
+ingest_log = create_ingest_log()
+INGEST_LOG_MAX_BYTES = int(os.getenv('INGEST_LOG_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Columnar snapshots for analytics (SNAPSHOT_INTERVAL seconds enables the schedule)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+SNAPSHOT_FORMAT = os.getenv('SNAPSHOT_FORMAT', 'parquet')
+snapshot_scheduler = None
+if os.getenv('SNAPSHOT_INTERVAL'):
+    snapshot_scheduler = snapshot.SnapshotScheduler(
+        store, SNAPSHOT_DIR, float(os.getenv('SNAPSHOT_INTERVAL')), SNAPSHOT_FORMAT, logger=app.logger
+    )
+
+# Online SQLite backups (BACKUP_INTERVAL seconds enables the schedule)
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+BACKUP_PAGES = int(os.getenv('BACKUP_PAGES', '256'))
+BACKUP_SLEEP_MS = float(os.getenv('BACKUP_SLEEP_MS', '5'))
+backup_scheduler = None
+if os.getenv('BACKUP_INTERVAL'):
+    backup_scheduler = backup.BackupScheduler(
+        lambda: backup_database_paths(), BACKUP_DIR, float(os.getenv('BACKUP_INTERVAL')),
+        BACKUP_KEEP, BACKUP_PAGES, BACKUP_SLEEP_MS / 1000, logger=app.logger
+    )
+
+# Metrics - METRICS_DIR merges counters across worker processes
+metrics_exporter = None
+if os.getenv('METRICS_DIR'):
+    metrics_exporter = metrics.ProcessExporter(
+        metrics.registry, os.getenv('METRICS_DIR'), float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+    )
+
+# Opt-in phase timing, slow-request log and sampling profiler
+profiler = create_profiler()
+
+# Pre-encoded summary fragments (SUMMARY_FRAGMENT_CACHE=1), invalidated on upsert
+# Per process: only enable it when a single process serves reads and writes
+summary_cache = None
+if os.getenv('SUMMARY_FRAGMENT_CACHE', '').lower() in ('1', 'true', 'yes'):
+    summary_cache = SummaryFragmentCache(lambda row: format_summary_device(row))
+    store.add_listener(summary_cache.invalidate)
+
+# Device registry (metadata, tags, groups) and per-group aggregates kept on ingest
+registry = DeviceRegistry(os.getenv('REGISTRY_PATH', DATABASE))
+group_aggregates = GroupAggregates()
+group_aggregates_listener = DeferredListener(group_aggregates.update)
+store.add_listener(group_aggregates_listener)
+
+# Largest batch accepted by POST /status/batch
+BATCH_MAX_READINGS = int(os.getenv('BATCH_MAX_READINGS', '10000'))
+
+# Most device ids resolved by one POST /status/query or GET /status?ids=
+QUERY_MAX_IDS = int(os.getenv('QUERY_MAX_IDS', '1000'))
+
+# Largest page returned by GET /status/search
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', '1000'))
+
+# Compressed request bodies may expand to at most MAX_DECOMPRESSED_BYTES
+MAX_DECOMPRESSED_BYTES = int(os.getenv('MAX_DECOMPRESSED_BYTES', str(64 * 1024 * 1024)))
+
+# gzip/zstd responses from COMPRESS_MIN_BYTES up (RESPONSE_COMPRESSION=0 disables)
+response_compressor = None
+if os.getenv('RESPONSE_COMPRESSION', '1').lower() in ('1', 'true', 'yes'):
+    response_compressor = ResponseCompressor(int(os.getenv('COMPRESS_MIN_BYTES', '1024')))
+
+# Schema backfills run in the background after startup (MIGRATION_BACKFILL=0 leaves them to `flask migrate`)
+MIGRATION_BACKFILL = os.getenv('MIGRATION_BACKFILL', '1').lower() in ('1', 'true', 'yes')
+MIGRATION_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '1000'))
+MIGRATION_PAUSE_MS = float(os.getenv('MIGRATION_PAUSE_MS', '10'))
+backfill_runner = None
+shutdown_registered = False
 
 # API Key configuration
 VALID_API_KEYS = os.getenv('API_KEYS', 'dev-key-123,test-key-456').split(',')
 
+# Tenants by API key (API_KEY_TENANTS) with per-tenant partitions and quotas
+tenants = create_tenant_manager(VALID_API_KEYS)
+
+# Leader/follower replication of the main store (REPLICATION_ROLE=leader|follower)
+# Followers tail REPLICATION_LEADER_URL, serve reads locally and reject writes
+REPLICATION_ROLE = os.getenv('REPLICATION_ROLE', '').lower()
+change_log = None
+follower = None
+if REPLICATION_ROLE == 'leader':
+    change_log = replication.ChangeLog(int(os.getenv('REPLICATION_LOG_SIZE', '100000')))
+    store.add_listener(change_log.append)
+elif REPLICATION_ROLE == 'follower':
+    follower = replication.Follower(
+        store, os.environ['REPLICATION_LEADER_URL'], os.getenv('REPLICATION_API_KEY', VALID_API_KEYS[0]),
+        poll_wait=float(os.getenv('REPLICATION_POLL_WAIT', '5')), logger=app.logger
+    )
+
+# Start-up warm-up (STARTUP_WARMUP=sync|background) - not ready until init_db has run it
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'sync').lower()
+warmup = Warmup(app.logger)
+
+# Per-class concurrency limits and queue timeouts for ingest, point reads and
+# scans (ADMISSION_<CLASS>_CONCURRENCY, ADMISSION_<CLASS>_QUEUE_TIMEOUT_MS)
+admission = None
+if os.getenv('ADMISSION_CONTROL', '1').lower() in ('1', 'true', 'yes'):
+    admission = create_admission_controller()
+
+# Index of ingested Idempotency-Key / message_id values so retried readings are
+# answered without a write (DEDUP_INDEX=0 disables it). DEDUP_PATH keeps its
+# Bloom filter across restarts, saved every DEDUP_SAVE_INTERVAL seconds.
+dedup_index = create_dedup_index()
+DEDUP_SAVE_INTERVAL = float(os.getenv('DEDUP_SAVE_INTERVAL', '5'))
+MESSAGE_ID_MAX_LENGTH = 128
+
+# Per-device clock skew against server receive time (CLOCK_SKEW_MODE=observe|reject|clamp|off)
+# Devices at least CLOCK_SKEW_REPORT_SECONDS off are counted on /metrics and
+# listed per tenant by GET /clock-skew
+skew_tracker = create_skew_tracker()
+CLOCK_SKEW_REPORT_SECONDS = float(os.getenv('CLOCK_SKEW_REPORT_SECONDS', '60'))
+
+# Cached database probes for GET /health/ready (HEALTH_PROBE_INTERVAL, HEALTH_MAX_*)
+health_monitor = create_health_monitor(lambda: sqlite_database_paths(), lambda: pending_writes())
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
 def require_api_key(f):
     # Decorator to require API key authentication
+    # Also resolves the key's tenant and holds one of its in-flight slots
     @wraps(f)
     def decorated(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        if not api_key:
-            return jsonify({'error': 'Missing API key header (X-API-Key)'}), 401
-        if api_key not in VALID_API_KEYS:
-            return jsonify({'error': 'Invalid API key'}), 401
+        with phase('auth'):
+            api_key = request.headers.get('X-API-Key')
+            if not api_key:
+                return jsonify({'error': 'Missing API key header (X-API-Key)'}), 401
+            if api_key not in VALID_API_KEYS:
+                return jsonify({'error': 'Invalid API key'}), 401
+            g.tenant = tenants.tenant_for_key(api_key)
+            try:
+                tenants.enter(g.tenant)
+            except QuotaExceeded as e:
+                return quota_response(e)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            tenants.leave(g.tenant)
+    return decorated
+
+def leader_only(f):
+    # Decorator rejecting writes on a read-only follower
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if follower is not None:
+            return jsonify({'error': f'Read-only replica - send writes to {follower.leader_url}'}), 403
         return f(*args, **kwargs)
     return decorated
 
+def admit(request_class):
+    # Decorator holding an admission slot of request_class while the view runs
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if admission is None:
+                return f(*args, **kwargs)
+            with phase('admission'):
+                try:
+                    admission.acquire(request_class)
+                except AdmissionRejected as e:
+                    return quota_response(e)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                admission.release(request_class)
+        return decorated
+    return decorator
+
+def quota_response(error):
+    response = jsonify({'error': str(error)})
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+def is_default_tenant():
+    return g.get('tenant', DEFAULT_TENANT) == DEFAULT_TENANT
+
+def current_partition():
+    # Storage of the request's tenant - the main store for the default tenant
+    if is_default_tenant():
+        return Partition(store, registry, group_aggregates)
+    return tenants.partition(g.tenant)
+
+def sqlite_database_paths():
+    # SQLite files holding device_status: the main store and tenant partitions
+    stores = [store] + [tenants.partition(tenant).store for tenant in tenants.tenant_names()]
+    return [candidate.path for candidate in stores if isinstance(candidate, SQLiteStatusStore)]
+
+def backup_database_paths():
+    # Every SQLite file holding state: device status, partitions and a separate registry
+    # The in-memory backend is checkpointed first and its checkpoint file backed up
+    paths = sqlite_database_paths()
+    checkpoint_path = getattr(store, 'checkpoint_path', None)
+    if checkpoint_path:
+        store.flush()
+        paths.insert(0, checkpoint_path)
+    if registry.path not in paths:
+        paths.append(registry.path)
+    return paths
+
+def pending_writes():
+    # Readings accepted but not yet applied to the main store and partitions
+    # With the ingest log, every logged reading counts until it is stored
+    queued = ingest_log.pending() if ingest_log is not None else store.pending_writes()
+    return queued + sum(tenants.partition(tenant).store.pending_writes() for tenant in tenants.tenant_names())
+
 def init_db():
-    # Init the database with device_status table
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS device_status (
-            device_id TEXT PRIMARY KEY,
-            timestamp TEXT NOT NULL,
-            battery_level INTEGER NOT NULL,
-            rssi INTEGER NOT NULL,
-            online BOOLEAN NOT NULL,
-            created_at TEXT NOT NULL
+    # Init the configured storage backend (migrates the SQLite schema to the latest version)
+    # then warm caches inline or, with STARTUP_WARMUP=background, on a thread
+    global backfill_runner, warmup
+    store.initialize()
+    register_shutdown()
+    registry.initialize()
+    if ingest_log is not None:
+        replay_ingest_log()
+    for tenant in tenants.tenant_names():
+        tenants.partition(tenant)
+    warmup = create_warmup()
+    warmup.start(background=STARTUP_WARMUP == 'background')
+    if MIGRATION_BACKFILL and backfill_runner is None:
+        backfill_runner = migrations.BackfillRunner(
+            sqlite_database_paths(), MIGRATION_BATCH_SIZE, MIGRATION_PAUSE_MS / 1000, logger=app.logger
         )
-    ''')
+        backfill_runner.start()
+    if snapshot_scheduler is not None:
+        snapshot_scheduler.start()
+    if backup_scheduler is not None:
+        backup_scheduler.start()
+    if follower is not None:
+        follower.start()
+    if metrics_exporter is not None:
+        metrics_exporter.start()
+    if dedup_index is not None:
+        dedup_index.start(DEDUP_SAVE_INTERVAL)
+
+def register_shutdown():
+    # Close the stores when the process exits, so an in-memory store writes a
+    # final checkpoint. SIGTERM normally ends the process without running
+    # atexit hooks; unless a server installed its own handler, it exits instead.
+    global shutdown_registered
+    if shutdown_registered:
+        return
+    shutdown_registered = True
+    atexit.register(close_stores)
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+def close_stores():
+    store.close()
+    tenants.close()
+
+def create_warmup():
+    # Steps run before GET /health/ready reports ready
+    steps = Warmup(app.logger)
+    steps.add('statements', warm_up_stores)
+    if fleet_table is not None:
+        steps.add('fleet_table', load_fleet_table)
+    steps.add('group_aggregates', load_group_aggregates)
+    if summary_cache is not None:
+        steps.add('summary_cache', lambda: summary_cache.render(store))
+    return steps
+
+def warm_up_stores():
+    # Open pooled connections and prepare their statements
+    store.warm_up()
+    for tenant in tenants.tenant_names():
+        tenants.partition(tenant).store.warm_up()
+
+def load_fleet_table():
+    # Fill the columnar mirror; upserts during the scan are applied after it
+    load_numpy()
+    fleet_table_listener.hold()
+    try:
+        for row in store.iterate_all():
+            fleet_table.upsert(row)
+    finally:
+        fleet_table_listener.release()
+
+def load_group_aggregates():
+    group_aggregates_listener.hold()
+    try:
+        group_aggregates.load(registry.memberships(), store)
+    finally:
+        group_aggregates_listener.release()
+
+def replay_ingest_log():
+    # Apply readings acknowledged before a crash, then truncate the log
+    batch = []
+    replayed = 0
+    for row in ingest_log.replay():
+        if row.pop('delta', False):
+            # Partial readings apply on top of everything logged before them
+            if batch:
+                replayed += store.apply_rows(batch)
+                batch = []
+            replayed += store.update_fields(row, row['created_at']) == UPDATED
+            continue
+        batch.append(row)
+        if len(batch) >= 1000:
+            replayed += store.apply_rows(batch)
+            batch = []
+    if batch:
+        replayed += store.apply_rows(batch)
+    ingest_log.checkpoint(store.flush)
+    return replayed
+
+def read_payload(allow_struct=False):
+    # Decode the request body by Content-Type (JSON, MessagePack, CBOR, struct frames)
+    # and Content-Encoding (gzip, zstd)
+    encoding = request.headers.get('Content-Encoding', 'identity')
+    if encoding.lower() == 'identity':
+        if request.mimetype in ('', 'application/json'):
+            return request.get_json()
+        return decode_payload(request.get_data(cache=False), request.mimetype, allow_struct)
     
-    conn.commit()
-    conn.close()
+    body = decompress_body(request.stream, encoding, MAX_DECOMPRESSED_BYTES)
+    if request.mimetype in ('', 'application/json'):
+        try:
+            return app.json.loads(body)
+        except ValueError:
+            raise PayloadError('Invalid JSON body')
+    return decode_payload(body, request.mimetype, allow_struct)
+
+def store_reading(data):
+    # Persist a validated reading, logging it first when the ingest log is on
+    # The ingest log replays into the main store, so it covers the default tenant only
+    created_at = utc_now()
+    if ingest_log is None or not is_default_tenant():
+        current_partition().store.upsert(data, created_at)
+        return
+    
+    ingest_log.append(data, created_at)
+    try:
+        store.upsert(data, created_at)
+    finally:
+        ingest_log.done()
+    
+    if ingest_log.size() > INGEST_LOG_MAX_BYTES:
+        ingest_log.checkpoint(store.flush)
+
+def store_delta(data):
+    # Apply a validated partial reading, logging it first when the ingest log is on
+    # Returns UPDATED, UNCHANGED or NOT_FOUND
+    created_at = utc_now()
+    if ingest_log is None or not is_default_tenant():
+        return current_partition().store.update_fields(data, created_at)
+    
+    ingest_log.append(dict(data, delta=True), created_at)
+    try:
+        result = store.update_fields(data, created_at)
+    finally:
+        ingest_log.done()
+    
+    if ingest_log.size() > INGEST_LOG_MAX_BYTES:
+        ingest_log.checkpoint(store.flush)
+    return result
+
+def idempotency_header():
+    # Idempotency-Key request header, or None when not sent
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= MESSAGE_ID_MAX_LENGTH:
+        raise PayloadError(f'Idempotency-Key must be 1 to {MESSAGE_ID_MAX_LENGTH} characters')
+    return key
+
+def dedup_key(data, default=None):
+    # Tenant-scoped idempotency key of a reading: its message_id, else default
+    key = data.get('message_id') or default
+    if dedup_index is None or key is None:
+        return None
+    return f'{g.tenant}/{key}'
+
+def find_duplicates(keyed):
+    # Flags for (key, reading) pairs whose reading was already ingested
+    # LRU hits are certain. Bloom hits are confirmed against the stored reading:
+    # a stored timestamp at or after the reading's means it was applied before
+    # (or would roll the device back); otherwise it was a false positive.
+    duplicates = [False] * len(keyed)
+    probable = []
+    seen = set()
+    for index, (key, data) in enumerate(keyed):
+        if key is None:
+            continue
+        if key in seen:
+            duplicates[index] = True  # Repeated within one batch
+            continue
+        seen.add(key)
+        result = dedup_index.check(key)
+        if result == LRU:
+            duplicates[index] = True
+            metrics.registry.inc('ingest_dedup_total', (LRU,))
+        elif result == BLOOM:
+            probable.append(index)
+        else:
+            metrics.registry.inc('ingest_dedup_total', ('new',))
+    if probable:
+        stored = current_partition().store.get_many([keyed[index][1]['device_id'] for index in probable])
+        for index in probable:
+            data = keyed[index][1]
+            row = stored.get(data['device_id'])
+            if row is not None and timestamp_to_epoch(row['timestamp']) >= timestamp_to_epoch(data['timestamp']):
+                duplicates[index] = True
+                metrics.registry.inc('ingest_dedup_total', (BLOOM,))
+            else:
+                metrics.registry.inc('ingest_dedup_total', ('false_positive',))
+    return duplicates
+
+def check_clock(data, received):
+    # Compare a reading's timestamp with the server receive time (epoch seconds)
+    # Returns an error message when the reading is rejected; a clamped reading
+    # gets the receive time as its timestamp
+    if skew_tracker is None:
+        return None
+    result, skew = skew_tracker.check((g.tenant, data['device_id']), timestamp_to_epoch(data['timestamp']), received)
+    metrics.registry.inc('clock_skew_readings_total', (result,))
+    if result == REJECTED:
+        return (f'timestamp is {skew:+.0f}s from server time '
+                f'(allowed -{skew_tracker.max_past:.0f}s to +{skew_tracker.max_future:.0f}s)')
+    if result == CLAMPED:
+        data['timestamp'] = datetime.fromtimestamp(received, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return None
+
+def record_keys(keys):
+    # Remember the keys of readings that were just stored
+    for key in keys:
+        if key is not None:
+            dedup_index.add(key)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if profiler.enabled:
+        profiler.start(request.headers)
+
+@app.after_request
+def record_request_metrics(response):
+    # Count every request and observe its latency under the route template
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.registry.inc('http_requests_total', (route, request.method, str(response.status_code)))
+        metrics.registry.observe('http_request_duration_seconds', (route, request.method), elapsed)
+        if profiler.enabled:
+            profiler.finish(route, request.method, response.status_code, elapsed, response.headers)
+    return response
+
+@app.after_request
+def compress_response(response):
+    # Registered after record_request_metrics so it runs first and is timed
+    if response_compressor is not None:
+        with phase('compress'):
+            response_compressor.apply(response, request.accept_encodings)
+    return response
 
 def validate_device_data(data):
     # Validate device data - returns (is_valid, error_message)
@@ -54,16 +522,34 @@ def validate_device_data(data):
         if field not in data:
             return False, f'Missing required field: {field}'
     
+    return validate_present_fields(data)
+
+def validate_device_delta(data):
+    # Validate a partial reading: device_id and timestamp plus any of DELTA_FIELDS
+    if not isinstance(data, dict):
+        return False, 'Expected a JSON object'
+    
+    for field in ('device_id', 'timestamp'):
+        if field not in data:
+            return False, f'Missing required field: {field}'
+    unknown = sorted(set(data) - set(('device_id', 'timestamp', 'message_id') + DELTA_FIELDS))
+    if unknown:
+        return False, f'Unknown field: {unknown[0]}'
+    
+    return validate_present_fields(data)
+
+def validate_present_fields(data):
+    # Check the value of every field present in data
     # Validate battery level
-    if not isinstance(data['battery_level'], int) or not (0 <= data['battery_level'] <= 100):
+    if 'battery_level' in data and (not isinstance(data['battery_level'], int) or not (0 <= data['battery_level'] <= 100)):
         return False, 'battery_level must be an integer between 0 and 100'
     
     # Validate RSSI
-    if not isinstance(data['rssi'], int):
+    if 'rssi' in data and not isinstance(data['rssi'], int):
         return False, 'rssi must be an integer'
     
     # Validate online status
-    if not isinstance(data['online'], bool):
+    if 'online' in data and not isinstance(data['online'], bool):
         return False, 'online must be a boolean'
     
     # Validate timestamp format
@@ -72,6 +558,11 @@ def validate_device_data(data):
     except ValueError:
         return False, 'timestamp must be in ISO 8601 format'
     
+    # Optional idempotency key
+    message_id = data.get('message_id')
+    if message_id is not None and not (isinstance(message_id, str) and 0 < len(message_id) <= MESSAGE_ID_MAX_LENGTH):
+        return False, f'message_id must be a string of 1 to {MESSAGE_ID_MAX_LENGTH} characters'
+    
     return True, None
 
 def format_device_response(row):
@@ -95,101 +586,712 @@ def format_summary_device(row):
 
 @app.route('/status', methods=['POST'])
 @require_api_key
+@leader_only
+@admit(INGEST)
 def submit_status():
     # Accept device status update
     try:
-        data = request.get_json()
+        with phase('parse'):
+            data = read_payload()
         
         # Validate data using helper function
-        is_valid, error_message = validate_device_data(data)
+        with phase('validate'):
+            is_valid, error_message = validate_device_data(data)
         if not is_valid:
             return jsonify({'error': error_message}), 400
         
+        # A retry of a stored reading is acknowledged without writing it again
+        key = dedup_key(data, idempotency_header())
+        if key is not None and find_duplicates([(key, data)])[0]:
+            with phase('serialize'):
+                return jsonify({'message': 'Status updated successfully', 'duplicate': True}), 200
+        
+        error_message = check_clock(data, time.time())
+        if error_message:
+            return jsonify({'error': error_message}), 400
+        
         # Store in database (upsert - insert or update if device_id exists)
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO device_status 
-            (device_id, timestamp, battery_level, rssi, online, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            data['device_id'],
-            data['timestamp'],
-            data['battery_level'],
-            data['rssi'],
-            data['online'],
-            datetime.utcnow().isoformat()
-        ))
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({'message': 'Status updated successfully'}), 200
+        tenants.admit_ingest(g.tenant, current_partition().store, [data['device_id']])
+        store_reading(data)
+        record_keys([key])
+        
+        with phase('serialize'):
+            return jsonify({'message': 'Status updated successfully'}), 200
         
+    except PayloadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except QuotaExceeded as e:
+        return quota_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+def store_readings(readings):
+    # Persist validated readings in one batch, logging them first when enabled
+    created_at = utc_now()
+    if ingest_log is None or not is_default_tenant():
+        return current_partition().store.batch_upsert(readings, created_at)
+    
+    ingest_log.append_many(readings, created_at)
+    try:
+        return store.batch_upsert(readings, created_at)
+    finally:
+        for _ in readings:
+            ingest_log.done()
+        if ingest_log.size() > INGEST_LOG_MAX_BYTES:
+            ingest_log.checkpoint(store.flush)
+
+@app.route('/status/batch', methods=['POST'])
+@require_api_key
+@leader_only
+@admit(INGEST)
+def submit_status_batch():
+    # Accept many device status updates in one request
+    # Body: JSON/MessagePack/CBOR list of readings, {"readings": [...]}, or a struct frame
+    try:
+        with phase('parse'):
+            payload = read_payload(allow_struct=True)
+        
+        if isinstance(payload, dict):
+            payload = payload.get('readings')
+        if not isinstance(payload, list):
+            return jsonify({'error': 'Expected a list of readings'}), 400
+        if len(payload) > BATCH_MAX_READINGS:
+            return jsonify({'error': f'Batch exceeds {BATCH_MAX_READINGS} readings'}), 413
+        
+        # Valid readings are stored; invalid ones are reported by index
+        # Readings without a message_id get Idempotency-Key:<index> as their key
+        header_key = idempotency_header()
+        keyed = []
+        indexes = []
+        rejected = []
+        with phase('validate'):
+            for index, data in enumerate(payload):
+                if not isinstance(data, dict):
+                    rejected.append({'index': index, 'error': 'Reading must be an object'})
+                    continue
+                is_valid, error_message = validate_device_data(data)
+                if is_valid:
+                    keyed.append((dedup_key(data, None if header_key is None else f'{header_key}:{index}'), data))
+                    indexes.append(index)
+                else:
+                    rejected.append({'index': index, 'error': error_message})
+        
+        # Duplicates count as accepted so a retried batch gets the same answer
+        duplicates = 0
+        if any(key is not None for key, _ in keyed):
+            flags = find_duplicates(keyed)
+            duplicates = sum(flags)
+            keyed = [pair for pair, duplicate in zip(keyed, flags) if not duplicate]
+            indexes = [index for index, duplicate in zip(indexes, flags) if not duplicate]
+        
+        if skew_tracker is not None:
+            received = time.time()
+            checked = []
+            for index, pair in zip(indexes, keyed):
+                error_message = check_clock(pair[1], received)
+                if error_message:
+                    rejected.append({'index': index, 'error': error_message})
+                else:
+                    checked.append(pair)
+            keyed = checked
+            rejected.sort(key=lambda entry: entry['index'])
+        
+        if keyed:
+            readings = [data for _, data in keyed]
+            tenants.admit_ingest(g.tenant, current_partition().store, [data['device_id'] for data in readings])
+            store_readings(readings)
+            record_keys([key for key, _ in keyed])
+        
+        with phase('serialize'):
+            body = {'accepted': len(keyed) + duplicates, 'rejected': rejected}
+            if duplicates:
+                body['duplicates'] = duplicates
+            return jsonify(body), 200
+        
+    except PayloadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except QuotaExceeded as e:
+        return quota_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/status', methods=['PATCH'])
+@require_api_key
+@leader_only
+@admit(INGEST)
+def patch_status():
+    # Apply a partial status update to a known device
+    # Body: device_id, timestamp and any of battery_level, rssi, online
+    try:
+        with phase('parse'):
+            data = read_payload()
+        
+        with phase('validate'):
+            is_valid, error_message = validate_device_delta(data)
+        if not is_valid:
+            return jsonify({'error': error_message}), 400
+        
+        # A retry of an applied delta is acknowledged without applying it again
+        key = dedup_key(data, idempotency_header())
+        if key is not None and find_duplicates([(key, data)])[0]:
+            with phase('serialize'):
+                return jsonify({'message': 'Status updated successfully', 'changed': False, 'duplicate': True}), 200
+        
+        error_message = check_clock(data, time.time())
+        if error_message:
+            return jsonify({'error': error_message}), 400
+        
+        # Targeted UPDATE of the sent columns; an identical reading is not written
+        tenants.admit_ingest(g.tenant, current_partition().store, [data['device_id']])
+        result = store_delta(data)
+        if result == NOT_FOUND:
+            return jsonify({'error': 'Device not found - send a full reading with POST /status first'}), 404
+        record_keys([key])
+        
+        with phase('serialize'):
+            return jsonify({'message': 'Status updated successfully', 'changed': result == UPDATED}), 200
+        
+    except PayloadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except QuotaExceeded as e:
+        return quota_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/status/<device_id>', methods=['GET'])
 @require_api_key
+@admit(READ)
 def get_device_status(device_id):
     # Get the last known status for a specific device
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT device_id, timestamp, battery_level, rssi, online 
-            FROM device_status 
-            WHERE device_id = ?
-        ''', (device_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        row = current_partition().store.get(device_id)
         
         if row is None:
             return jsonify({'error': 'Device not found'}), 404
         
         # Convert row to dictionary using helper function
-        device_status = format_device_response(row)
+        with phase('format'):
+            device_status = format_device_response(row)
         
-        return jsonify(device_status), 200
+        with phase('serialize'):
+            return jsonify(device_status), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+def lookup_devices(device_ids):
+    # Resolve device_ids in request order with explicit not-found entries
+    if not isinstance(device_ids, list) or not all(isinstance(device_id, str) for device_id in device_ids):
+        return jsonify({'error': 'device_ids must be a list of strings'}), 400
+    if len(device_ids) > QUERY_MAX_IDS:
+        return jsonify({'error': f'Query exceeds {QUERY_MAX_IDS} device_ids'}), 413
+    
+    rows = current_partition().store.get_many(device_ids)
+    
+    with phase('format'):
+        devices = []
+        not_found = []
+        for device_id in device_ids:
+            row = rows.get(device_id)
+            if row is None:
+                devices.append({'device_id': device_id, 'error': 'Device not found'})
+                not_found.append(device_id)
+            else:
+                devices.append(format_device_response(row))
+    
+    with phase('serialize'):
+        return jsonify({'devices': devices, 'not_found': not_found}), 200
+
+@app.route('/status/query', methods=['POST'])
+@require_api_key
+@admit(READ)
+def query_devices():
+    # Get the last known status for many devices in one round trip
+    # Body: {"device_ids": [...]} or a bare list
+    try:
+        with phase('parse'):
+            payload = read_payload()
+        if isinstance(payload, dict):
+            payload = payload.get('device_ids')
+        return lookup_devices(payload)
+    
+    except PayloadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/status', methods=['GET'])
+@require_api_key
+@admit(READ)
+def list_devices():
+    # GET /status?ids=a,b,c - same as POST /status/query
+    try:
+        ids = request.args.get('ids')
+        if not ids:
+            return jsonify({'error': 'ids query parameter is required'}), 400
+        return lookup_devices([device_id for device_id in ids.split(',') if device_id])
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/status/summary', methods=['GET'])
 @require_api_key
+@admit(SCAN)
 def get_status_summary():
     # Get summary of all devices with their most recent status
+    # ?group= or ?tag= limits it to registry members, resolved from the index
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
-        cursor = conn.cursor()
+        partition = current_partition()
+        group = request.args.get('group')
+        tag = request.args.get('tag')
+        if group is not None or tag is not None:
+            tenant_registry = partition.registry
+            device_ids = tenant_registry.group_members(group) if group is not None else tenant_registry.tagged(tag)
+            if group is not None and tag is not None:
+                tagged = set(tenant_registry.tagged(tag))
+                device_ids = [device_id for device_id in device_ids if device_id in tagged]
+            rows = partition.store.get_many(device_ids)
+            with phase('format'):
+                summary = [format_summary_device(rows[device_id]) for device_id in device_ids if device_id in rows]
+            with phase('serialize'):
+                return jsonify({'devices': summary}), 200
         
-        cursor.execute('''
-            SELECT device_id, battery_level, online, timestamp 
-            FROM device_status 
-            ORDER BY device_id
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
+        # The fragment cache mirrors the main store, so it serves the default tenant
+        if summary_cache is not None and is_default_tenant():
+            with phase('format'):
+                body = summary_cache.render(store)
+            return app.response_class(body, mimetype='application/json'), 200
         
         # Build summary list using helper function
-        summary = [format_summary_device(row) for row in rows]
+        with phase('format'):
+            summary = [format_summary_device(row) for row in partition.store.iterate_summary()]
+        
+        with phase('serialize'):
+            return jsonify({'devices': summary}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def encode_cursor(sort, after):
+    # Opaque keyset cursor for the next search page
+    return base64.urlsafe_b64encode(json.dumps([sort] + list(after)).encode()).decode()
+
+def decode_cursor(cursor, sort):
+    # (sort value, device_id) from a cursor - raises ValueError when it is malformed
+    try:
+        cursor_sort, value, device_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if cursor_sort != sort:
+        raise ValueError('cursor belongs to a search with another sort')
+    # Sort values are device ids or integers; anything else would reach the store as a bind parameter
+    value_type = str if sort == 'device_id' else int
+    if not isinstance(device_id, str) or not isinstance(value, value_type) or isinstance(value, bool):
+        raise ValueError('Invalid cursor')
+    return value, device_id
+
+def parse_search_args(args):
+    # Parse search query parameters - returns (options, error_message)
+    query = args.get('q', '')
+    match = args.get('match', PREFIX)
+    if match not in (PREFIX, SUBSTRING):
+        return None, 'match must be prefix or substring'
+    if match == SUBSTRING and len(query) < SEARCH_MIN_SUBSTRING:
+        return None, f'substring search needs at least {SEARCH_MIN_SUBSTRING} characters'
+    sort = args.get('sort', 'device_id')
+    if sort not in SEARCH_SORT_COLUMNS:
+        return None, f'sort must be one of {", ".join(SEARCH_SORT_COLUMNS)}'
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return None, 'order must be asc or desc'
+    try:
+        limit = int(args.get('limit', '50'))
+    except ValueError:
+        return None, 'limit must be an integer'
+    if not 1 <= limit <= SEARCH_MAX_LIMIT:
+        return None, f'limit must be between 1 and {SEARCH_MAX_LIMIT}'
+    after = None
+    if args.get('cursor'):
+        try:
+            after = decode_cursor(args['cursor'], sort)
+        except ValueError as e:
+            return None, str(e)
+    options = {'query': query, 'match': match, 'sort': sort, 'descending': order == 'desc', 'limit': limit, 'after': after}
+    return options, None
+
+@app.route('/status/search', methods=['GET'])
+@require_api_key
+@admit(READ)
+def search_devices():
+    # One keyset page of devices whose id matches ?q= by prefix or substring
+    # ?sort=device_id|battery_level|rssi|last_update&order=asc|desc&limit=&cursor=
+    try:
+        options, error_message = parse_search_args(request.args)
+        if error_message:
+            return jsonify({'error': error_message}), 400
+        
+        rows, next_after = current_partition().store.search(**options)
+        
+        with phase('format'):
+            devices = [format_device_response(row) for row in rows]
+            next_cursor = None if next_after is None else encode_cursor(options['sort'], next_after)
+        
+        with phase('serialize'):
+            return jsonify({'devices': devices, 'next_cursor': next_cursor}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/devices/<device_id>', methods=['PUT'])
+@require_api_key
+@leader_only
+@admit(INGEST)
+def register_device(device_id):
+    # Create or replace a device's registry entry (name, tags, groups, metadata)
+    try:
+        data = request.get_json()
+        is_valid, error_message = validate_registration(data)
+        if not is_valid:
+            return jsonify({'error': error_message}), 400
+        
+        partition = current_partition()
+        groups = data.get('groups', [])
+        partition.registry.register(device_id, data.get('name'), data.get('tags', []), groups, data.get('metadata'))
+        partition.group_aggregates.set_groups(device_id, groups, partition.store.get(device_id))
+        return jsonify(partition.registry.get(device_id)), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/devices/<device_id>', methods=['GET'])
+@require_api_key
+@admit(READ)
+def get_device_registration(device_id):
+    # Get a device's registry entry
+    try:
+        entry = current_partition().registry.get(device_id)
+        if entry is None:
+            return jsonify({'error': 'Device not registered'}), 404
+        return jsonify(entry), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/groups/<group_id>', methods=['GET'])
+@require_api_key
+@admit(READ)
+def get_group_aggregate(group_id):
+    # Online count and min battery for a group, maintained on ingest
+    try:
+        aggregate = current_partition().group_aggregates.get(group_id)
+        if aggregate is None:
+            return jsonify({'error': 'Group not found'}), 404
+        return jsonify(aggregate), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/clock-skew', methods=['GET'])
+@require_api_key
+@admit(READ)
+def get_clock_skew():
+    # The caller's devices whose smoothed clock skew is at least min_seconds off
+    # (default CLOCK_SKEW_REPORT_SECONDS) - /metrics only carries fleet-wide counts
+    try:
+        if skew_tracker is None:
+            return jsonify({'error': 'Clock skew tracking is off (CLOCK_SKEW_MODE=off)'}), 404
+        try:
+            threshold = float(request.args.get('min_seconds', CLOCK_SKEW_REPORT_SECONDS))
+        except ValueError:
+            return jsonify({'error': 'min_seconds must be a number'}), 400
+        
+        devices = [
+            {'device_id': device_id, 'skew_seconds': round(estimate, 3)}
+            for (_, device_id), estimate in skew_tracker.skewed(threshold, tenant=g.tenant)
+        ]
+        return jsonify({'min_seconds': threshold, 'devices': devices}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_aggregate_filters(args):
+    # Parse aggregate query parameters - returns (filters, error_message)
+    filters = {}
+    online = args.get('online')
+    if online is not None:
+        if online.lower() not in ('true', 'false'):
+            return None, 'online must be true or false'
+        filters['online'] = online.lower() == 'true'
+    for name in ('min_battery', 'max_battery'):
+        value = args.get(name)
+        if value is not None:
+            try:
+                filters[name] = int(value)
+            except ValueError:
+                return None, f'{name} must be an integer'
+    since = args.get('since')
+    if since is not None:
+        try:
+            filters['since'] = timestamp_to_epoch(since)
+        except ValueError:
+            return None, 'since must be in ISO 8601 format'
+    return filters, None
+
+@app.route('/status/aggregate', methods=['GET'])
+@require_api_key
+@admit(SCAN)
+def get_status_aggregate():
+    # Fleet-wide counts and battery/rssi statistics, optionally filtered
+    try:
+        filters, error_message = parse_aggregate_filters(request.args)
+        if error_message:
+            return jsonify({'error': error_message}), 400
         
-        return jsonify({'devices': summary}), 200
+        # Without the mirror (it covers the default tenant), build a throwaway table from the store
+        if fleet_table is not None and is_default_tenant():
+            table = fleet_table
+        else:
+            table = FleetTable.from_rows(current_partition().store.iterate_all())
+        
+        return jsonify(table.aggregate(**filters)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text exposition - no authentication required, like /health
+    if metrics_exporter is not None:
+        totals = metrics_exporter.collect_all()
+    else:
+        totals = metrics.registry.collect()
+    gauges = health_monitor.gauges() + replication_gauges()
+    if admission is not None:
+        gauges += admission.gauges()
+    if dedup_index is not None:
+        gauges += dedup_index.gauges()
+    if skew_tracker is not None:
+        gauges += skew_tracker.gauges(CLOCK_SKEW_REPORT_SECONDS)
+    body = metrics.render(totals, gauges=gauges)
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/health', methods=['GET'])
 def health_check():
     # Basic health check endpoint - no authentication required
     return jsonify({'status': 'healthy', 'message': 'API is running'}), 200
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    # The process is up and serving - never touches the database
+    return jsonify({'status': 'alive'}), 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    # 503 until start-up warm-up has finished or while a database probe fails
+    # Degraded (slow probe, large WAL, low disk, long write queue) stays routable
+    body = health_monitor.check()
+    if not warmup.ready:
+        body['reasons'] = body['reasons'] + ['warm-up not finished']
+    replica_loaded = follower is None or follower.epoch is not None
+    if not replica_loaded:
+        body['reasons'] = body['reasons'] + ['replica has not loaded a snapshot']
+    body['ready'] = warmup.ready and replica_loaded and body['status'] != FAILING
+    body['warmup'] = warmup.status()
+    body['import_seconds'] = round(IMPORT_SECONDS, 6)
+    return jsonify(body), 200 if body['ready'] else 503
+
+def replication_gauges():
+    if follower is None:
+        return []
+    status = follower.status()
+    return [
+        ('replication_lag_versions', 'Changes on the leader not yet applied by this follower',
+         [((), status['lag_versions'])] if status['lag_versions'] is not None else []),
+        ('replication_lag_seconds', 'Age of the newest applied change while behind the leader',
+         [((), status['lag_seconds'])] if status['lag_seconds'] is not None else []),
+    ]
+
+@app.route('/replication/changes', methods=['GET'])
+@require_api_key
+def get_replication_changes():
+    # Changes after ?since=<version>, at most ?limit=, waiting up to ?wait= seconds for new ones
+    if change_log is None:
+        return jsonify({'error': 'This node is not a replication leader'}), 404
+    if not is_default_tenant():
+        return jsonify({'error': 'Replication covers the default tenant only'}), 403
+    try:
+        try:
+            since = int(request.args.get('since', '0'))
+            limit = int(request.args.get('limit', '1000'))
+            wait = float(request.args.get('wait', '0'))
+        except ValueError:
+            return jsonify({'error': 'since and limit must be integers and wait a number'}), 400
+        if since < 0 or not 1 <= limit <= 10000 or not 0 <= wait <= 30:
+            return jsonify({'error': 'since must be >= 0, limit between 1 and 10000 and wait between 0 and 30'}), 400
+        
+        changes = change_log.changes_since(since, limit, wait)
+        if changes is None:
+            return jsonify({'error': f'Changes after version {since} are no longer in the log - resync from /replication/snapshot'}), 410
+        return jsonify({'epoch': change_log.epoch, 'version': change_log.version, 'changes': changes}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/replication/snapshot', methods=['GET'])
+@require_api_key
+def get_replication_snapshot():
+    # Every row as NDJSON after a header line with the change log epoch and version
+    if change_log is None:
+        return jsonify({'error': 'This node is not a replication leader'}), 404
+    if not is_default_tenant():
+        return jsonify({'error': 'Replication covers the default tenant only'}), 403
+    return Response(replication.snapshot_lines(store, change_log), mimetype='application/x-ndjson')
+
+@app.route('/replication/status', methods=['GET'])
+@require_api_key
+def get_replication_status():
+    if follower is not None:
+        return jsonify(follower.status()), 200
+    if change_log is not None:
+        return jsonify({'role': 'leader', 'epoch': change_log.epoch, 'version': change_log.version}), 200
+    return jsonify({'role': 'standalone'}), 200
+
+@app.cli.command('import-ndjson')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='Readings per transaction.')
+@click.option('--offset', default=0, show_default=True, help='Byte offset to resume from (uncompressed for gzip).')
+@click.option('--quiet', is_flag=True, help='Only print the final report.')
+def import_ndjson_command(path, batch_size, offset, quiet):
+    # Stream device readings from an NDJSON (or gzip NDJSON) file into the store
+    init_db()
+    
+    def report(stats):
+        if not quiet:
+            click.echo(
+                f'{stats.imported} imported, {stats.rejected} rejected, '
+                f'{stats.rows_per_second:,.0f} rows/s, {stats.megabytes_per_second:.1f} MB/s, '
+                f'resume offset {stats.offset}',
+                err=True
+            )
+    
+    def reject(line_offset, error_message):
+        if not quiet:
+            click.echo(f'Rejected line at offset {line_offset}: {error_message}', err=True)
+    
+    stats = bulk.import_ndjson(
+        store, path, validate_device_data,
+        batch_size=batch_size, offset=offset, on_progress=report, on_reject=reject
+    )
+    store.close()
+    click.echo(
+        f'Imported {stats.imported} readings ({stats.rejected} rejected) '
+        f'in {stats.elapsed:.2f}s - {stats.rows_per_second:,.0f} rows/s'
+    )
+
+@app.cli.command('export-ndjson')
+@click.argument('path', default='-')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip-compress the output.')
+def export_ndjson_command(path, compress):
+    # Stream device_status to an NDJSON file, or stdout with '-'
+    init_db()
+    count = bulk.export_ndjson(store, path, compress=compress)
+    store.close()
+    click.echo(f'Exported {count} devices', err=True)
+
+@app.cli.command('snapshot')
+@click.option('--out', 'out_dir', default=SNAPSHOT_DIR, show_default=True, help='Snapshot root directory.')
+@click.option('--format', 'fmt', type=click.Choice(sorted(snapshot.FORMATS)), default=SNAPSHOT_FORMAT, show_default=True)
+@click.option('--row-group-size', default=50000, show_default=True, help='Rows per row group / record batch.')
+def snapshot_command(out_dir, fmt, row_group_size):
+    # Write a point-in-time columnar snapshot of device_status
+    store.initialize()
+    path, count = snapshot.write_snapshot(store, out_dir, fmt=fmt, row_group_size=row_group_size)
+    store.close()
+    click.echo(f'Wrote {count} devices to {path}')
+
+@app.cli.command('backup')
+@click.option('--out-dir', default=BACKUP_DIR, show_default=True, help='Directory for backup sets.')
+@click.option('--pages', default=BACKUP_PAGES, show_default=True, help='Pages copied per step.')
+@click.option('--sleep-ms', default=BACKUP_SLEEP_MS, show_default=True, help='Pause between steps.')
+@click.option('--keep', default=BACKUP_KEEP, show_default=True, help='Newest sets to keep (0 keeps all).')
+def backup_command(out_dir, pages, sleep_ms, keep):
+    # Online backup of every database file into a new verified backup set (safe while serving)
+    init_db()
+    
+    def report(stats):
+        restarts = f', {stats.restarts} restarts' if stats.restarts else ''
+        click.echo(
+            f'{stats.source}: {stats.pages} pages, {stats.bytes / 1e6:.1f} MB in {stats.elapsed:.2f}s '
+            f'- {stats.megabytes_per_second:.1f} MB/s{restarts}, integrity ok',
+            err=True
+        )
+    
+    try:
+        set_dir, results = backup.backup_set(backup_database_paths(), out_dir, pages, sleep_ms / 1000, on_file=report)
+    except backup.BackupRestarted as e:
+        raise click.ClickException(f'{e} - no backup set written')
+    store.close()
+    pruned = backup.prune_backup_sets(out_dir, keep)
+    total = sum(stats.bytes for stats in results)
+    seconds = sum(stats.elapsed for stats in results)
+    click.echo(
+        f'Wrote {set_dir} ({len(results)} files, {total / 1e6:.1f} MB in {seconds:.2f}s'
+        f' - {total / 1e6 / seconds if seconds else 0:.1f} MB/s), pruned {len(pruned)} old sets'
+    )
+
+@app.cli.command('restore')
+@click.argument('set_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--check-only', is_flag=True, help='Only run the integrity check on the backup set.')
+def restore_command(set_dir, check_only):
+    # Verify a backup set and write its files back to their original paths
+    # Restart the service afterwards so in-memory mirrors are rebuilt
+    files = backup.backup_files(set_dir)
+    failed = False
+    for name, path in files:
+        problems = backup.check_integrity(path)
+        click.echo(f"{name}: {'ok' if not problems else problems[0]}")
+        failed = failed or bool(problems)
+    if failed:
+        raise click.ClickException('Backup set failed its integrity check - nothing restored')
+    if check_only:
+        return
+    targets = {backup.backup_name(path): path for path in backup_database_paths()}
+    for name, path in files:
+        dest_path = targets.get(name, name)
+        backup.restore_database(path, dest_path)
+        click.echo(f'Restored {dest_path}')
+
+@app.cli.command('migrate')
+@click.option('--status', 'show_status', is_flag=True, help='Only show the migration status.')
+@click.option('--batch-size', default=MIGRATION_BATCH_SIZE, show_default=True, help='Rows per backfill transaction.')
+@click.option('--pause-ms', default=MIGRATION_PAUSE_MS, show_default=True, help='Pause between backfill batches.')
+def migrate_command(show_status, batch_size, pause_ms):
+    # Apply pending migrations and run their backfills to completion
+    # Safe while the service is running: each batch is a short transaction
+    for path in sqlite_database_paths():
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            if not show_status:
+                applied = migrations.migrate(conn)
+                if applied:
+                    click.echo(f'{path}: applied versions {", ".join(map(str, applied))}')
+                
+                def report(migration, rows):
+                    click.echo(f'{path}: backfill {migration.version} ({migration.name}) {rows} rows', err=True)
+                
+                migrations.run_backfills(conn, batch_size, pause_ms / 1000, on_progress=report)
+            for entry in migrations.migration_status(conn):
+                state = 'done' if entry['backfill_done'] else f"backfilling ({entry['backfill_rows']} rows)"
+                if entry['applied_at'] is None:
+                    state = 'pending'
+                click.echo(f"{path}: {entry['version']:>3} {entry['name']:<40} {state}")
+        finally:
+            conn.close()
+
 if __name__ == '__main__':
     init_db()
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    app.run(
+        host='0.0.0.0',
+        port=int(os.getenv('PORT', '8000')),
+        debug=os.getenv('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes')
+    )
\ No newline at end of file
@@ -0,0 +1,242 @@
+# Online backups of the SQLite databases
+# A source in WAL mode is copied with SQLite's backup API in one step: the
+# step reads one snapshot inside a read transaction, which never blocks
+# writers. A source in rollback-journal mode is copied in steps of `pages`
+# pages. It is only locked while a step runs, and the copier sleeps between
+# steps so writers get the lock in between. A write made through another
+# connection restarts that copy; after max_restarts the backup fails rather
+# than lock writers out for a whole-file copy.
+#
+# Every copy is written under a temporary name, checked with
+# PRAGMA integrity_check and only then renamed into place. A backup set is
+# one directory per run:
+#   <out_dir>/backup-YYYYMMDDTHHMMSSZ/<database files>
+# Restores verify the copy first and write it back through the backup API,
+# so the live file is replaced under SQLite's own locking.
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+SET_PREFIX = 'backup-'
+
+
+class BackupRestarted(Exception):
+    # A paged copy was restarted more than max_restarts times
+    pass
+
+
+class BackupStats:
+    # Pages and bytes copied for one database file
+
+    def __init__(self, source, path):
+        self.source = source
+        self.path = path
+        self.pages = 0
+        self.bytes = 0
+        self.steps = 0
+        self.restarts = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes / 1e6 / self.elapsed if self.elapsed else 0.0
+
+
+def check_integrity(path):
+    # PRAGMA integrity_check on path - returns a list of problems (empty when ok)
+    try:
+        conn = sqlite3.connect('file:' + os.path.abspath(path) + '?mode=ro', uri=True)
+        try:
+            messages = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    return [] if messages == ['ok'] else messages
+
+
+def copy_database(source, target, stats, pages=256, sleep=0.005, max_restarts=3):
+    # Copy the open source connection into target with the backup API
+    # Returns the number of pages in the copy; raises BackupRestarted when
+    # writers keep restarting a paged copy
+    if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+        stats.steps += 1
+        source.backup(target, pages=-1)
+        return target.execute('PRAGMA page_count').fetchone()[0]
+
+    last_remaining = None
+
+    def step(status, remaining, total):
+        nonlocal last_remaining
+        stats.steps += 1
+        if last_remaining is not None and remaining >= last_remaining:
+            # The source changed and SQLite started the copy over
+            stats.restarts += 1
+            if stats.restarts > max_restarts:
+                raise BackupRestarted(f'{stats.source}: copy restarted {stats.restarts} times by concurrent writes')
+        last_remaining = remaining
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    source.backup(target, pages=pages, progress=step)
+    return target.execute('PRAGMA page_count').fetchone()[0]
+
+
+def backup_database(source_path, dest_path, pages=256, sleep=0.005, max_restarts=3):
+    # Online backup of source_path to dest_path - returns BackupStats
+    # Raises ValueError when the copy fails its integrity check and
+    # BackupRestarted when concurrent writes keep restarting a paged copy
+    stats = BackupStats(source_path, dest_path)
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    tmp_path = dest_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    # mode=rw: never create an empty database for a missing source
+    source = sqlite3.connect('file:' + os.path.abspath(source_path) + '?mode=rw', uri=True, timeout=30)
+    target = sqlite3.connect(tmp_path)
+    try:
+        stats.pages = copy_database(source, target, stats, pages, sleep, max_restarts)
+        # The copy inherits WAL mode from the source; a backup is one self-contained file
+        target.execute('PRAGMA journal_mode=DELETE')
+        page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        stats.bytes = stats.pages * page_size
+    except BackupRestarted:
+        target.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        target.close()
+        source.close()
+    problems = check_integrity(tmp_path)
+    if problems:
+        os.remove(tmp_path)
+        raise ValueError(f'Backup of {source_path} failed its integrity check: {problems[0]}')
+    os.replace(tmp_path, dest_path)
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+
+def backup_name(path):
+    # Name of path inside a backup set - relative when under the working directory
+    relative = os.path.relpath(path)
+    return os.path.basename(path) if relative.startswith('..') else relative
+
+
+def backup_set_path(out_dir, backup_time=None):
+    backup_time = backup_time or datetime.now(timezone.utc)
+    return os.path.join(out_dir, SET_PREFIX + backup_time.strftime('%Y%m%dT%H%M%SZ'))
+
+
+def backup_set(paths, out_dir, pages=256, sleep=0.005, backup_time=None, on_file=None):
+    # Back up every database in paths into a new set - returns (set_dir, [BackupStats])
+    set_dir = backup_set_path(out_dir, backup_time)
+    tmp_dir = set_dir + '.partial'
+    results = []
+    try:
+        for path in paths:
+            stats = backup_database(path, os.path.join(tmp_dir, backup_name(path)), pages, sleep)
+            results.append(stats)
+            if on_file is not None:
+                on_file(stats)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    # A set only appears under its final name once every file is verified
+    os.replace(tmp_dir, set_dir)
+    for stats in results:
+        stats.path = os.path.join(set_dir, os.path.relpath(stats.path, tmp_dir))
+    return set_dir, results
+
+
+def list_backup_sets(out_dir):
+    # Completed backup sets, oldest first
+    if not os.path.isdir(out_dir):
+        return []
+    names = sorted(
+        name for name in os.listdir(out_dir)
+        if name.startswith(SET_PREFIX) and not name.endswith('.partial')
+    )
+    return [os.path.join(out_dir, name) for name in names]
+
+
+def prune_backup_sets(out_dir, keep):
+    # Delete all but the newest keep sets - returns the deleted paths
+    sets = list_backup_sets(out_dir)
+    expired = sets[:-keep] if keep > 0 else []
+    for path in expired:
+        shutil.rmtree(path)
+    return expired
+
+
+def backup_files(set_dir):
+    # (name inside the set, path) for every database in a backup set
+    files = []
+    for root, _, names in os.walk(set_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, set_dir), path))
+    return sorted(files)
+
+
+def restore_database(backup_path, dest_path, pages=-1):
+    # Verify backup_path and write it over dest_path through the backup API
+    problems = check_integrity(backup_path)
+    if problems:
+        raise ValueError(f'{backup_path} failed its integrity check: {problems[0]}')
+    os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+    source = sqlite3.connect('file:' + os.path.abspath(backup_path) + '?mode=ro', uri=True)
+    target = sqlite3.connect(dest_path, timeout=30)
+    try:
+        source.backup(target, pages=pages)
+    finally:
+        target.close()
+        source.close()
+
+
+class BackupScheduler:
+    # Background thread writing a backup set every interval seconds
+
+    def __init__(self, paths, out_dir, interval, keep=7, pages=256, sleep=0.005, logger=None):
+        self.paths = paths  # Callable returning the database files to back up
+        self.out_dir = out_dir
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self):
+        set_dir, results = backup_set(self.paths(), self.out_dir, self.pages, self.sleep)
+        prune_backup_sets(self.out_dir, self.keep)
+        if self.logger is not None:
+            total = sum(stats.bytes for stats in results)
+            seconds = sum(stats.elapsed for stats in results)
+            self.logger.info('Wrote backup %s (%d files, %.1f MB in %.2fs)', set_dir, len(results), total / 1e6, seconds)
+        return set_dir, results
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                # Keep the schedule running; the next interval retries
+                if self.logger is not None:
+                    self.logger.exception('Backup failed')
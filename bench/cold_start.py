@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Cold-start benchmark
+# Seeds a temporary database, then starts app.py repeatedly and measures
+# the time until the process answers GET /health (first request) and until
+# GET /health/ready reports the warm-up finished. The app's own module
+# import time comes from the readiness response.
+#
+# Examples:
+#   python bench/cold_start.py --devices 100000 --runs 5
+#   python bench/cold_start.py --server-env STARTUP_WARMUP=background --server-env FLEET_TABLE=1
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from fleet import Fleet, percentile
+from load import REPO_DIR, free_port, seed_database
+
+
+def wait_for(url, deadline, process, ok=(200,)):
+    # Poll url until it answers with a status in ok - returns the time it did
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code in ok:
+                return time.perf_counter(), response
+        except requests.RequestException:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f'{url} not ready in time')
+
+
+def measure(database, extra_env, timeout=60):
+    # One cold start: (seconds to first response, seconds to ready, import seconds)
+    port = free_port()
+    env = dict(os.environ, DATABASE_PATH=database, PORT=str(port), FLASK_DEBUG='0', MIGRATION_BACKFILL='0')
+    env.update(extra_env)
+    url = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, 'app.py')],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = started + timeout
+        first, _ = wait_for(f'{url}/health', deadline, process)
+        ready, response = wait_for(f'{url}/health/ready', deadline, process)
+        return first - started, ready - started, response.json()['import_seconds']
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_time(module, runs, database):
+    # Best wall time of `python -c "import <module>"` in a fresh interpreter
+    env = dict(os.environ, DATABASE_PATH=database)
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', f'import {module}'], cwd=REPO_DIR, env=env)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app cold start')
+    parser.add_argument('--devices', type=int, default=10000, help='Devices seeded before starting')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts to measure')
+    parser.add_argument('--server-env', action='append', default=[], metavar='NAME=VALUE',
+                        help='Extra environment for the server (repeatable)')
+    args = parser.parse_args()
+    extra_env = dict(item.split('=', 1) for item in args.server_env)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database = os.path.join(tmp_dir, 'startup.db')
+        seed_database(database, Fleet(args.devices, seed=7))
+
+        print(f"interpreter: {import_time('sys', args.runs, database) * 1000:8.1f} ms")
+        print(f"import app:  {import_time('app', args.runs, database) * 1000:8.1f} ms")
+        results = [measure(database, extra_env) for _ in range(args.runs)]
+
+    first, ready, imported = zip(*results)
+    print(f"{'':<20} {'p50':>9} {'max':>9}")
+    for name, values in (('module import', imported), ('first request', first), ('ready', ready)):
+        values = sorted(value * 1000 for value in values)
+        print(f'{name:<20} {percentile(values, 0.5):>7.1f}ms {values[-1]:>7.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
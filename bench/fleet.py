@@ -0,0 +1,69 @@
+# Synthetic device fleets for benchmarks
+# Device ids follow the naming used in the field (sensor-kitchen-000123).
+# Reporting frequency is heavy-tailed: device ranks are weighted 1/rank^skew,
+# so a few chatty devices report far more often than the long tail.
+
+import bisect
+import itertools
+import math
+import random
+from array import array
+from datetime import datetime, timedelta, timezone
+
+ROOMS = ['kitchen', 'bedroom', 'living-room', 'garage', 'basement', 'office', 'bathroom', 'hallway', 'attic', 'laundry']
+KINDS = ['sensor', 'thermostat', 'camera', 'leak', 'motion', 'plug']
+
+
+def device_id(index):
+    # Deterministic, realistic device id for slot index
+    return f'{KINDS[index % len(KINDS)]}-{ROOMS[(index // len(KINDS)) % len(ROOMS)]}-{index:07d}'
+
+
+class Fleet:
+    # size devices with per-device battery/rssi state that drifts over time
+
+    def __init__(self, size, seed=42, skew=1.1):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.ids = [device_id(i) for i in range(size)]
+        self.battery = array('B', (self.rng.randint(20, 100) for _ in range(size)))
+        self.rssi = array('h', (int(self.rng.gauss(-65, 10)) for _ in range(size)))
+        # Shuffle which devices are chatty so they are spread across the id space
+        ranks = list(range(1, size + 1))
+        self.rng.shuffle(ranks)
+        self.cum_weights = list(itertools.accumulate(1.0 / rank ** skew for rank in ranks))
+
+    def pick(self, rng):
+        # Slot of the next device to report, following the reporting distribution
+        return bisect.bisect_left(self.cum_weights, rng.random() * self.cum_weights[-1])
+
+    def pick_uniform(self, rng):
+        return rng.randrange(self.size)
+
+    def reading(self, index, rng, when=None):
+        # Next reading for device index: battery drains slowly, rssi jitters
+        if rng.random() < 0.05:
+            self.battery[index] = max(0, self.battery[index] - 1)
+        self.rssi[index] = max(-120, min(0, self.rssi[index] + rng.randint(-3, 3)))
+        when = when or datetime.now(timezone.utc)
+        return {
+            'device_id': self.ids[index],
+            'timestamp': when.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'battery_level': self.battery[index],
+            'rssi': self.rssi[index],
+            'online': self.battery[index] > 0 and rng.random() < 0.95,
+        }
+
+    def seed_readings(self, now=None):
+        # One reading per device, last seen within the past hour
+        now = now or datetime.now(timezone.utc)
+        for index in range(self.size):
+            yield self.reading(index, self.rng, now - timedelta(seconds=self.rng.randint(0, 3600)))
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+# Load test for the IoT Device Status API
+# Seeds a synthetic fleet into a temporary database, starts a local server on
+# a free port and drives a mixed ingest/read workload at fixed concurrency.
+# Results (throughput and p50/p95/p99 latency per operation) are printed and
+# saved as JSON so runs can be compared between commits. Runs fully offline.
+#
+# Examples:
+#   python bench/load.py --devices 10000 --concurrency 16 --duration 30
+#   python bench/load.py --mix ingest=90,get=10 --compare bench/results/previous.json
+#   python bench/load.py --url http://localhost:8000   # Use a running server
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+from fleet import Fleet, percentile
+from storage import SQLiteStatusStore
+
+API_KEY = 'dev-key-123'
+OPERATIONS = ('ingest', 'get', 'summary')
+
+
+def parse_mix(text):
+    # "ingest=80,get=15,summary=5" -> {'ingest': 80.0, ...}
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation {name!r} (choose from {", ".join(OPERATIONS)})')
+        mix[name] = float(weight)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed_database(path, fleet, batch_size=10000):
+    # Write one reading per device straight into SQLite (no HTTP)
+    store = SQLiteStatusStore(path)
+    store.initialize()
+    batch = []
+    for reading in fleet.seed_readings():
+        batch.append(reading)
+        if len(batch) >= batch_size:
+            store.batch_upsert(batch)
+            batch = []
+    if batch:
+        store.batch_upsert(batch)
+
+
+def start_server(database, port, extra_env):
+    # Start app.py without the debug reloader and wait for /health
+    env = dict(os.environ, DATABASE_PATH=database, PORT=str(port), FLASK_DEBUG='0')
+    env.update(extra_env)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, 'app.py')],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            if requests.get(f'{url}/health', timeout=1).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('server did not become healthy within 30s')
+
+
+class Worker(threading.Thread):
+    # Sends requests until the deadline, recording latency per operation
+
+    def __init__(self, url, fleet, mix, seed, deadline, warmup_until):
+        super().__init__(daemon=True)
+        self.url = url
+        self.fleet = fleet
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.warmup_until = warmup_until
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+
+    def request(self, session, operation):
+        if operation == 'ingest':
+            reading = self.fleet.reading(self.fleet.pick(self.rng), self.rng)
+            return session.post(f'{self.url}/status', json=reading)
+        if operation == 'get':
+            device_id = self.fleet.ids[self.fleet.pick_uniform(self.rng)]
+            return session.get(f'{self.url}/status/{device_id}')
+        return session.get(f'{self.url}/status/summary')
+
+    def run(self):
+        session = requests.Session()
+        session.headers['X-API-Key'] = API_KEY
+        while True:
+            now = time.perf_counter()
+            if now >= self.deadline:
+                break
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            try:
+                response = self.request(session, operation)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - now
+            if now < self.warmup_until:
+                continue
+            if ok:
+                self.latencies[operation].append(elapsed)
+            else:
+                self.errors[operation] += 1
+
+
+def run_load(url, fleet, mix, concurrency, duration, warmup, seed):
+    # Drive the workload and return per-operation results
+    started = time.perf_counter()
+    warmup_until = started + warmup
+    deadline = warmup_until + duration
+    workers = [
+        Worker(url, fleet, mix, seed + i, deadline, warmup_until)
+        for i in range(concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    results = {}
+    total = 0
+    for operation in mix:
+        latencies = sorted(l for worker in workers for l in worker.latencies[operation])
+        errors = sum(worker.errors[operation] for worker in workers)
+        total += len(latencies)
+        results[operation] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': len(latencies) / duration,
+            'p50_ms': ms(percentile(latencies, 0.50)),
+            'p95_ms': ms(percentile(latencies, 0.95)),
+            'p99_ms': ms(percentile(latencies, 0.99)),
+            'max_ms': ms(latencies[-1] if latencies else None),
+        }
+    return {'total_throughput_rps': total / duration, 'operations': results}
+
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def print_report(result, baseline=None):
+    print(f"\nTotal throughput: {result['total_throughput_rps']:,.1f} req/s")
+    print(f"{'operation':<10} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for operation, stats in result['operations'].items():
+        print(
+            f"{operation:<10} {stats['throughput_rps']:>10,.1f} {fmt(stats['p50_ms'])} "
+            f"{fmt(stats['p95_ms'])} {fmt(stats['p99_ms'])} {stats['errors']:>7}"
+        )
+        if baseline and operation in baseline['operations']:
+            previous = baseline['operations'][operation]
+            print(
+                f"{'  vs base':<10} {change(stats['throughput_rps'], previous['throughput_rps']):>10} "
+                f"{change(stats['p50_ms'], previous['p50_ms']):>9} {change(stats['p95_ms'], previous['p95_ms']):>9} "
+                f"{change(stats['p99_ms'], previous['p99_ms']):>9}"
+            )
+
+
+def fmt(value):
+    return f'{"-":>9}' if value is None else f'{value:>9.2f}'
+
+
+def change(current, previous):
+    if not current or not previous:
+        return '-'
+    return f'{(current - previous) / previous * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the IoT Device Status API')
+    parser.add_argument('--devices', type=int, default=10000, help='Fleet size (1k to 1M)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds before measuring')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('ingest=80,get=18,summary=2'))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='Benchmark a running server instead of starting one (no seeding)')
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for the started server, e.g. STORAGE_BACKEND=memory')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results'), help='Directory for result JSON')
+    parser.add_argument('--compare', help='Previous result JSON to compare against')
+    args = parser.parse_args()
+
+    print(f'Generating fleet of {args.devices:,} devices...')
+    fleet = Fleet(args.devices, seed=args.seed)
+
+    process = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            if args.url:
+                url = args.url
+            else:
+                database = os.path.join(tmp_dir, 'bench.db')
+                seed_started = time.perf_counter()
+                seed_database(database, fleet)
+                print(f'Seeded {args.devices:,} devices in {time.perf_counter() - seed_started:.1f}s')
+                extra_env = dict(item.split('=', 1) for item in args.server_env)
+                process, url = start_server(database, free_port(), extra_env)
+
+            print(f'Running {args.mix} at concurrency {args.concurrency} for {args.duration}s against {url}')
+            result = run_load(url, fleet, args.mix, args.concurrency, args.duration, args.warmup, args.seed)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    result['config'] = {
+        'devices': args.devices,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'mix': args.mix,
+        'seed': args.seed,
+        'server_env': args.server_env,
+    }
+    result['commit'] = git_commit()
+    result['recorded_at'] = datetime.now(timezone.utc).isoformat()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(
+        args.output,
+        f"load-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{result['commit'] or 'nogit'}.json"
+    )
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'\nSaved results to {path}')
+
+
+if __name__ == '__main__':
+    main()
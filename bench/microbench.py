@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# In-process microbenchmarks for the validation, formatting and storage layers
+# Calls the functions directly (no HTTP) and reports the best time per
+# operation over several repeats. Results can be saved as a baseline and
+# later runs fail when any case gets slower than the allowed threshold.
+#
+# Examples:
+#   python bench/microbench.py
+#   python bench/microbench.py --save-baseline bench/results/micro-baseline.json
+#   python bench/microbench.py --baseline bench/results/micro-baseline.json --threshold 10
+#   python bench/microbench.py --quick   # Skip the 1M-row cases
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+from app import app, validate_device_data, format_device_response, format_summary_device
+from fleet import Fleet
+from json_provider import SummaryFragmentCache
+from storage import DeviceRecord, MemoryStatusStore, SQLiteStatusStore
+
+VALID_PAYLOAD = {
+    'device_id': 'sensor-kitchen-0000001',
+    'timestamp': '2025-06-19T14:00:00Z',
+    'battery_level': 76,
+    'rssi': -60,
+    'online': True,
+}
+
+INVALID_PAYLOADS = {
+    'missing_field': {k: v for k, v in VALID_PAYLOAD.items() if k != 'online'},
+    'bad_battery': dict(VALID_PAYLOAD, battery_level=150),
+    'bad_timestamp': dict(VALID_PAYLOAD, timestamp='yesterday'),
+}
+
+
+def measure(func, repeat, number):
+    # Best seconds per call of func() over repeat rounds of number calls
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def make_records(count):
+    fleet = Fleet(count, seed=1)
+    return [
+        DeviceRecord(created_at='2025-06-19T14:00:01', **reading)
+        for reading in fleet.seed_readings()
+    ]
+
+
+def validation_cases():
+    yield 'validate/valid', lambda: validate_device_data(VALID_PAYLOAD), 20000
+    for name, payload in INVALID_PAYLOADS.items():
+        yield f'validate/{name}', lambda payload=payload: validate_device_data(payload), 20000
+
+
+def formatting_cases(sizes):
+    record = make_records(1)[0]
+    yield 'format/device_response', lambda: format_device_response(record), 50000
+    for size in sizes:
+        records = make_records(size)
+        # Per-row cost at fleet scale, including list building
+        yield (
+            f'format/summary_{size}',
+            lambda records=records: [format_summary_device(row) for row in records],
+            1
+        )
+        summary = {'devices': [format_summary_device(row) for row in records]}
+        yield f'serialize/summary_{size}', lambda summary=summary: app.json.dumps(summary), 1
+        # Warm fragment cache with one device written between renders:
+        # the response is one re-encode plus a byte join
+        store = MemoryStatusStore()
+        store.apply_rows(records)
+        cache = SummaryFragmentCache(format_summary_device)
+        cache.render(store)
+
+        def render_after_write(cache=cache, store=store, record=records[0]):
+            cache.invalidate(record)
+            return cache.render(store)
+
+        yield f'serialize/fragments_{size}', render_after_write, 1
+
+
+def storage_cases(tmp_dir, rows):
+    # Upsert and read throughput against a temporary SQLite file
+    store = SQLiteStatusStore(os.path.join(tmp_dir, 'micro.db'))
+    store.initialize()
+    fleet = Fleet(rows, seed=2)
+    readings = list(fleet.seed_readings())
+    store.batch_upsert(readings)
+    position = [0]
+
+    def upsert():
+        position[0] = (position[0] + 1) % rows
+        store.upsert(readings[position[0]])
+
+    def get():
+        position[0] = (position[0] + 1) % rows
+        store.get(readings[position[0]]['device_id'])
+
+    # A dashboard page: 500 devices one by one versus one chunked lookup
+    page = [reading['device_id'] for reading in readings[:500]]
+
+    yield 'sqlite/upsert', upsert, 200
+    yield 'sqlite/get', get, 2000
+    yield 'sqlite/get_500_single', lambda: [store.get(device_id) for device_id in page], 5
+    yield 'sqlite/get_many_500', lambda: store.get_many(page), 20
+    yield f'sqlite/batch_upsert_{rows}', lambda: store.batch_upsert(readings), 1
+    yield f'sqlite/summary_{rows}', lambda: sum(1 for _ in store.iterate_summary()), 1
+
+
+def run(quick=False, repeat=5, only=None):
+    # Run every case - returns {case: seconds_per_op}
+    sizes = [10000, 100000] if quick else [10000, 100000, 1000000]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        groups = [validation_cases(), formatting_cases(sizes), storage_cases(tmp_dir, 10000)]
+        for group in groups:
+            for name, func, number in group:
+                if only and only not in name:
+                    continue
+                func()  # Warm up
+                results[name] = measure(func, repeat, number)
+                print(f'{name:<32} {format_time(results[name]):>12}  {1 / results[name]:>14,.1f} ops/s')
+    return results
+
+
+def format_time(seconds):
+    if seconds < 1e-6:
+        return f'{seconds * 1e9:.0f} ns'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.2f} us'
+    if seconds < 1:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds:.3f} s'
+
+
+def find_regressions(results, baseline, threshold_percent):
+    # Cases slower than baseline by more than threshold_percent
+    regressions = []
+    for name, seconds in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        change = (seconds - previous) / previous * 100
+        if change > threshold_percent:
+            regressions.append((name, previous, seconds, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for validation, formatting and storage')
+    parser.add_argument('--quick', action='store_true', help='Skip the 1M-row cases')
+    parser.add_argument('--repeat', type=int, default=5, help='Rounds per case (best is kept)')
+    parser.add_argument('--only', help='Only run cases whose name contains this text')
+    parser.add_argument('--save-baseline', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against this JSON file')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed slowdown in percent')
+    args = parser.parse_args()
+
+    results = run(quick=args.quick, repeat=args.repeat, only=args.only)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nSaved baseline to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f'\nRegressions over {args.threshold:.0f}%:')
+            for name, previous, seconds, change in regressions:
+                print(f'  {name:<32} {format_time(previous)} -> {format_time(seconds)} ({change:+.1f}%)')
+            sys.exit(1)
+        print(f'\nNo case slower than baseline by more than {args.threshold:.0f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Payload size and decode time for each ingest encoding
+# Compares JSON with MessagePack, CBOR (when installed) and the fixed-width
+# struct frame for a single reading and for batches.
+#
+# Example:
+#   python bench/payload_formats.py --batch-sizes 1,100,1000
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from fleet import Fleet
+from ingest_formats import CBOR, MSGPACK, cbor2, decode_payload, decode_struct_frame, encode_struct_frame, msgpack
+
+
+def encoders():
+    # name -> (encode(readings), decode(body))
+    result = {
+        'json': (
+            lambda readings: json.dumps(readings, separators=(',', ':')).encode('utf-8'),
+            json.loads,
+        ),
+        'struct': (encode_struct_frame, decode_struct_frame),
+    }
+    if msgpack is not None:
+        result['msgpack'] = (msgpack.packb, lambda body: decode_payload(body, MSGPACK))
+    if cbor2 is not None:
+        result['cbor'] = (cbor2.dumps, lambda body: decode_payload(body, CBOR))
+    return result
+
+
+def best_time(func, repeat=5, number=200):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare ingest payload encodings')
+    parser.add_argument('--batch-sizes', default='1,100,1000', help='Comma-separated readings per payload')
+    args = parser.parse_args()
+
+    fleet = Fleet(1000, seed=5)
+    rng = random.Random(5)
+    print(f"{'batch':>6} {'format':<8} {'bytes':>9} {'bytes/rdg':>10} {'vs json':>8} {'decode':>11} {'us/rdg':>8}")
+    for batch_size in (int(size) for size in args.batch_sizes.split(',')):
+        readings = [fleet.reading(fleet.pick(rng), rng) for _ in range(batch_size)]
+        json_size = None
+        for name, (encode, decode) in encoders().items():
+            body = encode(readings)
+            json_size = json_size or len(body)
+            number = max(1, 20000 // batch_size)
+            seconds = best_time(lambda: decode(body), number=number)
+            print(
+                f'{batch_size:>6} {name:<8} {len(body):>9,} {len(body) / batch_size:>10.1f} '
+                f'{json_size / len(body):>7.1f}x {seconds * 1e6:>9.1f}us {seconds * 1e6 / batch_size:>8.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# Device search latency on a large SQLite fleet
+# Seeds a temporary database with the synthetic fleet, then times the first
+# page and the page after it for prefix and substring searches under each sort.
+# Finishes with the write cost of the search indexes: WAL pages and time per
+# upsert, one reading per commit.
+#
+# Example:
+#   python bench/search.py --devices 1000000 --runs 50
+#   python bench/search.py --devices 1000000 --without-sort-indexes
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from fleet import Fleet, percentile
+from storage import PREFIX, SUBSTRING, UPSERT_SQL, SQLiteStatusStore, upsert_params, utc_now
+
+# (label, query, match, sort, descending)
+CASES = [
+    ('narrow prefix', 'sensor-kitchen-001', PREFIX, 'device_id', False),
+    ('narrow prefix by battery', 'sensor-kitchen-001', PREFIX, 'battery_level', False),
+    ('broad prefix by battery', 'sensor-', PREFIX, 'battery_level', False),
+    ('all devices by last_update', '', PREFIX, 'last_update', True),
+    ('selective substring', '0012345', SUBSTRING, 'device_id', False),
+    ('selective substring by rssi', 'garage-00099', SUBSTRING, 'rssi', True),
+    ('dense substring by rssi', 'kitchen', SUBSTRING, 'rssi', False),
+    ('dense substring by last_update', 'kitchen', SUBSTRING, 'last_update', True),
+]
+
+SORT_INDEXES = ['idx_device_status_battery_level', 'idx_device_status_rssi', 'idx_device_status_timestamp_epoch']
+
+
+def seed(store, size, chunk=10000):
+    fleet = Fleet(size, seed=7)
+    readings = []
+    for reading in fleet.seed_readings():
+        readings.append(reading)
+        if len(readings) == chunk:
+            store.batch_upsert(readings)
+            readings = []
+    if readings:
+        store.batch_upsert(readings)
+    return fleet
+
+
+def timings(func, runs):
+    values = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        values.append((time.perf_counter() - started) * 1000)
+    return sorted(values)
+
+
+def write_cost(path, fleet, writes):
+    # (WAL pages, microseconds) per upsert of a fresh reading, one per commit
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    rng = random.Random(11)
+    readings = [fleet.reading(fleet.pick_uniform(rng), rng) for _ in range(writes)]
+    started = time.perf_counter()
+    for reading in readings:
+        conn.execute('BEGIN')
+        conn.execute(UPSERT_SQL, upsert_params(reading, utc_now()))
+        conn.execute('COMMIT')
+    elapsed = time.perf_counter() - started
+    # WAL file: 32-byte header, then a 24-byte header per page frame
+    frames = (os.path.getsize(path + '-wal') - 32) / (page_size + 24)
+    conn.close()
+    return frames / writes, elapsed / writes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time device search on a seeded SQLite fleet')
+    parser.add_argument('--devices', type=int, default=100000, help='Fleet size')
+    parser.add_argument('--runs', type=int, default=20, help='Timed runs per case')
+    parser.add_argument('--limit', type=int, default=50, help='Page size')
+    parser.add_argument('--writes', type=int, default=5000, help='Upserts timed for the write cost')
+    parser.add_argument('--without-sort-indexes', action='store_true', help='Drop the sort indexes after seeding')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteStatusStore(os.path.join(directory, 'search.db'))
+        store.initialize()
+        started = time.perf_counter()
+        fleet = seed(store, args.devices)
+        print(f'Seeded {args.devices} devices in {time.perf_counter() - started:.1f}s')
+        if args.without_sort_indexes:
+            conn = sqlite3.connect(store.path)
+            for index in SORT_INDEXES:
+                conn.execute(f'DROP INDEX {index}')
+            conn.close()
+            store.close()
+
+        print(f"{'case':<32} {'page':>5} {'rows':>5} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, query, match, sort, descending in CASES:
+            options = {'query': query, 'match': match, 'sort': sort, 'descending': descending, 'limit': args.limit}
+            rows, after = store.search(**options)
+            pages = [('1', None, len(rows))]
+            if after is not None:
+                pages.append(('2', after, len(store.search(after=after, **options)[0])))
+            for page, page_after, count in pages:
+                values = timings(lambda: store.search(after=page_after, **options), args.runs)
+                print(f'{label:<32} {page:>5} {count:>5} {percentile(values, 0.5):>8.2f} {percentile(values, 0.99):>8.2f}')
+
+        store.close()
+        pages, micros = write_cost(store.path, fleet, args.writes)
+        print(f'Upsert: {pages:.2f} WAL pages, {micros:.0f} us per reading')
+
+
+if __name__ == '__main__':
+    main()
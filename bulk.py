@@ -0,0 +1,133 @@
+# Streaming NDJSON import/export for device_status
+# Files are processed line by line so memory use stays constant regardless
+# of file size. Gzip input is detected from its magic bytes.
+
+import gzip
+import json
+import sys
+import time
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_ndjson(path, offset=0):
+    # Open an NDJSON file (plain or gzip) for binary reading at offset
+    # For gzip files the offset counts uncompressed bytes
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    stream = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+    if offset:
+        stream.seek(offset)
+    return stream
+
+
+def open_output(path, compress=False):
+    # Open path ('-' for stdout) for binary writing
+    if path == '-':
+        return gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb') if compress else sys.stdout.buffer
+    return gzip.open(path, 'wb') if compress else open(path, 'wb')
+
+
+class ImportStats:
+    # Running totals reported while importing
+
+    def __init__(self, offset=0):
+        self.start_offset = offset
+        self.offset = offset
+        self.lines = 0
+        self.imported = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        return (self.offset - self.start_offset) / 1e6 / self.elapsed if self.elapsed else 0.0
+
+
+def parse_line(line, validate):
+    # Decode and validate one NDJSON line - returns (data, error_message)
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None, 'invalid JSON'
+    if not isinstance(data, dict):
+        return None, 'expected a JSON object'
+    try:
+        is_valid, error_message = validate(data)
+    except (AttributeError, TypeError) as e:
+        return None, str(e)
+    if not is_valid:
+        return None, error_message
+    return data, None
+
+
+def import_ndjson(store, path, validate, batch_size=5000, offset=0, on_progress=None, on_reject=None):
+    # Stream readings from path into store in batches of batch_size
+    # validate(data) -> (is_valid, error_message) is applied to every line.
+    # stats.offset only advances once a batch is committed, so it is always
+    # safe to resume from the last reported offset.
+    stats = ImportStats(offset)
+    batch = []
+    position = offset
+
+    with open_ndjson(path, offset) as stream:
+        for line in stream:
+            position += len(line)
+            stats.lines += 1
+            if not line.strip():
+                continue
+
+            data, error_message = parse_line(line, validate)
+
+            if error_message is not None:
+                stats.rejected += 1
+                if on_reject is not None:
+                    on_reject(position - len(line), error_message)
+                continue
+
+            batch.append(data)
+            if len(batch) >= batch_size:
+                stats.imported += store.batch_upsert(batch)
+                stats.offset = position
+                batch = []
+                if on_progress is not None:
+                    on_progress(stats)
+
+    if batch:
+        stats.imported += store.batch_upsert(batch)
+    stats.offset = position
+    if on_progress is not None:
+        on_progress(stats)
+    return stats
+
+
+def export_ndjson(store, path, compress=False):
+    # Stream every device row to path as NDJSON - returns rows written
+    count = 0
+    out = open_output(path, compress)
+    try:
+        for row in store.iterate_all(consistent=True):
+            record = {
+                'device_id': row['device_id'],
+                'timestamp': row['timestamp'],
+                'battery_level': row['battery_level'],
+                'rssi': row['rssi'],
+                'online': bool(row['online']),
+                'created_at': row['created_at']
+            }
+            out.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            count += 1
+    finally:
+        if out is sys.stdout.buffer:
+            out.flush()
+        else:
+            out.close()
+    return count
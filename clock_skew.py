@@ -0,0 +1,116 @@
+# Device clock skew detection
+# Each reading's timestamp is compared with the server receive time. The
+# difference (positive = device clock ahead) feeds a per-device exponentially
+# weighted moving average, so a device with a broken clock stands out even
+# when single readings are noisy.
+#
+# A reading further than max_past seconds behind or max_future seconds ahead
+# of the server is handled by mode:
+#   observe - stored as reported, only counted
+#   reject  - refused with 400 (reported by index in a batch)
+#   clamp   - stored with the server receive time as its timestamp, so
+#             ordering, timestamp_epoch and staleness stay meaningful
+#
+# Estimates are kept for the max_devices most recently seen devices. /metrics
+# gets aggregate counts only; per-device estimates are served to the
+# device's own tenant (GET /clock-skew).
+
+import os
+import threading
+from collections import OrderedDict
+
+OBSERVE = 'observe'
+REJECT = 'reject'
+CLAMP = 'clamp'
+MODES = (OBSERVE, REJECT, CLAMP)
+
+# check() results
+OK = 'ok'
+OUT_OF_BOUNDS = 'out_of_bounds'
+REJECTED = 'rejected'
+CLAMPED = 'clamped'
+
+
+def sort_key(key):
+    # device_id is not type-checked, so keys may mix strings and numbers
+    return tuple(str(part) for part in key)
+
+
+class SkewTracker:
+    # EWMA of reported minus received seconds per (tenant, device_id)
+    # The least recently seen device is dropped beyond max_devices
+
+    def __init__(self, mode=OBSERVE, max_future=300, max_past=30 * 86400, alpha=0.2, max_devices=100000):
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {MODES}')
+        self.mode = mode
+        self.max_future = max_future
+        self.max_past = max_past
+        self.alpha = alpha
+        self.max_devices = max_devices
+        self._estimates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, key, skew):
+        # Fold one reading's skew into the device's estimate - returns the estimate
+        with self._lock:
+            previous = self._estimates.get(key)
+            estimate = skew if previous is None else previous + self.alpha * (skew - previous)
+            self._estimates[key] = estimate
+            self._estimates.move_to_end(key)
+            if len(self._estimates) > self.max_devices:
+                self._estimates.popitem(last=False)
+            return estimate
+
+    def estimate(self, key):
+        return self._estimates.get(key)
+
+    def check(self, key, reported, received):
+        # Observe a reading reported at epoch `reported` and received at `received`
+        # Returns (result, skew seconds)
+        skew = reported - received
+        self.observe(key, skew)
+        if -self.max_past <= skew <= self.max_future:
+            return OK, skew
+        if self.mode == REJECT:
+            return REJECTED, skew
+        if self.mode == CLAMP:
+            return CLAMPED, skew
+        return OUT_OF_BOUNDS, skew
+
+    def skewed(self, threshold, tenant=None):
+        # (key, estimate) for devices whose estimate is at least threshold seconds off,
+        # ordered by key - only tenant's devices when tenant is given
+        with self._lock:
+            skewed = [
+                (key, estimate) for key, estimate in self._estimates.items()
+                if abs(estimate) >= threshold and (tenant is None or key[0] == tenant)
+            ]
+        return sorted(skewed, key=lambda item: sort_key(item[0]))
+
+    def gauges(self, threshold):
+        # Fleet-wide counts for /metrics - no tenant or device labels, since
+        # /metrics is unauthenticated and per-device series are unbounded
+        with self._lock:
+            tracked = len(self._estimates)
+            ahead = sum(1 for estimate in self._estimates.values() if estimate > 0 and estimate >= threshold)
+            behind = sum(1 for estimate in self._estimates.values() if estimate < 0 and -estimate >= threshold)
+        return [
+            ('clock_skew_devices', 'Devices whose smoothed clock skew is at least CLOCK_SKEW_REPORT_SECONDS off',
+             [((('direction', 'ahead'),), ahead), ((('direction', 'behind'),), behind)]),
+            ('clock_skew_tracked_devices', 'Devices with a clock skew estimate', [((), tracked)]),
+        ]
+
+
+def create_skew_tracker():
+    # Build the skew tracker from the environment, or None when disabled
+    mode = os.getenv('CLOCK_SKEW_MODE', OBSERVE).lower()
+    if mode == 'off':
+        return None
+    return SkewTracker(
+        mode,
+        max_future=float(os.getenv('CLOCK_SKEW_MAX_FUTURE_SECONDS', '300')),
+        max_past=float(os.getenv('CLOCK_SKEW_MAX_PAST_SECONDS', str(30 * 86400))),
+        alpha=float(os.getenv('CLOCK_SKEW_ALPHA', '0.2')),
+        max_devices=int(os.getenv('CLOCK_SKEW_MAX_DEVICES', '100000')),
+    )
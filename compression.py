@@ -0,0 +1,123 @@
+# HTTP body compression
+# Request bodies with Content-Encoding gzip (or zstd when the zstandard
+# package is installed) are decompressed in chunks while counting output, so
+# a small compressed body cannot expand past max_bytes in memory.
+# Responses are compressed according to Accept-Encoding once they reach a
+# size threshold.
+
+import gzip
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+from ingest_formats import PayloadError
+
+CHUNK_SIZE = 64 * 1024
+
+
+def supported_encodings():
+    # Content codings understood in both directions, preferred first
+    return ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+
+
+def too_large(max_bytes):
+    return PayloadError(f'Decompressed body exceeds {max_bytes} bytes', 413)
+
+
+def gunzip_stream(stream, max_bytes):
+    # Decompress gzip (concatenated members allowed) from a file-like object
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    parts = []
+    total = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        while chunk:
+            # max_length bounds each step; leftovers stay in unconsumed_tail
+            part = decompressor.decompress(chunk, max_bytes - total + 1)
+            total += len(part)
+            if total > max_bytes:
+                raise too_large(max_bytes)
+            parts.append(part)
+            chunk = decompressor.unconsumed_tail
+            if decompressor.eof:
+                # Start of another gzip member
+                chunk = decompressor.unused_data + chunk
+                if not chunk:
+                    break
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if not decompressor.eof:
+        raise zlib.error('incomplete gzip stream')
+    return b''.join(parts)
+
+
+def unzstd_stream(stream, max_bytes):
+    # Decompress zstd frames from a file-like object
+    reader = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    parts = []
+    total = 0
+    while True:
+        part = reader.read(CHUNK_SIZE)
+        if not part:
+            break
+        total += len(part)
+        if total > max_bytes:
+            raise too_large(max_bytes)
+        parts.append(part)
+    return b''.join(parts)
+
+
+def decompress_body(stream, encoding, max_bytes):
+    # Decoded request body for a Content-Encoding value
+    encoding = encoding.strip().lower()
+    try:
+        if encoding in ('gzip', 'x-gzip'):
+            return gunzip_stream(stream, max_bytes)
+        if encoding == 'zstd' and zstandard is not None:
+            return unzstd_stream(stream, max_bytes)
+    except PayloadError:
+        raise
+    except Exception:
+        raise PayloadError(f'Request body is not valid {encoding}')
+    raise PayloadError(f'Unsupported Content-Encoding: {encoding}', 415)
+
+
+def compress(body, encoding, level=None):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level or 3).compress(body)
+    return gzip.compress(body, compresslevel=level or 6, mtime=0)
+
+
+class ResponseCompressor:
+    # Compresses eligible responses in place
+    # Skipped for small bodies, streamed or already encoded responses, and
+    # clients that do not accept a supported coding.
+
+    def __init__(self, min_bytes=1024, level=None):
+        self.min_bytes = min_bytes
+        self.level = level
+        self.encodings = supported_encodings()
+
+    def choose_encoding(self, accept_encodings):
+        # Best coding from a werkzeug Accept-Encoding header, or None
+        return accept_encodings.best_match(self.encodings)
+
+    def apply(self, response, accept_encodings):
+        if (response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or not 200 <= response.status_code < 300):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+        encoding = self.choose_encoding(accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+        response.set_data(compress(body, encoding, self.level))
+        response.headers['Content-Encoding'] = encoding
+        return response
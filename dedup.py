@@ -0,0 +1,177 @@
+# Bounded index of ingested message ids for idempotent retries
+# Recent keys sit in an exact LRU. Every key also goes into a Bloom filter
+# for the current time bucket; buckets older than the window are dropped, so
+# memory stays fixed no matter how many messages arrive. A Bloom hit may be a
+# false positive, so callers confirm it against the stored reading before
+# dropping a message.
+#
+# With a path, the Bloom buckets are written there every save interval and
+# loaded on start-up, so retries across a restart are still recognised.
+#
+# File layout (little endian):
+#   header: magic | version | bits | hashes | bucket_seconds | bucket count
+#   per bucket: uint64 bucket number | bits / 8 bytes
+
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+MAGIC = b'DDUP'
+FILE_HEADER = struct.Struct('<4sIIIII')
+BUCKET_HEADER = struct.Struct('<Q')
+FILE_VERSION = 1
+
+# check() results
+LRU = 'lru'
+BLOOM = 'bloom'
+
+
+class DedupIndex:
+    # Exact LRU in front of time-bucketed Bloom filters
+
+    def __init__(self, lru_size=100000, window=86400, bucket_seconds=3600, bits=1 << 20, hashes=7, path=None):
+        if bits % 8:
+            raise ValueError('bits must be a multiple of 8')
+        self.lru_size = lru_size
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max(1, -(-window // bucket_seconds))
+        self.bits = bits
+        self.hashes = hashes
+        self.path = path
+        self._lru = OrderedDict()
+        self._buckets = OrderedDict()  # bucket number -> bytearray, oldest first
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if path and os.path.exists(path):
+            self.load()
+
+    def _positions(self, key):
+        # Double hashing: k bit positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.bits for index in range(self.hashes)]
+
+    def _current_bucket(self, now):
+        number = int(now // self.bucket_seconds)
+        bucket = self._buckets.get(number)
+        if bucket is None:
+            bucket = bytearray(self.bits // 8)
+            self._buckets[number] = bucket
+            self._expire(number)
+        return bucket
+
+    def _expire(self, current):
+        # Drop buckets that fell out of the window
+        while self._buckets:
+            oldest = next(iter(self._buckets))
+            if oldest > current - self.max_buckets:
+                break
+            del self._buckets[oldest]
+
+    def check(self, key, now=None):
+        # LRU when key was certainly seen, BLOOM when it probably was, else None
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return LRU
+            self._expire(int((time.time() if now is None else now) // self.bucket_seconds))
+            positions = self._positions(key)
+            for bucket in self._buckets.values():
+                if all(bucket[position >> 3] & (1 << (position & 7)) for position in positions):
+                    return BLOOM
+        return None
+
+    def add(self, key, now=None):
+        # Record key once its message has been stored
+        positions = self._positions(key)
+        with self._lock:
+            self._lru[key] = True
+            self._lru.move_to_end(key)
+            if len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+            bucket = self._current_bucket(time.time() if now is None else now)
+            for position in positions:
+                bucket[position >> 3] |= 1 << (position & 7)
+
+    def save(self):
+        # Write the Bloom buckets to path atomically
+        with self._lock:
+            buckets = [(number, bytes(bucket)) for number, bucket in self._buckets.items()]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(FILE_HEADER.pack(MAGIC, FILE_VERSION, self.bits, self.hashes, self.bucket_seconds, len(buckets)))
+            for number, bucket in buckets:
+                f.write(BUCKET_HEADER.pack(number))
+                f.write(bucket)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        # Restore buckets saved with the same parameters - returns the number loaded
+        # A file written with other parameters (or a damaged one) is ignored
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if len(data) < FILE_HEADER.size:
+            return 0
+        magic, version, bits, hashes, bucket_seconds, count = FILE_HEADER.unpack_from(data)
+        if (magic, version, bits, hashes, bucket_seconds) != (MAGIC, FILE_VERSION, self.bits, self.hashes, self.bucket_seconds):
+            return 0
+        size = self.bits // 8
+        if len(data) != FILE_HEADER.size + count * (BUCKET_HEADER.size + size):
+            return 0
+        buckets = OrderedDict()
+        offset = FILE_HEADER.size
+        for _ in range(count):
+            number = BUCKET_HEADER.unpack_from(data, offset)[0]
+            offset += BUCKET_HEADER.size
+            buckets[number] = bytearray(data[offset:offset + size])
+            offset += size
+        with self._lock:
+            self._buckets = buckets
+            self._expire(int(time.time() // self.bucket_seconds))
+            return len(self._buckets)
+
+    def start(self, interval=5.0):
+        # Save every interval seconds on a background thread
+        if self.path and self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.path:
+            self.save()
+
+    def gauges(self):
+        with self._lock:
+            lru_entries = len(self._lru)
+            buckets = len(self._buckets)
+        return [
+            ('dedup_lru_entries', 'Message ids held in the exact dedup LRU', [((), lru_entries)]),
+            ('dedup_bloom_buckets', 'Time buckets held in the dedup Bloom filter', [((), buckets)]),
+        ]
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            self.save()
+
+
+def create_dedup_index():
+    # Build the dedup index from the environment, or None when disabled
+    if os.getenv('DEDUP_INDEX', '1').lower() not in ('1', 'true', 'yes'):
+        return None
+    return DedupIndex(
+        lru_size=int(os.getenv('DEDUP_LRU_SIZE', '100000')),
+        window=int(os.getenv('DEDUP_WINDOW_SECONDS', '86400')),
+        bucket_seconds=int(os.getenv('DEDUP_BUCKET_SECONDS', '3600')),
+        bits=int(os.getenv('DEDUP_BLOOM_BITS', str(1 << 20))),
+        hashes=int(os.getenv('DEDUP_BLOOM_HASHES', '7')),
+        path=os.getenv('DEDUP_PATH') or None,
+    )
@@ -0,0 +1,226 @@
+# Columnar in-memory mirror of device_status for fleet-wide aggregation
+# Each device occupies one slot in parallel typed arrays:
+#   battery_level uint8 (1 byte), rssi int16 (2 bytes), online 1 bit,
+#   timestamp int64 epoch seconds (8 bytes)
+# Aggregates run vectorized with NumPy when it is installed and fall back
+# to plain Python loops otherwise. NumPy is imported on the first aggregate
+# rather than at import time, which keeps it off the cold-start path.
+
+import threading
+from array import array
+from datetime import datetime, timezone
+
+np = None
+_numpy_checked = False
+
+
+def load_numpy():
+    # Import NumPy once on first use - returns the module or None
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:  # NumPy is optional
+            np = None
+        _numpy_checked = True
+    return np
+
+RSSI_MIN = -32768
+RSSI_MAX = 32767
+
+
+def timestamp_to_epoch(timestamp):
+    # Convert an ISO 8601 timestamp to integer epoch seconds (naive = UTC)
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class FleetTable:
+    # Device_id -> slot index map plus one typed array per column
+
+    def __init__(self, use_numpy=True):
+        self.use_numpy = use_numpy
+        self._index = {}
+        self._device_ids = []
+        self._battery = array('B')
+        self._rssi = array('h')
+        self._timestamp = array('q')
+        self._online = bytearray()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows, use_numpy=True):
+        # Build a table from full device rows (e.g. StatusStore.iterate_all())
+        table = cls(use_numpy=use_numpy)
+        for row in rows:
+            table.upsert(row)
+        return table
+
+    def __len__(self):
+        return len(self._device_ids)
+
+    def nbytes(self):
+        # Bytes used by the column arrays
+        return (
+            len(self._battery) * self._battery.itemsize
+            + len(self._rssi) * self._rssi.itemsize
+            + len(self._timestamp) * self._timestamp.itemsize
+            + len(self._online)
+        )
+
+    def upsert(self, data):
+        # Insert or update the slot for data['device_id']
+        battery_level = data['battery_level']
+        rssi = max(RSSI_MIN, min(RSSI_MAX, data['rssi']))
+        epoch = timestamp_to_epoch(data['timestamp'])
+        online = bool(data['online'])
+
+        with self._lock:
+            slot = self._index.get(data['device_id'])
+            if slot is None:
+                slot = len(self._device_ids)
+                self._index[data['device_id']] = slot
+                self._device_ids.append(data['device_id'])
+                self._battery.append(battery_level)
+                self._rssi.append(rssi)
+                self._timestamp.append(epoch)
+                if slot % 8 == 0:
+                    self._online.append(0)
+            else:
+                self._battery[slot] = battery_level
+                self._rssi[slot] = rssi
+                self._timestamp[slot] = epoch
+
+            if online:
+                self._online[slot >> 3] |= 1 << (slot & 7)
+            else:
+                self._online[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+
+    def numpy_enabled(self):
+        return self.use_numpy and load_numpy() is not None
+
+    def aggregate(self, online=None, min_battery=None, max_battery=None, since=None):
+        # Count, online count and battery/rssi statistics for matching devices
+        with self._lock:
+            if self.numpy_enabled():
+                return self._aggregate_numpy(online, min_battery, max_battery, since)
+            return self._aggregate_python(online, min_battery, max_battery, since)
+
+    def filter_ids(self, online=None, min_battery=None, max_battery=None, since=None):
+        # Device ids matching the filters, in insertion order
+        with self._lock:
+            if self.numpy_enabled():
+                views = self._numpy_views()
+                try:
+                    mask = self._numpy_mask(views, online, min_battery, max_battery, since)
+                    return [self._device_ids[slot] for slot in np.flatnonzero(mask)]
+                finally:
+                    del views
+            return [
+                self._device_ids[slot]
+                for slot in self._python_slots(online, min_battery, max_battery, since)
+            ]
+
+    # NumPy path - views share memory with the arrays, so they must not
+    # outlive the lock or the arrays could not grow
+
+    def _numpy_views(self):
+        count = len(self._device_ids)
+        online_bits = np.unpackbits(
+            np.frombuffer(self._online, dtype=np.uint8), bitorder='little'
+        )[:count].astype(bool)
+        return {
+            'battery_level': np.frombuffer(self._battery, dtype=np.uint8),
+            'rssi': np.frombuffer(self._rssi, dtype=np.int16),
+            'timestamp': np.frombuffer(self._timestamp, dtype=np.int64),
+            'online': online_bits,
+        }
+
+    def _numpy_mask(self, views, online, min_battery, max_battery, since):
+        mask = np.ones(len(self._device_ids), dtype=bool)
+        if online is not None:
+            mask &= views['online'] if online else ~views['online']
+        if min_battery is not None:
+            mask &= views['battery_level'] >= min_battery
+        if max_battery is not None:
+            mask &= views['battery_level'] <= max_battery
+        if since is not None:
+            mask &= views['timestamp'] >= since
+        return mask
+
+    def _aggregate_numpy(self, online, min_battery, max_battery, since):
+        views = self._numpy_views()
+        try:
+            mask = self._numpy_mask(views, online, min_battery, max_battery, since)
+            count = int(mask.sum())
+            if count == 0:
+                return empty_aggregate()
+            battery = views['battery_level'][mask]
+            rssi = views['rssi'][mask]
+            return {
+                'count': count,
+                'online_count': int(views['online'][mask].sum()),
+                'battery_level': {
+                    'avg': float(battery.mean(dtype=np.float64)),
+                    'min': int(battery.min()),
+                    'max': int(battery.max()),
+                },
+                'rssi': {
+                    'avg': float(rssi.mean(dtype=np.float64)),
+                    'min': int(rssi.min()),
+                    'max': int(rssi.max()),
+                },
+            }
+        finally:
+            del views
+
+    # Pure Python fallback
+
+    def _is_online(self, slot):
+        return bool(self._online[slot >> 3] & (1 << (slot & 7)))
+
+    def _python_slots(self, online, min_battery, max_battery, since):
+        for slot in range(len(self._device_ids)):
+            if online is not None and self._is_online(slot) != online:
+                continue
+            if min_battery is not None and self._battery[slot] < min_battery:
+                continue
+            if max_battery is not None and self._battery[slot] > max_battery:
+                continue
+            if since is not None and self._timestamp[slot] < since:
+                continue
+            yield slot
+
+    def _aggregate_python(self, online, min_battery, max_battery, since):
+        slots = list(self._python_slots(online, min_battery, max_battery, since))
+        if not slots:
+            return empty_aggregate()
+        battery = [self._battery[slot] for slot in slots]
+        rssi = [self._rssi[slot] for slot in slots]
+        return {
+            'count': len(slots),
+            'online_count': sum(1 for slot in slots if self._is_online(slot)),
+            'battery_level': {
+                'avg': sum(battery) / len(battery),
+                'min': min(battery),
+                'max': max(battery),
+            },
+            'rssi': {
+                'avg': sum(rssi) / len(rssi),
+                'min': min(rssi),
+                'max': max(rssi),
+            },
+        }
+
+
+def empty_aggregate():
+    # Aggregate result when no device matches
+    return {
+        'count': 0,
+        'online_count': 0,
+        'battery_level': {'avg': None, 'min': None, 'max': None},
+        'rssi': {'avg': None, 'min': None, 'max': None},
+    }
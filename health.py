@@ -0,0 +1,180 @@
+# Deep health checks for load balancers
+# GET /health/live only says the process answers. GET /health/ready also
+# probes each SQLite file: one indexed read on a dedicated connection with a
+# short busy timeout (its latency is measured), the WAL size and the free
+# disk space, plus the write queue depth. Thresholds turn the result into
+# ok, degraded or failing.
+#
+# Probe results are cached for HEALTH_PROBE_INTERVAL seconds and only one
+# request at a time refreshes them; the others get the cached result. Polling
+# the endpoint therefore never adds more than one cheap read per interval.
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+OK = 'ok'
+DEGRADED = 'degraded'
+FAILING = 'failing'
+
+PROBE_SQL = 'SELECT 1 FROM device_status LIMIT 1'
+
+
+class DatabaseProbe:
+    # Cheap read on one SQLite file plus its WAL size and the disk free space
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self._conn = None
+
+    def connect(self):
+        # mode=rw: a missing file is an error instead of a new empty database
+        uri = 'file:' + os.path.abspath(self.path) + '?mode=rw'
+        return sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False)
+
+    def run(self):
+        result = {'path': self.path, 'latency_ms': None, 'wal_bytes': 0, 'disk_free_bytes': None, 'error': None}
+        started = time.perf_counter()
+        try:
+            if self._conn is None:
+                self._conn = self.connect()
+            self._conn.execute(PROBE_SQL).fetchall()
+            result['latency_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        except sqlite3.Error as e:
+            result['error'] = str(e)
+            self.close()
+        try:
+            result['wal_bytes'] = os.path.getsize(self.path + '-wal')
+        except OSError:
+            pass  # No WAL file outside WAL mode
+        try:
+            result['disk_free_bytes'] = shutil.disk_usage(os.path.dirname(os.path.abspath(self.path))).free
+        except OSError as e:
+            result['error'] = result['error'] or str(e)
+        return result
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class HealthThresholds:
+    # Limits past which an instance reports degraded (0 disables a check)
+
+    def __init__(self, max_latency_ms=250.0, max_wal_bytes=256 * 1024 * 1024,
+                 min_disk_free_bytes=512 * 1024 * 1024, max_write_queue=1000):
+        self.max_latency_ms = max_latency_ms
+        self.max_wal_bytes = max_wal_bytes
+        self.min_disk_free_bytes = min_disk_free_bytes
+        self.max_write_queue = max_write_queue
+
+    def evaluate(self, databases, write_queue):
+        # (status, reasons) for probe results
+        failing = []
+        degraded = []
+        for database in databases:
+            path = database['path']
+            if database['error'] is not None:
+                failing.append(f"{path}: {database['error']}")
+                continue
+            if self.max_latency_ms and database['latency_ms'] > self.max_latency_ms:
+                degraded.append(f"{path}: probe took {database['latency_ms']} ms")
+            if self.max_wal_bytes and database['wal_bytes'] > self.max_wal_bytes:
+                degraded.append(f"{path}: WAL is {database['wal_bytes']} bytes")
+            free = database['disk_free_bytes']
+            if self.min_disk_free_bytes and free is not None and free < self.min_disk_free_bytes:
+                degraded.append(f"{path}: {free} bytes free on disk")
+        if self.max_write_queue and write_queue > self.max_write_queue:
+            degraded.append(f'{write_queue} writes queued')
+        if failing:
+            return FAILING, failing + degraded
+        return (DEGRADED if degraded else OK), degraded
+
+
+class HealthMonitor:
+    # Cached, single-flight health probes
+    # paths() returns the SQLite files to probe and write_queue() the number
+    # of writes accepted but not yet applied; both are called on refresh only.
+
+    def __init__(self, paths, write_queue, thresholds=None, interval=5.0, timeout=0.5):
+        self.paths = paths
+        self.write_queue = write_queue
+        self.thresholds = thresholds or HealthThresholds()
+        self.interval = interval
+        self.timeout = timeout
+        self._probes = {}
+        self._state = None  # (result, monotonic time of the probe)
+        self._lock = threading.Lock()
+
+    def check(self):
+        # Latest result, refreshed when older than interval
+        state = self._state
+        if state is not None and time.monotonic() - state[1] < self.interval:
+            return with_age(state)
+        # Another request is probing: serve the previous result rather than wait
+        if not self._lock.acquire(blocking=state is None):
+            return with_age(state)
+        try:
+            state = self._state
+            if state is None or time.monotonic() - state[1] >= self.interval:
+                state = self._state = (self.refresh(), time.monotonic())
+        finally:
+            self._lock.release()
+        return with_age(state)
+
+    def refresh(self):
+        databases = []
+        for path in self.paths():
+            probe = self._probes.get(path)
+            if probe is None:
+                probe = self._probes[path] = DatabaseProbe(path, self.timeout)
+            databases.append(probe.run())
+        write_queue = self.write_queue()
+        status, reasons = self.thresholds.evaluate(databases, write_queue)
+        return {'status': status, 'reasons': reasons, 'databases': databases, 'write_queue': write_queue}
+
+    def gauges(self):
+        # Gauges for /metrics from the cached result - never probes
+        if self._state is None:
+            return []
+        result = self._state[0]
+        databases = result['databases']
+        return [
+            ('health_probe_latency_seconds', 'Latency of the last readiness database probe',
+             [((('path', db['path']),), db['latency_ms'] / 1000) for db in databases if db['latency_ms'] is not None]),
+            ('sqlite_wal_bytes', 'Size of the SQLite write-ahead log at the last probe',
+             [((('path', db['path']),), db['wal_bytes']) for db in databases]),
+            ('disk_free_bytes', 'Free disk space next to the database at the last probe',
+             [((('path', db['path']),), db['disk_free_bytes']) for db in databases
+              if db['disk_free_bytes'] is not None]),
+            ('write_queue_depth', 'Writes accepted but not yet applied at the last probe',
+             [((), result['write_queue'])]),
+        ]
+
+    def close(self):
+        for probe in self._probes.values():
+            probe.close()
+
+
+def with_age(state):
+    result, checked = state
+    return dict(result, age_seconds=round(time.monotonic() - checked, 3))
+
+
+def create_health_monitor(paths, write_queue):
+    # Build a HealthMonitor from HEALTH_* environment variables
+    thresholds = HealthThresholds(
+        max_latency_ms=float(os.getenv('HEALTH_MAX_LATENCY_MS', '250')),
+        max_wal_bytes=int(os.getenv('HEALTH_MAX_WAL_BYTES', str(256 * 1024 * 1024))),
+        min_disk_free_bytes=int(os.getenv('HEALTH_MIN_DISK_FREE_BYTES', str(512 * 1024 * 1024))),
+        max_write_queue=int(os.getenv('HEALTH_MAX_WRITE_QUEUE', '1000')),
+    )
+    return HealthMonitor(
+        paths, write_queue, thresholds,
+        interval=float(os.getenv('HEALTH_PROBE_INTERVAL', '5')),
+        timeout=float(os.getenv('HEALTH_PROBE_TIMEOUT_MS', '500')) / 1000,
+    )
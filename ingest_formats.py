@@ -0,0 +1,135 @@
+# Compact binary ingest encodings, selected by Content-Type
+#   application/msgpack (or application/x-msgpack) - MessagePack, needs msgpack
+#   application/cbor                                - CBOR, needs cbor2
+#   application/vnd.device-status.struct            - fixed-width batch frames
+# Every decoder produces the same dicts as JSON so validate_device_data
+# applies unchanged.
+#
+# Struct frame layout (little endian):
+#   header  '<2sBH'     magic b'DS', version 1, record count
+#   record  '<32sqBhB'  device_id (UTF-8, NUL padded), timestamp (epoch ms),
+#                       battery_level (uint8), rssi (int16), online (uint8)
+# That is 44 bytes per reading against roughly 110 bytes of JSON.
+
+import struct
+import time
+from datetime import datetime, timezone
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # cbor2 is optional
+    cbor2 = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+STRUCT = 'application/vnd.device-status.struct'
+
+MIMETYPE_ALIASES = {'application/x-msgpack': MSGPACK}
+
+FRAME_HEADER = struct.Struct('<2sBH')
+FRAME_RECORD = struct.Struct('<32sqBhB')
+FRAME_MAGIC = b'DS'
+FRAME_VERSION = 1
+MAX_FRAME_RECORDS = 0xFFFF
+
+
+class PayloadError(ValueError):
+    # Request body cannot be decoded - status is the HTTP code to return
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def epoch_ms_to_iso(epoch_ms):
+    # 1750341600000 -> '2025-06-19T14:00:00Z' (milliseconds kept when non-zero)
+    # time.gmtime is about twice as fast as datetime.strftime per reading
+    seconds, millis = divmod(epoch_ms, 1000)
+    text = '%04d-%02d-%02dT%02d:%02d:%02d' % time.gmtime(seconds)[:6]
+    if millis:
+        return f'{text}.{millis:03d}Z'
+    return text + 'Z'
+
+
+def iso_to_epoch_ms(timestamp):
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(round(parsed.timestamp() * 1000))
+
+
+def encode_struct_frame(readings):
+    # Pack readings (dicts as sent to POST /status) into one struct frame
+    if len(readings) > MAX_FRAME_RECORDS:
+        raise ValueError(f'a frame holds at most {MAX_FRAME_RECORDS} readings')
+    parts = [FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(readings))]
+    for reading in readings:
+        device_id = reading['device_id'].encode('utf-8')
+        if len(device_id) > 32:
+            raise ValueError('device_id longer than 32 bytes cannot be packed')
+        parts.append(FRAME_RECORD.pack(
+            device_id,
+            iso_to_epoch_ms(reading['timestamp']),
+            reading['battery_level'],
+            reading['rssi'],
+            1 if reading['online'] else 0
+        ))
+    return b''.join(parts)
+
+
+def decode_struct_frame(body):
+    # Unpack a struct frame into a list of reading dicts
+    if len(body) < FRAME_HEADER.size:
+        raise PayloadError('struct frame is shorter than its header')
+    magic, version, count = FRAME_HEADER.unpack_from(body)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise PayloadError('unsupported struct frame (bad magic or version)')
+    if len(body) != FRAME_HEADER.size + count * FRAME_RECORD.size:
+        raise PayloadError(f'struct frame length does not match {count} records')
+
+    readings = []
+    for device_id, epoch_ms, battery_level, rssi, online in FRAME_RECORD.iter_unpack(body[FRAME_HEADER.size:]):
+        try:
+            device_id = device_id.rstrip(b'\0').decode('utf-8')
+        except UnicodeDecodeError:
+            raise PayloadError('device_id is not valid UTF-8')
+        try:
+            timestamp = epoch_ms_to_iso(epoch_ms)
+        except (OverflowError, OSError, ValueError):
+            raise PayloadError('timestamp is out of range')
+        readings.append({
+            'device_id': device_id,
+            'timestamp': timestamp,
+            'battery_level': battery_level,
+            'rssi': rssi,
+            'online': bool(online),
+        })
+    return readings
+
+
+def decode_payload(body, mimetype, allow_struct=False):
+    # Decode a non-JSON request body by mimetype
+    mimetype = MIMETYPE_ALIASES.get(mimetype, mimetype)
+    if mimetype == MSGPACK:
+        if msgpack is None:
+            raise PayloadError('application/msgpack requires the msgpack package', 415)
+        try:
+            return msgpack.unpackb(body, raw=False, strict_map_key=True)
+        except (ValueError, TypeError):
+            raise PayloadError('Invalid MessagePack body')
+    if mimetype == CBOR:
+        if cbor2 is None:
+            raise PayloadError('application/cbor requires the cbor2 package', 415)
+        try:
+            return cbor2.loads(body)
+        except (ValueError, TypeError):
+            raise PayloadError('Invalid CBOR body')
+    if mimetype == STRUCT and allow_struct:
+        return decode_struct_frame(body)
+    raise PayloadError(f'Unsupported Content-Type: {mimetype or "none"}', 415)
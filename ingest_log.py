@@ -0,0 +1,164 @@
+# Append-only write-ahead log for device status ingest
+# Every accepted reading is appended (and fsynced) before it is acknowledged,
+# so a crash between the acknowledgement and the storage commit loses nothing.
+#
+# Record layout (little endian):
+#   uint32 payload length | uint32 crc32(payload) | payload
+# The payload is compact JSON: [created_at, data]. A torn or corrupt record
+# at the tail marks the end of the log.
+
+import json
+import os
+import struct
+import threading
+import zlib
+
+HEADER = struct.Struct('<II')
+
+FSYNC_MODES = ('batch', 'off')
+
+
+class IngestLog:
+    # Sequential ingest log with group-commit fsync batching
+    # fsync_mode='batch': append() returns once an fsync covers the record;
+    #   concurrent writers share one fsync, optionally waiting fsync_delay
+    #   seconds for more records to join the batch.
+    # fsync_mode='off': records are flushed to the OS but never fsynced.
+
+    def __init__(self, path, fsync_mode='batch', fsync_delay=0.0):
+        if fsync_mode not in FSYNC_MODES:
+            raise ValueError(f'fsync_mode must be one of {FSYNC_MODES}')
+        self.path = path
+        self.fsync_mode = fsync_mode
+        self.fsync_delay = fsync_delay
+        self._file = open(path, 'ab')
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._in_flight = 0
+        self._checkpointing = False
+
+    def close(self):
+        with self._cond:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def size(self):
+        # Current log size in bytes
+        with self._cond:
+            self._file.flush()
+            return self._file.tell()
+
+    def append(self, data, created_at):
+        # Durably append one reading - call done() once it has been applied
+        self.append_many([data], created_at)
+
+    def append_many(self, items, created_at):
+        # Durably append a batch of readings under one lock acquisition and one
+        # fsync - call done() once per reading after the batch is applied
+        # Appending them one by one could block on a checkpoint that is waiting
+        # for the batch's own earlier readings.
+        frames = []
+        for data in items:
+            payload = json.dumps([created_at, data], separators=(',', ':')).encode('utf-8')
+            frames.append(HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        if not frames:
+            return
+
+        with self._cond:
+            while self._checkpointing:
+                self._cond.wait()
+            self._file.write(b''.join(frames))
+            self._written += len(frames)
+            self._in_flight += len(frames)
+            sequence = self._written
+
+            if self.fsync_mode == 'off':
+                self._file.flush()
+                return
+
+            while self._synced < sequence:
+                if self._syncing:
+                    # Another writer is syncing; its fsync may cover us
+                    self._cond.wait()
+                    continue
+                self._sync_locked()
+
+    def _sync_locked(self):
+        # Become the group-commit leader: fsync everything written so far
+        self._syncing = True
+        try:
+            if self.fsync_delay:
+                self._cond.wait(self.fsync_delay)
+            self._file.flush()
+            target = self._written
+            fd = self._file.fileno()
+            # Let other writers append while the disk flush runs
+            self._cond.release()
+            try:
+                os.fsync(fd)
+            finally:
+                self._cond.acquire()
+            self._synced = max(self._synced, target)
+        finally:
+            self._syncing = False
+            self._cond.notify_all()
+
+    def pending(self):
+        # Readings appended but not yet applied to storage
+        return self._in_flight
+
+    def done(self):
+        # Mark one appended reading as applied to storage
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def checkpoint(self, flush=None):
+        # Truncate the log once every appended reading is durable in storage
+        # flush() is called first (e.g. to checkpoint an in-memory store);
+        # new appends are blocked until the truncate finishes.
+        with self._cond:
+            self._checkpointing = True
+            try:
+                while self._in_flight > 0:
+                    self._cond.wait()
+                if flush is not None:
+                    flush()
+                self._file.flush()
+                self._file.truncate(0)
+                self._file.seek(0)
+                os.fsync(self._file.fileno())
+            finally:
+                self._checkpointing = False
+                self._cond.notify_all()
+
+    def replay(self):
+        # Yield every intact record as a device row including created_at
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                length, checksum = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    # Torn write from a crash - nothing after it was acknowledged
+                    return
+                created_at, data = json.loads(payload)
+                data['created_at'] = created_at
+                yield data
+
+
+def create_ingest_log():
+    # Build the ingest log from the environment, or None when disabled
+    path = os.getenv('INGEST_LOG_PATH')
+    if not path:
+        return None
+    return IngestLog(
+        path,
+        fsync_mode=os.getenv('INGEST_LOG_FSYNC', 'batch'),
+        fsync_delay=float(os.getenv('INGEST_LOG_FSYNC_DELAY_MS', '0')) / 1000
+    )
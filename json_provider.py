@@ -0,0 +1,169 @@
+# Fast JSON serialization
+# FastJSONProvider uses orjson when it is installed and falls back to
+# Flask's standard provider otherwise (JSON_ENCODER=auto|orjson|stdlib).
+# SummaryFragmentCache keeps each device's encoded summary entry so a full
+# summary response is a byte join instead of a re-encode of every device.
+
+import json
+import os
+import threading
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+
+def use_orjson():
+    # Whether the fast encoder is selected and available
+    choice = os.getenv('JSON_ENCODER', 'auto')
+    if choice == 'stdlib':
+        return False
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_ENCODER=orjson but orjson is not installed (pip install orjson)')
+    return orjson is not None
+
+
+def orjson_compact(obj):
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+
+
+def stdlib_compact(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def select_encoder():
+    # Function producing compact, key-sorted JSON bytes like jsonify
+    return orjson_compact if use_orjson() else stdlib_compact
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Flask JSON provider backed by orjson
+    # Types orjson cannot encode natively go through Flask's default hook.
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Callers asking for stdlib options (indent, cls, ...) get stdlib
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            # Pretty-printed output in debug mode, as with the default provider
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_SORT_KEYS)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def create_json_provider(app):
+    # Provider instance for app.json
+    if use_orjson():
+        return FastJSONProvider(app)
+    return DefaultJSONProvider(app)
+
+
+class SummaryFragmentCache:
+    # Encoded summary entries per device, kept in device_id order
+    # _parts holds one encoded fragment per entry of the sorted _ids list, so
+    # a render is a single bytes join. invalidate() is a store listener; a
+    # stale device keeps its previous fragment until refreshed, so a device
+    # written during a render still appears with its last known state.
+    # Devices seen for the first time join _ids once their fragment exists.
+
+    def __init__(self, format_row, rebuild_fraction=0.05, encoder=None):
+        self.format_row = format_row
+        self.rebuild_fraction = rebuild_fraction
+        self.encoder = encoder or select_encoder()
+        self._ids = []
+        self._parts = []
+        self._position = {}
+        self._stale = {}
+        self._complete = False
+        self._token = 0
+        self._body = None
+        self._body_token = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def invalidate(self, data):
+        # Mark data['device_id'] for re-encoding on the next render
+        with self._lock:
+            self._token += 1
+            self._stale[data['device_id']] = self._token
+
+    def encode(self, row):
+        return self.encoder(self.format_row(row))
+
+    def render(self, store):
+        # Full summary body: {"devices":[...]} as bytes, like jsonify
+        with self._lock:
+            if self._body is not None and self._body_token == self._token:
+                # Nothing written since the last render
+                return self._body
+            complete = self._complete
+            stale = dict(self._stale)
+            known = len(self._ids)
+
+        if not complete or len(stale) > max(100, self.rebuild_fraction * known):
+            self._rebuild(store)
+        else:
+            self._refresh(store, stale)
+
+        with self._lock:
+            token = self._token
+            fresh = not self._stale
+            body = b'{"devices":[' + b','.join(self._parts) + b']}\n'
+            if fresh:
+                self._body, self._body_token = body, token
+        return body
+
+    def _refresh(self, store, stale):
+        # Re-encode a few stale devices with point reads
+        added = {}
+        for device_id, token in stale.items():
+            row = store.get(device_id)
+            fragment = self.encode(row) if row is not None else None
+            with self._lock:
+                if fragment is not None:
+                    position = self._position.get(device_id)
+                    if position is None:
+                        added[device_id] = fragment
+                    else:
+                        self._parts[position] = fragment
+                if self._stale.get(device_id) == token:
+                    del self._stale[device_id]
+        if added:
+            with self._lock:
+                merged = dict(zip(self._ids, self._parts))
+                merged.update(added)
+                self._set_entries(sorted(merged.items()))
+
+    def _rebuild(self, store):
+        # Re-encode every device from one summary scan
+        with self._lock:
+            stale_before = dict(self._stale)
+        entries = [(row['device_id'], self.encode(row)) for row in store.iterate_summary()]
+
+        with self._lock:
+            # Devices invalidated during the scan stay stale
+            for device_id, token in stale_before.items():
+                if self._stale.get(device_id) == token:
+                    del self._stale[device_id]
+            self._set_entries(entries)
+            self._complete = True
+
+    def _set_entries(self, entries):
+        # Replace the cache with sorted (device_id, fragment) pairs
+        self._ids = [device_id for device_id, _ in entries]
+        self._parts = [fragment for _, fragment in entries]
+        self._position = {device_id: i for i, device_id in enumerate(self._ids)}
@@ -0,0 +1,235 @@
+# Prometheus-style metrics with per-thread counters
+# Each thread updates its own shard without locking; /metrics sums the shards
+# at scrape time. With METRICS_DIR set, every worker process periodically
+# writes its totals to METRICS_DIR/metrics-<pid>.json and a scrape of any
+# worker merges all of them.
+
+import bisect
+import glob
+import json
+import os
+import threading
+
+# Fixed latency buckets in seconds (upper bounds, +Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, label names)
+METRIC_DEFINITIONS = {
+    'http_requests_total': ('counter', 'HTTP requests by route, method and status code', ('route', 'method', 'status')),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by route and method', ('route', 'method')),
+    'sqlite_query_duration_seconds': ('histogram', 'SQLite statement execute+fetch time by operation', ('operation',)),
+    'sqlite_rows_returned_total': ('counter', 'Rows returned by SQLite reads by operation', ('operation',)),
+    'sqlite_connections_total': ('counter', 'SQLite connections opened', ()),
+    'admission_requests_total': ('counter', 'Requests admitted or rejected by admission class', ('class', 'outcome')),
+    'admission_queue_seconds': ('histogram', 'Time admitted requests waited for a slot by class', ('class',)),
+    'ingest_dedup_total': ('counter', 'Keyed readings by dedup result (lru, bloom, false_positive, new)', ('result',)),
+    'clock_skew_readings_total': ('counter', 'Readings by clock skew check result (ok, out_of_bounds, rejected, clamped)', ('result',)),
+}
+
+
+class MetricsRegistry:
+    # Counters and fixed-bucket histograms sharded per thread
+    # Shards of finished threads are folded into a retired total so servers
+    # that start a thread per request do not accumulate shards.
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards = []
+        self._retired = new_snapshot()
+        self._registrations = 0
+        self._shards_lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = new_snapshot()
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), shard))
+                self._registrations += 1
+                if self._registrations % 64 == 0:
+                    self._retire_dead_locked()
+            return shard
+
+    def _retire_dead_locked(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                merge_into(self._retired, shard)
+        self._shards = live
+
+    def inc(self, name, labels=(), value=1):
+        # Add value to a counter
+        counters = self._shard()['counters']
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, seconds):
+        # Record one observation in a histogram
+        histograms = self._shard()['histograms']
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (last slot is +Inf), then sum, then count
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        histogram[bisect.bisect_left(self.buckets, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+    def collect(self):
+        # Sum every thread shard - returns {'counters': {...}, 'histograms': {...}}
+        with self._shards_lock:
+            self._retire_dead_locked()
+            shards = [shard for thread, shard in self._shards]
+            totals = merge_into(new_snapshot(), self._retired)
+        for shard in shards:
+            # Copy first: the owning thread may be updating the shard
+            merge_into(totals, {
+                'counters': dict(shard['counters']),
+                'histograms': {key: list(value) for key, value in list(shard['histograms'].items())},
+            })
+        return totals
+
+    def reset(self):
+        with self._shards_lock:
+            self._retired = new_snapshot()
+            for thread, shard in self._shards:
+                shard['counters'].clear()
+                shard['histograms'].clear()
+
+
+def new_snapshot():
+    return {'counters': {}, 'histograms': {}}
+
+
+def merge_into(totals, snapshot):
+    # Add one snapshot's counters and histograms into totals
+    for key, value in snapshot['counters'].items():
+        totals['counters'][key] = totals['counters'].get(key, 0) + value
+    for key, value in snapshot['histograms'].items():
+        existing = totals['histograms'].get(key)
+        if existing is None:
+            totals['histograms'][key] = list(value)
+        else:
+            for i, item in enumerate(value):
+                existing[i] += item
+    return totals
+
+
+def dump_snapshot(snapshot):
+    # JSON-serialisable form of a collect() result
+    return {
+        kind: [[name, list(labels), value] for (name, labels), value in items.items()]
+        for kind, items in snapshot.items()
+    }
+
+
+def load_snapshot(data):
+    return {
+        kind: {(name, tuple(labels)): value for name, labels, value in items}
+        for kind, items in data.items()
+    }
+
+
+class ProcessExporter:
+    # Periodically writes this process's totals to a shared directory
+
+    def __init__(self, registry, directory, interval=5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dump_snapshot(self.registry.collect()), f)
+        os.replace(tmp_path, self.path)
+
+    def collect_all(self):
+        # This process's live totals merged with every other process's file
+        totals = self.registry.collect()
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == self.path:
+                continue
+            try:
+                with open(path) as f:
+                    merge_into(totals, load_snapshot(json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return totals
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(snapshot, buckets=LATENCY_BUCKETS, gauges=()):
+    # Render a collect() result in the Prometheus text exposition format
+    # gauges is an iterable of (name, help, samples) computed at scrape time,
+    # where samples is a list of (((label, value), ...), gauge_value)
+    lines = []
+    for name, (kind, help_text, label_names) in METRIC_DEFINITIONS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(snapshot['counters'].items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(label_names, labels)} {format_value(value)}')
+        else:
+            for (metric, labels), histogram in sorted(snapshot['histograms'].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), histogram):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{format_labels(label_names, labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(label_names, labels)} {format_value(histogram[-2])}')
+                lines.append(f'{name}_count{format_labels(label_names, labels)} {histogram[-1]}')
+    for name, help_text, samples in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for label_pairs, value in samples:
+            lines.append(f'{name}{format_labels((), (), label_pairs)} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry used by the app and the storage layer
+registry = MetricsRegistry()
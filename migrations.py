@@ -0,0 +1,332 @@
+# Versioned schema migrations for the SQLite databases
+# Each migration has a version, quick DDL that runs in one transaction, and
+# an optional backfill. Applied versions are recorded in schema_migrations.
+# Backfills run later in small batched transactions, walking the table in
+# primary key order, and store their cursor after every batch. Writers can
+# interleave between batches, and an interrupted backfill resumes where it
+# stopped.
+#
+# New migrations are appended to MIGRATIONS with the next version number;
+# released migrations are never edited.
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+CREATE_MIGRATIONS_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL,
+        backfill_cursor TEXT,
+        backfill_rows INTEGER NOT NULL DEFAULT 0,
+        backfilled_at TEXT
+    )
+'''
+
+CREATE_DEVICE_STATUS_SQL = '''
+    CREATE TABLE IF NOT EXISTS device_status (
+        device_id TEXT PRIMARY KEY,
+        timestamp TEXT NOT NULL,
+        battery_level INTEGER NOT NULL,
+        rssi INTEGER NOT NULL,
+        online BOOLEAN NOT NULL,
+        created_at TEXT NOT NULL
+    )
+'''
+
+
+class Backfill:
+    # Batched UPDATE of table rows in key order: SET <assignment>
+
+    def __init__(self, table, key, assignment):
+        self.table = table
+        self.key = key
+        self.assignment = assignment
+
+    def run_batch(self, conn, cursor, batch_size):
+        # Update the next batch_size rows after cursor - returns (last_key, rows) or (None, 0) when done
+        # A None cursor starts from the first key, '' included
+        if cursor is None:
+            keys = conn.execute(
+                f'SELECT {self.key} FROM {self.table} ORDER BY {self.key} LIMIT ?', (batch_size,)
+            ).fetchall()
+        else:
+            keys = conn.execute(
+                f'SELECT {self.key} FROM {self.table} WHERE {self.key} > ? ORDER BY {self.key} LIMIT ?',
+                (cursor, batch_size)
+            ).fetchall()
+        if not keys:
+            return None, 0
+        first, last = keys[0][0], keys[-1][0]
+        self.apply(conn, first, last)
+        return last, len(keys)
+
+    def apply(self, conn, first, last):
+        conn.execute(
+            f'UPDATE {self.table} SET {self.assignment} WHERE {self.key} >= ? AND {self.key} <= ?',
+            (first, last)
+        )
+
+
+class IndexBackfill(Backfill):
+    # Batched copy of table keys into an FTS5 table that stores the key itself
+    # The index's insert trigger skips keys past the backfill cursor, so every
+    # row is indexed once: by the trigger or by the batch that reaches it.
+
+    def __init__(self, table, key, index):
+        super().__init__(table, key, None)
+        self.index = index
+
+    def apply(self, conn, first, last):
+        conn.execute(
+            f'INSERT INTO {self.index} ({self.key}) '
+            f'SELECT {self.key} FROM {self.table} WHERE {self.key} >= ? AND {self.key} <= ?',
+            (first, last)
+        )
+
+
+class Migration:
+    # statements run in one transaction. A migration with slow DDL passes
+    # steps instead: a list of statement lists, each run in its own
+    # transaction so writers get the lock between them. Every step must be
+    # safe to repeat (IF NOT EXISTS), since a crash can interrupt the
+    # sequence; the version is recorded with the last step.
+
+    def __init__(self, version, name, statements=(), backfill=None, steps=None):
+        self.version = version
+        self.name = name
+        self.steps = steps if steps is not None else [statements]
+        self.backfill = backfill
+
+
+MIGRATIONS = [
+    Migration(1, 'create device_status', [CREATE_DEVICE_STATUS_SQL]),
+    Migration(
+        2, 'add device_status.timestamp_epoch',
+        ['ALTER TABLE device_status ADD COLUMN timestamp_epoch INTEGER'],
+        Backfill('device_status', 'device_id', "timestamp_epoch = CAST(strftime('%s', timestamp) AS INTEGER)")
+    ),
+    # Sort indexes start with (column, device_id), device_id being the keyset
+    # tie-breaker, and cover every other column a search returns. Each is
+    # built in its own transaction. device_search is a trigram index that
+    # stores device_id under its own rowid, so renumbered device_status rowids
+    # (VACUUM, table rebuilds) cannot break it. Triggers keep it in step;
+    # upserts never change device_id, so they never touch it.
+    Migration(
+        3, 'add device search indexes',
+        steps=[
+            ['CREATE INDEX IF NOT EXISTS idx_device_status_battery_level ON device_status '
+             '(battery_level, device_id, timestamp, rssi, online, timestamp_epoch)'],
+            ['CREATE INDEX IF NOT EXISTS idx_device_status_rssi ON device_status '
+             '(rssi, device_id, timestamp, battery_level, online, timestamp_epoch)'],
+            ['CREATE INDEX IF NOT EXISTS idx_device_status_timestamp_epoch ON device_status '
+             '(timestamp_epoch, device_id, timestamp, battery_level, rssi, online)'],
+            [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS device_search USING fts5(device_id, tokenize='trigram')",
+                # Ids past the backfill cursor, or every id before its first batch, are left to the backfill
+                '''CREATE TRIGGER IF NOT EXISTS device_search_insert AFTER INSERT ON device_status
+                WHEN NOT EXISTS (
+                    SELECT 1 FROM schema_migrations
+                    WHERE version = 3 AND backfilled_at IS NULL
+                    AND (backfill_cursor IS NULL OR backfill_cursor < new.device_id)
+                )
+                BEGIN
+                    INSERT INTO device_search (device_id) VALUES (new.device_id);
+                END''',
+                # The phrase match finds the entry through the index; trigrams need
+                # three characters, so shorter ids are looked up by a scan
+                '''CREATE TRIGGER IF NOT EXISTS device_search_update AFTER UPDATE OF device_id ON device_status BEGIN
+                    DELETE FROM device_search
+                    WHERE device_search MATCH '"' || replace(old.device_id, '"', '""') || '"' AND device_id = old.device_id;
+                    DELETE FROM device_search WHERE length(old.device_id) < 3 AND device_id = old.device_id;
+                    INSERT INTO device_search (device_id) VALUES (new.device_id);
+                END''',
+                '''CREATE TRIGGER IF NOT EXISTS device_search_delete AFTER DELETE ON device_status BEGIN
+                    DELETE FROM device_search
+                    WHERE device_search MATCH '"' || replace(old.device_id, '"', '""') || '"' AND device_id = old.device_id;
+                    DELETE FROM device_search WHERE length(old.device_id) < 3 AND device_id = old.device_id;
+                END''',
+            ],
+        ],
+        backfill=IndexBackfill('device_status', 'device_id', 'device_search')
+    ),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def now():
+    return datetime.utcnow().isoformat()
+
+
+def applied_versions(conn):
+    conn.execute(CREATE_MIGRATIONS_SQL)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    # Apply pending DDL in version order - returns the versions applied
+    # A backfill on a table that is still empty is marked done straight away.
+    applied = []
+    done = applied_versions(conn)
+    conn.commit()
+    for migration in migrations:
+        if migration.version in done:
+            continue
+        if _apply(conn, migration):
+            applied.append(migration.version)
+    return applied
+
+
+def _apply(conn, migration):
+    # Run migration's steps, recording it with the last one - returns False
+    # when another process applied it first
+    for index, statements in enumerate(migration.steps):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if migration.version in applied_versions(conn):
+                # Another process got there first
+                conn.rollback()
+                return False
+            for statement in statements:
+                conn.execute(statement)
+            if index == len(migration.steps) - 1:
+                backfilled_at = None
+                if migration.backfill is None or not conn.execute(
+                        f'SELECT 1 FROM {migration.backfill.table} LIMIT 1').fetchone():
+                    backfilled_at = now()
+                conn.execute(
+                    'INSERT INTO schema_migrations (version, name, applied_at, backfill_cursor, backfilled_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (migration.version, migration.name, now(), None, backfilled_at)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return True
+
+
+def migration_status(conn, migrations=MIGRATIONS):
+    # One dict per known migration: applied, backfill progress
+    conn.execute(CREATE_MIGRATIONS_SQL)
+    rows = {
+        row[0]: row for row in conn.execute(
+            'SELECT version, applied_at, backfill_rows, backfilled_at FROM schema_migrations')
+    }
+    status = []
+    for migration in migrations:
+        row = rows.get(migration.version)
+        status.append({
+            'version': migration.version,
+            'name': migration.name,
+            'applied_at': row[1] if row else None,
+            'backfill_rows': row[2] if row else 0,
+            'backfill_done': bool(row and row[3]),
+        })
+    return status
+
+
+def run_backfills(conn, batch_size=1000, pause=0.0, on_progress=None, stop=None, migrations=MIGRATIONS):
+    # Run every unfinished backfill in batches - returns rows updated
+    # Each batch and its cursor commit together, so a restart resumes after
+    # the last committed batch. pause (seconds) between batches leaves room
+    # for writers; stop is an optional threading.Event.
+    pending = {
+        row[0]: row for row in conn.execute(
+            'SELECT version, backfill_cursor, backfill_rows FROM schema_migrations '
+            'WHERE backfilled_at IS NULL ORDER BY version')
+    }
+    total = 0
+    for migration in migrations:
+        if migration.version not in pending or migration.backfill is None:
+            continue
+        _, cursor, rows = pending[migration.version]
+        while True:
+            if stop is not None and stop.is_set():
+                return total
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT backfilled_at FROM schema_migrations WHERE version = ?',
+                                (migration.version,)).fetchone()[0] is not None:
+                    # Finished by another process
+                    conn.rollback()
+                    break
+                last, count = migration.backfill.run_batch(conn, cursor, batch_size)
+                if last is None:
+                    conn.execute(
+                        'UPDATE schema_migrations SET backfilled_at = ? WHERE version = ?',
+                        (now(), migration.version)
+                    )
+                else:
+                    rows += count
+                    conn.execute(
+                        'UPDATE schema_migrations SET backfill_cursor = ?, backfill_rows = ? WHERE version = ?',
+                        (last, rows, migration.version)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if last is None:
+                break
+            cursor = last
+            total += count
+            if on_progress is not None:
+                on_progress(migration, rows)
+            if pause:
+                time.sleep(pause)
+    return total
+
+
+class BackfillRunner:
+    # Runs backfills for one or more database files on a background thread
+
+    def __init__(self, paths, batch_size=1000, pause=0.01, logger=None, log_every=100):
+        self.paths = list(paths)
+        self.batch_size = batch_size
+        self.pause = pause
+        self.logger = logger or logging.getLogger(__name__)
+        self.log_every = log_every
+        self.rows = 0
+        self.running = False
+        self.error = None
+        self._batches = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _progress(self, migration, rows):
+        self._batches += 1
+        if self._batches % self.log_every == 0:
+            self.logger.info('Backfill %d (%s): %d rows', migration.version, migration.name, rows)
+
+    def _run(self):
+        try:
+            for path in self.paths:
+                conn = sqlite3.connect(path, timeout=30)
+                try:
+                    self.rows += run_backfills(
+                        conn, self.batch_size, self.pause, self._progress, self._stop
+                    )
+                finally:
+                    conn.close()
+        except Exception as e:
+            self.error = e
+            self.logger.exception('Backfill failed - it resumes from its last batch on restart')
+        finally:
+            self.running = False
@@ -0,0 +1,186 @@
+# Opt-in request profiling
+# Phase timers split a request into auth, parse, validate, db_execute,
+# db_fetch, format and serialize. Times are exclusive: a phase nested inside
+# another (db_fetch inside format for streamed summaries) is subtracted from
+# its parent. Requests slower than the threshold are logged as one JSON line.
+#
+# The sampling profiler snapshots the request thread's stack at a fixed
+# interval and writes the counts in folded format ("a;b;c 12"), which
+# flamegraph.pl and speedscope read directly.
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context
+
+slow_request_logger = logging.getLogger('slow_requests')
+
+
+class PhaseTimer:
+    # Accumulates exclusive time per phase for one request
+
+    def __init__(self):
+        self.phases = {}
+        self._child_time = [0.0]
+
+    def enter(self):
+        self._child_time.append(0.0)
+
+    def exit(self, name, elapsed):
+        children = self._child_time.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed - children
+        self._child_time[-1] += elapsed
+
+    def record(self, name, elapsed):
+        # Leaf timing measured elsewhere (e.g. inside the storage layer)
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed
+        self._child_time[-1] += elapsed
+
+
+def current_timer():
+    # PhaseTimer for the active request, or None when profiling is off
+    if not has_request_context():
+        return None
+    return g.get('phase_timer')
+
+
+@contextmanager
+def phase(name):
+    # Time a block of a request handler as phase name
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    timer.enter()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.exit(name, time.perf_counter() - started)
+
+
+def record_phase(name, elapsed):
+    # Add a measured duration to the active request's phases
+    timer = current_timer()
+    if timer is not None:
+        timer.record(name, elapsed)
+
+
+class StackSampler:
+    # Samples one thread's Python stack every interval seconds
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        # Folded stack lines, one per unique stack
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class RequestProfiler:
+    # Decides per request what to collect and reports when it finishes
+
+    def __init__(self, slow_request_ms=None, always_phases=False, sample_rate=0.0,
+                 allow_header=False, profile_dir='profiles', sample_interval=0.001):
+        self.slow_request_ms = slow_request_ms
+        self.always_phases = always_phases
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+
+    @property
+    def enabled(self):
+        return (
+            self.slow_request_ms is not None or self.always_phases
+            or self.sample_rate > 0 or self.allow_header
+        )
+
+    def should_sample(self, headers):
+        if self.allow_header and headers.get('X-Profile') == '1':
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, headers):
+        # Called before the request is dispatched
+        if self.slow_request_ms is not None or self.always_phases:
+            g.phase_timer = PhaseTimer()
+        if self.should_sample(headers):
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            g.stack_sampler = sampler
+
+    def finish(self, route, method, status, elapsed, response_headers):
+        # Called after the response is built; returns the profile path if any
+        timer = g.pop('phase_timer', None)
+        if timer is not None:
+            response_headers['Server-Timing'] = ', '.join(
+                f'{name};dur={seconds * 1000:.3f}' for name, seconds in timer.phases.items()
+            )
+            if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+                slow_request_logger.warning(json.dumps({
+                    'event': 'slow_request',
+                    'route': route,
+                    'method': method,
+                    'status': status,
+                    'total_ms': round(elapsed * 1000, 3),
+                    'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in timer.phases.items()},
+                }))
+
+        sampler = g.pop('stack_sampler', None)
+        if sampler is None:
+            return None
+        sampler.stop()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        safe_route = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+        path = os.path.join(
+            self.profile_dir,
+            f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{method}-{safe_route}.folded"
+        )
+        with open(path, 'w') as f:
+            f.write(sampler.folded())
+        return path
+
+
+def create_profiler():
+    # Build the request profiler from the environment
+    slow_request_ms = os.getenv('SLOW_REQUEST_MS')
+    return RequestProfiler(
+        slow_request_ms=float(slow_request_ms) if slow_request_ms else None,
+        always_phases=os.getenv('PROFILE_PHASES', '').lower() in ('1', 'true', 'yes'),
+        sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+        allow_header=os.getenv('PROFILE_HEADER', '').lower() in ('1', 'true', 'yes'),
+        profile_dir=os.getenv('PROFILE_DIR', 'profiles'),
+        sample_interval=float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '1')) / 1000
+    )
@@ -0,0 +1,288 @@
+# Device registry: metadata, tags and group membership
+# Stored in SQLite next to device_status (REGISTRY_PATH, default DATABASE_PATH)
+# so clients no longer parse device_id prefixes to find a site or building.
+# device_groups is keyed (group_id, device_id), so a group's members come
+# from a primary key range instead of a fleet scan.
+#
+# GroupAggregates keeps online count and min battery per group up to date
+# on every upsert. Min battery uses a 101-slot battery histogram per group,
+# so a device whose battery rises never forces a rescan of the group.
+
+import json
+import sqlite3
+import threading
+from array import array
+
+from storage import utc_now
+
+CREATE_REGISTRY_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS devices (
+        device_id TEXT PRIMARY KEY,
+        name TEXT,
+        metadata TEXT NOT NULL DEFAULT '{}',
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS device_tags (
+        tag TEXT NOT NULL,
+        device_id TEXT NOT NULL,
+        PRIMARY KEY (tag, device_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_device_tags_device ON device_tags (device_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS device_groups (
+        group_id TEXT NOT NULL,
+        device_id TEXT NOT NULL,
+        PRIMARY KEY (group_id, device_id)
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_device_groups_device ON device_groups (device_id)',
+]
+
+UPSERT_DEVICE_SQL = '''
+    INSERT INTO devices (device_id, name, metadata, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (device_id) DO UPDATE SET
+        name = excluded.name, metadata = excluded.metadata, updated_at = excluded.updated_at
+'''
+
+SELECT_GROUP_MEMBERS_SQL = 'SELECT device_id FROM device_groups WHERE group_id = ? ORDER BY device_id'
+SELECT_TAGGED_SQL = 'SELECT device_id FROM device_tags WHERE tag = ? ORDER BY device_id'
+SELECT_ALL_MEMBERSHIPS_SQL = 'SELECT group_id, device_id FROM device_groups'
+
+
+def validate_registration(data):
+    # Validate a device registration body - returns (is_valid, error_message)
+    if not isinstance(data, dict):
+        return False, 'Expected a JSON object'
+    if 'name' in data and data['name'] is not None and not isinstance(data['name'], str):
+        return False, 'name must be a string'
+    for field in ('tags', 'groups'):
+        values = data.get(field, [])
+        if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+            return False, f'{field} must be a list of non-empty strings'
+    if not isinstance(data.get('metadata', {}), dict):
+        return False, 'metadata must be an object'
+    return True, None
+
+
+class DeviceRegistry:
+    # Registry tables in a SQLite file, one connection per call like SQLiteStatusStore
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def initialize(self):
+        conn = self.connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')  # Online backups copy it in one step
+            for sql in CREATE_REGISTRY_SQL:
+                conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def register(self, device_id, name=None, tags=(), groups=(), metadata=None):
+        # Create or replace a device's metadata, tags and groups in one transaction
+        now = utc_now()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(UPSERT_DEVICE_SQL, (device_id, name, json.dumps(metadata or {}), now, now))
+                conn.execute('DELETE FROM device_tags WHERE device_id = ?', (device_id,))
+                conn.executemany(
+                    'INSERT INTO device_tags (tag, device_id) VALUES (?, ?)',
+                    [(tag, device_id) for tag in sorted(set(tags))]
+                )
+                conn.execute('DELETE FROM device_groups WHERE device_id = ?', (device_id,))
+                conn.executemany(
+                    'INSERT INTO device_groups (group_id, device_id) VALUES (?, ?)',
+                    [(group_id, device_id) for group_id in sorted(set(groups))]
+                )
+        finally:
+            conn.close()
+
+    def get(self, device_id):
+        # Registration for device_id as a dict, or None if unregistered
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                'SELECT device_id, name, metadata, created_at, updated_at FROM devices WHERE device_id = ?',
+                (device_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            tags = [r[0] for r in conn.execute(
+                'SELECT tag FROM device_tags WHERE device_id = ? ORDER BY tag', (device_id,))]
+            groups = [r[0] for r in conn.execute(
+                'SELECT group_id FROM device_groups WHERE device_id = ? ORDER BY group_id', (device_id,))]
+        finally:
+            conn.close()
+        return {
+            'device_id': row['device_id'],
+            'name': row['name'],
+            'tags': tags,
+            'groups': groups,
+            'metadata': json.loads(row['metadata']),
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
+
+    def _ids(self, sql, key):
+        conn = self.connect()
+        try:
+            return [row[0] for row in conn.execute(sql, (key,))]
+        finally:
+            conn.close()
+
+    def group_members(self, group_id):
+        # Sorted device_ids in group_id (primary key range scan)
+        return self._ids(SELECT_GROUP_MEMBERS_SQL, group_id)
+
+    def tagged(self, tag):
+        # Sorted device_ids carrying tag (primary key range scan)
+        return self._ids(SELECT_TAGGED_SQL, tag)
+
+    def memberships(self):
+        # Every (group_id, device_id) pair
+        conn = self.connect()
+        try:
+            return conn.execute(SELECT_ALL_MEMBERSHIPS_SQL).fetchall()
+        finally:
+            conn.close()
+
+
+class GroupStats:
+    # Running aggregate for one group
+
+    __slots__ = ('device_count', 'reporting_count', 'online_count', 'battery_counts')
+
+    def __init__(self):
+        self.device_count = 0
+        self.reporting_count = 0
+        self.online_count = 0
+        self.battery_counts = array('I', bytes(4 * 101))
+
+    def add(self, state, sign):
+        # Add (sign=1) or remove (sign=-1) one device's last reading
+        battery_level, online = state
+        self.reporting_count += sign
+        self.online_count += sign if online else 0
+        self.battery_counts[battery_level] += sign
+
+    def min_battery(self):
+        for battery_level, count in enumerate(self.battery_counts):
+            if count:
+                return battery_level
+        return None
+
+
+class GroupAggregates:
+    # Per-group online count and min battery, maintained incrementally
+    # update() is a store listener; set_groups() follows registry changes.
+    # Only devices that belong to at least one group are tracked.
+
+    def __init__(self):
+        self._groups = {}
+        self._memberships = {}
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def state_of(row):
+        battery_level = row['battery_level']
+        if not 0 <= battery_level <= 100:
+            return None
+        return battery_level, bool(row['online'])
+
+    def load(self, memberships, store):
+        # Rebuild from registry (group_id, device_id) pairs and current device rows
+        by_device = {}
+        for group_id, device_id in memberships:
+            by_device.setdefault(device_id, set()).add(group_id)
+        rows = store.get_many(list(by_device))
+        with self._lock:
+            self._groups = {}
+            self._memberships = {}
+            self._states = {}
+            for device_id, groups in by_device.items():
+                row = rows.get(device_id)
+                self._set_groups(device_id, groups, None if row is None else self.state_of(row))
+
+    def update(self, data):
+        # Store listener: move the device's contribution to its new reading
+        device_id = data['device_id']
+        if device_id not in self._memberships:
+            return
+        state = self.state_of(data)
+        with self._lock:
+            groups = self._memberships.get(device_id)
+            if groups is None:
+                return
+            previous = self._states.get(device_id)
+            for group_id in groups:
+                stats = self._groups[group_id]
+                if previous is not None:
+                    stats.add(previous, -1)
+                if state is not None:
+                    stats.add(state, 1)
+            if state is None:
+                self._states.pop(device_id, None)
+            else:
+                self._states[device_id] = state
+
+    def set_groups(self, device_id, groups, row=None):
+        # Apply a registry change; row is the device's current reading if any
+        with self._lock:
+            state = self._states.get(device_id)
+            if state is None and row is not None:
+                state = self.state_of(row)
+            self._set_groups(device_id, set(groups), state)
+
+    def _set_groups(self, device_id, groups, state):
+        previous_groups = self._memberships.get(device_id, set())
+        previous_state = self._states.get(device_id)
+        for group_id in previous_groups:
+            stats = self._groups[group_id]
+            stats.device_count -= 1
+            if previous_state is not None:
+                stats.add(previous_state, -1)
+            if not stats.device_count:
+                del self._groups[group_id]
+        for group_id in groups:
+            stats = self._groups.get(group_id)
+            if stats is None:
+                stats = self._groups[group_id] = GroupStats()
+            stats.device_count += 1
+            if state is not None:
+                stats.add(state, 1)
+        if groups:
+            self._memberships[device_id] = groups
+            if state is not None:
+                self._states[device_id] = state
+        else:
+            self._memberships.pop(device_id, None)
+            self._states.pop(device_id, None)
+
+    def get(self, group_id):
+        # Aggregate for group_id as a dict, or None for an unknown group
+        with self._lock:
+            stats = self._groups.get(group_id)
+            if stats is None:
+                return None
+            return {
+                'group': group_id,
+                'device_count': stats.device_count,
+                'reporting_count': stats.reporting_count,
+                'online_count': stats.online_count,
+                'min_battery': stats.min_battery(),
+            }
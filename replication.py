@@ -0,0 +1,197 @@
+# Leader/follower replication of device status
+# The leader records every upsert of the main store in a ChangeLog with a
+# version number. Followers tail it over HTTP with
+# GET /replication/changes?since=<version>, apply the rows to their own store
+# (SQLite or in-memory) and serve reads locally.
+#
+# The change log is kept in memory and holds the last REPLICATION_LOG_SIZE
+# changes. Each leader process has a random epoch. A follower that falls
+# further behind than the log holds, or sees a new epoch after a leader
+# restart, resyncs from GET /replication/snapshot: an NDJSON stream of every
+# row after a header line with the version the scan started at. Changes after
+# that version are then applied on top. Rows carry the full device state, so
+# applying a change twice is harmless.
+# requests is only imported when a follower is created, so leaders and
+# standalone servers never load it.
+
+import json
+import logging
+import threading
+import time
+import uuid
+
+from storage import DEVICE_FIELDS, utc_now
+
+SNAPSHOT_BATCH_SIZE = 5000
+
+
+class ChangeLog:
+    # Versioned log of upserts holding at least the last `size` of them
+    # Register append() as a store listener.
+
+    def __init__(self, size=100000):
+        self.size = size
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self._first_version = 1  # Version of _entries[0]
+        self._entries = []  # (version, logged_at, row)
+        self._cond = threading.Condition()
+
+    def append(self, data):
+        row = {field: data.get(field) for field in DEVICE_FIELDS}
+        row['online'] = bool(row['online'])
+        row['created_at'] = row['created_at'] or utc_now()
+        with self._cond:
+            self.version += 1
+            self._entries.append((self.version, time.time(), row))
+            if len(self._entries) >= 2 * self.size:
+                # Trim in bulk so appends stay amortised O(1)
+                drop = len(self._entries) - self.size
+                del self._entries[:drop]
+                self._first_version += drop
+            self._cond.notify_all()
+
+    def changes_since(self, version, limit=1000, wait=0.0):
+        # Changes after version, oldest first - None when they were trimmed
+        # wait (seconds) blocks until at least one change is available
+        with self._cond:
+            if wait and self.version <= version:
+                self._cond.wait_for(lambda: self.version > version, wait)
+            if version + 1 < self._first_version:
+                return None
+            start = version + 1 - self._first_version
+            return [
+                {'version': entry_version, 'logged_at': logged_at, 'row': row}
+                for entry_version, logged_at, row in self._entries[start:start + limit]
+            ]
+
+
+def snapshot_lines(store, change_log):
+    # NDJSON snapshot: a header with the change log position, then every row
+    # The header version is taken before the scan, so a follower that applies
+    # the changes after it ends up with everything written during the scan.
+    yield json.dumps({'epoch': change_log.epoch, 'version': change_log.version}) + '\n'
+    for row in store.iterate_all():
+        record = {field: row[field] for field in DEVICE_FIELDS}
+        record['online'] = bool(record['online'])
+        yield json.dumps(record) + '\n'
+
+
+class Follower:
+    # Tails a leader's change log into a local store on a background thread
+
+    def __init__(self, store, leader_url, api_key, poll_wait=5.0, batch_size=1000, retry_interval=1.0, logger=None):
+        self.store = store
+        self.leader_url = leader_url.rstrip('/')
+        self.headers = {'X-API-Key': api_key}
+        self.poll_wait = poll_wait
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval  # Pause after an error or an empty poll without wait
+        self.logger = logger or logging.getLogger(__name__)
+        import requests  # Heavy, and only followers need it
+        self.session = requests.Session()
+        self.epoch = None
+        self.applied_version = 0
+        self.leader_version = None
+        self.last_applied_at = None  # Leader wall clock time of the last applied change
+        self.last_contact = None  # Local time of the last successful poll
+        self.snapshots = 0
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def resync(self):
+        # Load a full snapshot and continue from its version
+        response = self.session.get(
+            f'{self.leader_url}/replication/snapshot', headers=self.headers, stream=True, timeout=30
+        )
+        response.raise_for_status()
+        lines = response.iter_lines()
+        header = json.loads(next(lines))
+        batch = []
+        for line in lines:
+            if line:
+                batch.append(json.loads(line))
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                self.store.apply_rows(batch)
+                batch = []
+        if batch:
+            self.store.apply_rows(batch)
+        self.epoch = header['epoch']
+        self.applied_version = header['version']
+        self.leader_version = header['version']
+        self.snapshots += 1
+        self.logger.info('Replica loaded a snapshot at version %d', self.applied_version)
+
+    def poll(self, wait=0.0):
+        # Fetch and apply the next batch of changes - returns the number applied
+        if self.epoch is None:
+            self.resync()
+        response = self.session.get(
+            f'{self.leader_url}/replication/changes', headers=self.headers, timeout=wait + 30,
+            params={'since': self.applied_version, 'limit': self.batch_size, 'wait': wait}
+        )
+        if response.status_code == 410:
+            # Too far behind for the log
+            self.epoch = None
+            return 0
+        response.raise_for_status()
+        body = response.json()
+        if body['epoch'] != self.epoch:
+            # The leader restarted; its versions start over
+            self.epoch = None
+            return 0
+        changes = body['changes']
+        if changes:
+            self.store.apply_rows([change['row'] for change in changes])
+            self.applied_version = changes[-1]['version']
+            self.last_applied_at = changes[-1]['logged_at']
+        self.leader_version = body['version']
+        self.last_contact = time.time()
+        return len(changes)
+
+    def status(self):
+        lag_versions = None if self.leader_version is None else max(0, self.leader_version - self.applied_version)
+        # Caught up: no lag. Behind: age of the newest change applied so far
+        lag_seconds = None
+        if lag_versions == 0:
+            lag_seconds = 0.0
+        elif self.last_applied_at is not None:
+            lag_seconds = round(max(0.0, time.time() - self.last_applied_at), 3)
+        return {
+            'role': 'follower',
+            'leader': self.leader_url,
+            'epoch': self.epoch,
+            'applied_version': self.applied_version,
+            'leader_version': self.leader_version,
+            'lag_versions': lag_versions,
+            'lag_seconds': lag_seconds,
+            'last_contact_seconds': None if self.last_contact is None else round(time.time() - self.last_contact, 3),
+            'snapshots': self.snapshots,
+            'error': None if self.error is None else str(self.error),
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                applied = self.poll(self.poll_wait)
+                self.error = None
+            except Exception as e:
+                if self.error is None:
+                    self.logger.warning('Replication from %s failed: %s', self.leader_url, e)
+                self.error = e
+                self._stop.wait(self.retry_interval)
+                continue
+            if not applied and self.epoch is not None and not self.poll_wait:
+                self._stop.wait(self.retry_interval)
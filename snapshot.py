@@ -0,0 +1,138 @@
+# Columnar point-in-time snapshots of device_status for analytics
+# Rows are streamed from the store in row groups, so memory stays bounded by
+# row_group_size. Files are partitioned by snapshot date:
+#   <out_dir>/device_status/snapshot_date=YYYY-MM-DD/device_status-HHMMSS.<ext>
+# pyarrow is optional and only imported when a snapshot is written.
+
+import itertools
+import os
+import threading
+from datetime import datetime, timezone
+
+FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def require_pyarrow():
+    # Import pyarrow lazily - it is heavy and only needed for snapshots
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('pyarrow is required for snapshot exports (pip install pyarrow)')
+    return pyarrow
+
+
+def parse_utc(value):
+    # ISO 8601 string to an aware UTC datetime (naive values are UTC)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def device_status_schema(pa):
+    return pa.schema([
+        ('device_id', pa.string()),
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('battery_level', pa.uint8()),
+        ('rssi', pa.int16()),
+        ('online', pa.bool_()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+    ])
+
+
+def rows_to_batch(pa, schema, rows):
+    # Build one RecordBatch from a list of device rows
+    return pa.RecordBatch.from_arrays([
+        pa.array([row['device_id'] for row in rows], type=pa.string()),
+        pa.array([parse_utc(row['timestamp']) for row in rows], type=schema.field('timestamp').type),
+        pa.array([row['battery_level'] for row in rows], type=pa.uint8()),
+        pa.array([row['rssi'] for row in rows], type=pa.int16()),
+        pa.array([bool(row['online']) for row in rows], type=pa.bool_()),
+        pa.array([parse_utc(row['created_at']) for row in rows], type=schema.field('created_at').type),
+    ], schema=schema)
+
+
+def snapshot_path(out_dir, fmt, snapshot_time):
+    # Partitioned destination path for a snapshot taken at snapshot_time
+    partition = os.path.join(
+        out_dir, 'device_status', f"snapshot_date={snapshot_time.strftime('%Y-%m-%d')}"
+    )
+    filename = f"device_status-{snapshot_time.strftime('%H%M%S')}.{FORMATS[fmt]}"
+    return os.path.join(partition, filename)
+
+
+def write_snapshot(store, out_dir, fmt='parquet', row_group_size=50000, snapshot_time=None):
+    # Write a snapshot of every device row - returns (path, row_count)
+    if fmt not in FORMATS:
+        raise ValueError(f'format must be one of {sorted(FORMATS)}')
+    pa = require_pyarrow()
+    schema = device_status_schema(pa)
+    snapshot_time = snapshot_time or datetime.now(timezone.utc)
+    path = snapshot_path(out_dir, fmt, snapshot_time)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write under a temporary name so readers never see a partial file
+    tmp_path = path + '.tmp'
+    if fmt == 'parquet':
+        writer = pa.parquet.ParquetWriter(tmp_path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(tmp_path, schema)
+
+    count = 0
+    try:
+        rows = store.iterate_all(consistent=True)
+        while True:
+            chunk = list(itertools.islice(rows, row_group_size))
+            if not chunk:
+                break
+            batch = rows_to_batch(pa, schema, chunk)
+            if fmt == 'parquet':
+                writer.write_batch(batch, row_group_size=row_group_size)
+            else:
+                writer.write_batch(batch)
+            count += len(chunk)
+    except Exception:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, path)
+    return path, count
+
+
+class SnapshotScheduler:
+    # Background thread writing a snapshot every interval seconds
+
+    def __init__(self, store, out_dir, interval, fmt='parquet', row_group_size=50000, logger=None):
+        self.store = store
+        self.out_dir = out_dir
+        self.interval = interval
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                path, count = write_snapshot(self.store, self.out_dir, self.fmt, self.row_group_size)
+                if self.logger is not None:
+                    self.logger.info('Wrote snapshot %s (%d devices)', path, count)
+            except Exception:
+                # Keep the schedule running; the next interval retries
+                if self.logger is not None:
+                    self.logger.exception('Snapshot failed')
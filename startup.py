@@ -0,0 +1,99 @@
+# Startup warm-up and readiness
+# init_db registers warm-up steps (prepared statements, in-memory mirrors,
+# summary fragments) and runs them inline or, with STARTUP_WARMUP=background,
+# on a thread so the process can answer liveness checks at once. Readiness is
+# reported by GET /health/ready only after every step has finished.
+#
+# DeferredListener wraps a store listener that feeds a mirror which is being
+# loaded from a scan: upserts seen during the load are queued and replayed
+# afterwards, so a reading written mid-scan is never overwritten by the
+# older row the scan returned.
+
+import logging
+import threading
+import time
+
+
+class DeferredListener:
+    # Store listener that can hold events while its target is loading
+
+    def __init__(self, target):
+        self.target = target
+        self._buffering = False
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def __call__(self, data):
+        if self._buffering:
+            with self._lock:
+                if self._buffering:
+                    self._pending.append(data)
+                    return
+        self.target(data)
+
+    def hold(self):
+        # Start queueing events - call before the load begins
+        with self._lock:
+            self._buffering = True
+
+    def release(self):
+        # Replay queued events in order and go back to direct delivery
+        with self._lock:
+            for data in self._pending:
+                self.target(data)
+            self._pending = []
+            self._buffering = False
+
+
+class Warmup:
+    # Ordered named steps with their durations
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.steps = []
+        self.timings = {}
+        self.ready = False
+        self.error = None
+        self.started = None
+        self.elapsed = None
+        self._thread = None
+
+    def add(self, name, func):
+        self.steps.append((name, func))
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            for name, func in self.steps:
+                step_started = time.perf_counter()
+                func()
+                self.timings[name] = time.perf_counter() - step_started
+            self.ready = True
+        except Exception as e:
+            # Stay not-ready so the orchestrator replaces the instance
+            self.error = e
+            self.logger.exception('Warm-up failed')
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+        if self.ready:
+            self.logger.info('Warm-up finished in %.3fs', self.elapsed)
+
+    def start(self, background=False):
+        if not background:
+            self.run()
+        elif self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'error': None if self.error is None else str(self.error),
+            'seconds': None if self.elapsed is None else round(self.elapsed, 6),
+            'steps': {name: round(seconds, 6) for name, seconds in self.timings.items()},
+        }
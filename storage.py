@@ -0,0 +1,785 @@
+# Storage backends for device status data
+# Every backend implements the StatusStore interface so the Flask handlers
+# never touch SQL directly.
+
+import bisect
+import contextlib
+import functools
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from fleet_table import timestamp_to_epoch
+from metrics import registry as metrics
+from migrations import migrate, run_backfills
+from profiling import record_phase
+
+logger = logging.getLogger(__name__)
+
+DEVICE_FIELDS = ('device_id', 'timestamp', 'battery_level', 'rssi', 'online', 'created_at')
+
+# timestamp_epoch is derived from timestamp by SQLite (schema version 2)
+# An existing row keeps its device_id, so the device_search index (schema
+# version 3) is only written for new devices.
+UPSERT_SQL = '''
+    INSERT INTO device_status
+    (device_id, timestamp, battery_level, rssi, online, created_at, timestamp_epoch)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, CAST(strftime('%s', ?2) AS INTEGER))
+    ON CONFLICT (device_id) DO UPDATE SET
+    timestamp = excluded.timestamp, battery_level = excluded.battery_level, rssi = excluded.rssi,
+    online = excluded.online, created_at = excluded.created_at, timestamp_epoch = excluded.timestamp_epoch
+'''
+
+SELECT_DEVICE_SQL = '''
+    SELECT device_id, timestamp, battery_level, rssi, online
+    FROM device_status
+    WHERE device_id = ?
+'''
+
+# Columns a partial reading may change besides timestamp
+DELTA_FIELDS = ('battery_level', 'rssi', 'online')
+
+# update_fields() results
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+
+# Device ids per IN (...) query - below SQLite's default 999 variable limit
+GET_MANY_CHUNK_SIZE = 500
+
+SELECT_MANY_SQL = '''
+    SELECT device_id, timestamp, battery_level, rssi, online
+    FROM device_status
+    WHERE device_id IN ({placeholders})
+'''
+
+SELECT_ALL_SQL = '''
+    SELECT device_id, timestamp, battery_level, rssi, online, created_at
+    FROM device_status
+    ORDER BY device_id
+'''
+
+# Scans read SCAN_PAGE_SIZE rows per statement, continuing after the last
+# device_id. Each page finishes its statement, so SQLite's read lock is
+# released between pages and writers never wait for a whole scan.
+# The first page uses device_id >= '' so the empty device id is included.
+SCAN_PAGE_SIZE = 1000
+
+SELECT_SUMMARY_PAGE_SQL = '''
+    SELECT device_id, battery_level, online, timestamp
+    FROM device_status
+    WHERE device_id {operator} ?
+    ORDER BY device_id
+    LIMIT ?
+'''
+
+SELECT_ALL_PAGE_SQL = '''
+    SELECT device_id, timestamp, battery_level, rssi, online, created_at
+    FROM device_status
+    WHERE device_id {operator} ?
+    ORDER BY device_id
+    LIMIT ?
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def update_fields_sql(fields):
+    # In-place UPDATE of timestamp and the given DELTA_FIELDS columns
+    # The WHERE clause skips the write when nothing differs from the stored row;
+    # RETURNING hands the merged row to the store listeners.
+    assignments = ''.join(f', {field} = ?{index}' for index, field in enumerate(fields, 4))
+    changes = ''.join(f' OR {field} IS NOT ?{index}' for index, field in enumerate(fields, 4))
+    return f'''
+    UPDATE device_status
+    SET timestamp = ?1, timestamp_epoch = CAST(strftime('%s', ?1) AS INTEGER), created_at = ?2{assignments}
+    WHERE device_id = ?3 AND (timestamp IS NOT ?1{changes})
+    RETURNING device_id, timestamp, battery_level, rssi, online, created_at
+    '''
+
+
+# Device search: prefix (device_id range) or substring (trigram index) matches
+PREFIX = 'prefix'
+SUBSTRING = 'substring'
+SEARCH_MIN_SUBSTRING = 3  # Trigrams need at least three characters
+
+# Sort keys -> columns; every column has an index on (column, device_id) that
+# also covers the rest of the search columns
+SEARCH_SORT_COLUMNS = {
+    'device_id': 'device_id',
+    'battery_level': 'battery_level',
+    'rssi': 'rssi',
+    'last_update': 'timestamp_epoch',
+}
+
+# A search first counts up to SEARCH_PROBE_ROWS matches. Fewer matches are
+# fetched through the match index and sorted; more are found by walking the
+# sort index, where they are dense enough to fill a page after a short scan.
+SEARCH_PROBE_ROWS = 2000
+
+SELECT_SEARCH_SQL = '''
+    SELECT device_id, timestamp, battery_level, rssi, online, timestamp_epoch
+    FROM device_status
+    WHERE {conditions}
+    ORDER BY {order}
+    LIMIT ?
+'''
+
+
+def prefix_range(prefix):
+    # [low, high) device_id range holding every id that starts with prefix -
+    # high is None when the range runs to the end (prefix is all U+10FFFF)
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return prefix, None
+    return prefix, stem[:-1] + chr(ord(stem[-1]) + 1)
+
+
+def like_pattern(text):
+    # LIKE pattern for ids containing text, with %, _ and \ escaped
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_sort_value(row, sort):
+    if sort == 'last_update':
+        return timestamp_to_epoch(row['timestamp'])
+    return row[sort]
+
+
+def utc_now():
+    # Server receive time in the same format used for created_at
+    return datetime.utcnow().isoformat()
+
+
+def upsert_params(data, created_at):
+    # Build the parameter tuple for UPSERT_SQL from a validated payload
+    return (
+        data['device_id'],
+        data['timestamp'],
+        data['battery_level'],
+        data['rssi'],
+        data['online'],
+        created_at
+    )
+
+
+class DeviceRecord:
+    # Compact per-device record used by the in-memory engine
+    # Supports item access so the format_* helpers accept it like a sqlite3.Row
+    __slots__ = DEVICE_FIELDS
+
+    def __init__(self, device_id, timestamp, battery_level, rssi, online, created_at):
+        self.device_id = device_id
+        self.timestamp = timestamp
+        self.battery_level = battery_level
+        self.rssi = rssi
+        self.online = bool(online)
+        self.created_at = created_at
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def keys(self):
+        return list(DEVICE_FIELDS)
+
+
+class StatusStore:
+    # Interface for device status storage backends
+
+    def __init__(self):
+        self._listeners = []
+        self._order_lock = threading.Lock()
+
+    def add_listener(self, callback):
+        # Register callback(data) to run after every successful upsert
+        # Callbacks run in commit order (see _ordered_write)
+        self._listeners.append(callback)
+
+    def _notify(self, data):
+        for callback in self._listeners:
+            callback(data)
+
+    @contextlib.contextmanager
+    def _ordered_write(self):
+        # Hold around a write and its _notify calls, so two writes of one device
+        # reach listeners (change log, fleet table, group aggregates) in the
+        # order they were committed
+        with self._order_lock:
+            yield
+
+    def initialize(self):
+        # Prepare the backend (create tables, load checkpoints, start threads)
+        pass
+
+    def close(self):
+        # Release resources held by the backend
+        pass
+
+    def flush(self):
+        # Make every acknowledged upsert durable on disk
+        pass
+
+    def warm_up(self):
+        # Prepare caches and statements before serving (optional)
+        pass
+
+    def pending_writes(self):
+        # Writes started but not yet committed
+        return 0
+
+    def upsert(self, data, created_at=None):
+        # Insert or replace the latest status for data['device_id']
+        raise NotImplementedError
+
+    def batch_upsert(self, items, created_at=None):
+        # Upsert many validated payloads at once - returns number written
+        raise NotImplementedError
+
+    def apply_rows(self, rows):
+        # Upsert full rows that already carry created_at (log replay)
+        # Returns number written
+        raise NotImplementedError
+
+    def update_fields(self, data, created_at=None):
+        # Apply a partial reading (device_id, timestamp and any DELTA_FIELDS) to
+        # an existing device - returns UPDATED, UNCHANGED or NOT_FOUND
+        # Listeners get the merged row; an identical reading writes nothing.
+        raise NotImplementedError
+
+    def search(self, query='', match=PREFIX, sort='device_id', descending=False, limit=50, after=None):
+        # One page of devices whose id matches query, ordered by sort then device_id
+        # after is the (sort value, device_id) keyset of the previous page's last row
+        # Returns (rows, next_after) - next_after is None on the last page
+        # This default scans every row; SQLite answers from its indexes.
+        if match == SUBSTRING:
+            needle = query.casefold()
+            matches = lambda device_id: needle in device_id.casefold()
+        else:
+            matches = lambda device_id: device_id.startswith(query)
+        keyed = [
+            ((search_sort_value(row, sort), row['device_id']), row)
+            for row in self.iterate_all() if matches(row['device_id'])
+        ]
+        keyed = [pair for pair in keyed if pair[0][0] is not None]  # Unparseable timestamps, as on SQLite
+        keyed.sort(key=lambda pair: pair[0], reverse=descending)
+        if after is not None:
+            after = tuple(after)
+            keyed = [pair for pair in keyed if (pair[0] < after if descending else pair[0] > after)]
+        page = keyed[:limit]
+        next_after = page[-1][0] if len(keyed) > limit else None
+        return [row for _, row in page], next_after
+
+    def get(self, device_id):
+        # Return the row for device_id or None if unknown
+        raise NotImplementedError
+
+    def get_many(self, device_ids):
+        # Return {device_id: row} for the known ids among device_ids
+        rows = {}
+        for device_id in device_ids:
+            row = self.get(device_id)
+            if row is not None:
+                rows[device_id] = row
+        return rows
+
+    def count(self):
+        # Number of devices stored
+        return sum(1 for _ in self.iterate_summary())
+
+    def iterate_summary(self):
+        # Yield every device row ordered by device_id
+        raise NotImplementedError
+
+    def iterate_all(self, consistent=False):
+        # Yield every device row with all DEVICE_FIELDS ordered by device_id
+        # consistent=True reads every row from one point in time (exports and
+        # snapshots); otherwise rows written during the scan may or may not
+        # be seen
+        raise NotImplementedError
+
+
+class SQLiteStatusStore(StatusStore):
+    # StatusStore backed by a SQLite database file
+
+    def __init__(self, path, pool_size=8):
+        super().__init__()
+        self.path = path
+        # Idle connections kept for reuse - each keeps its prepared statements
+        self.pool_size = pool_size
+        self._idle = []
+        self._pool_lock = threading.Lock()
+        self._writers = 0  # Write transactions waiting for or holding the lock
+
+    def connect(self):
+        # An idle pooled connection, or a new one when none is free
+        try:
+            return self._idle.pop()
+        except IndexError:
+            pass
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        metrics.inc('sqlite_connections_total')
+        return conn
+
+    def release(self, conn):
+        # Return conn to the pool, closing it when the pool is full
+        if conn.in_transaction:
+            conn.rollback()
+        with self._pool_lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def warm_up(self):
+        # Open the pool and prepare the hot statements on every connection
+        # sqlite3 caches compiled statements per connection, keyed by SQL text
+        connections = [self.connect() for _ in range(max(1, self.pool_size) - len(self._idle))]
+        for conn in connections:
+            conn.execute(SELECT_DEVICE_SQL, ('',)).fetchall()
+            conn.execute(SELECT_MANY_SQL.format(placeholders=','.join('?' * GET_MANY_CHUNK_SIZE)),
+                         [''] * GET_MANY_CHUNK_SIZE).fetchall()
+            for operator in ('>=', '>'):
+                conn.execute(SELECT_SUMMARY_PAGE_SQL.format(operator=operator), ('', 1)).fetchall()
+                conn.execute(SELECT_ALL_PAGE_SQL.format(operator=operator), ('', 1)).fetchall()
+            # Compile the writes inside a transaction that is rolled back
+            conn.execute(UPSERT_SQL, ('', '1970-01-01T00:00:00Z', 0, 0, False, ''))
+            conn.execute(update_fields_sql(DELTA_FIELDS), ('', '', '', 0, 0, False)).fetchall()
+            conn.rollback()
+        for conn in connections:
+            self.release(conn)
+
+    def pending_writes(self):
+        return self._writers
+
+    @contextlib.contextmanager
+    def _ordered_write(self):
+        # Writers waiting for the order lock count as pending writes
+        # SQLite allows one writer at a time, so the lock costs no concurrency
+        with self._pool_lock:
+            self._writers += 1
+        try:
+            with self._order_lock:
+                yield
+        finally:
+            with self._pool_lock:
+                self._writers -= 1
+
+    def _write(self, operation, sql, params, many=False):
+        # Run one write statement in its own transaction - call within _ordered_write
+        # Returns the first row a single statement produced (RETURNING), if any
+        conn = self.connect()
+        try:
+            started = time.perf_counter()
+            row = None
+            if many:
+                conn.executemany(sql, params)
+            else:
+                row = conn.execute(sql, params).fetchone()
+            conn.commit()
+            self._record_query(operation, started)
+            return row
+        finally:
+            self.release(conn)
+
+    def _record_query(self, operation, started):
+        # Time for a write statement including its commit
+        elapsed = time.perf_counter() - started
+        metrics.observe('sqlite_query_duration_seconds', (operation,), elapsed)
+        record_phase('db_execute', elapsed)
+
+    def initialize(self):
+        # Switch to WAL and bring the schema to the latest version; backfills
+        # run separately
+        # WAL lets readers (consistent scans, backups) run alongside writers.
+        # The mode is stored in the file, so every connection picks it up.
+        conn = self.connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            migrate(conn)
+        finally:
+            self.release(conn)
+
+    def upsert(self, data, created_at=None):
+        created_at = created_at or utc_now()
+        with self._ordered_write():
+            self._write('upsert', UPSERT_SQL, upsert_params(data, created_at))
+            self._notify(data)
+
+    def batch_upsert(self, items, created_at=None):
+        created_at = created_at or utc_now()
+        items = list(items)
+        # One transaction for the whole batch
+        with self._ordered_write():
+            self._write('batch_upsert', UPSERT_SQL, [upsert_params(data, created_at) for data in items], many=True)
+            for data in items:
+                self._notify(data)
+        return len(items)
+
+    def apply_rows(self, rows):
+        rows = list(rows)
+        with self._ordered_write():
+            self._write('apply_rows', UPSERT_SQL, [upsert_params(row, row['created_at']) for row in rows], many=True)
+            for row in rows:
+                self._notify(row)
+        return len(rows)
+
+    def update_fields(self, data, created_at=None):
+        created_at = created_at or utc_now()
+        fields = tuple(field for field in DELTA_FIELDS if field in data)
+        params = [data['timestamp'], created_at, data['device_id']] + [data[field] for field in fields]
+        with self._ordered_write():
+            row = self._write('update_fields', update_fields_sql(fields), params)
+            if row is not None:
+                self._notify({field: row[field] for field in DEVICE_FIELDS})
+        if row is None:
+            return NOT_FOUND if self.get(data['device_id']) is None else UNCHANGED
+        return UPDATED
+
+    def search(self, query='', match=PREFIX, sort='device_id', descending=False, limit=50, after=None):
+        column = SEARCH_SORT_COLUMNS[sort]
+        direction = 'DESC' if descending else 'ASC'
+        conditions = []
+        params = []
+        sparse = False
+        conn = self.connect()
+        try:
+            started = time.perf_counter()
+            if query and match == PREFIX:
+                low, high = prefix_range(query)
+                bounds, bound_params = '{0} >= ?', [low]
+                if high is not None:
+                    bounds, bound_params = '{0} >= ? AND {0} < ?', [low, high]
+                sparse = column == 'device_id' or self._probe(
+                    conn, 'SELECT 1 FROM device_status WHERE ' + bounds.format('device_id'), bound_params)
+                # A unary + keeps SQLite off the primary key when the sort index should drive
+                conditions.append(bounds.format('device_id' if sparse else '+device_id'))
+                params += bound_params
+            elif query:
+                phrase = '"' + query.replace('"', '""') + '"'
+                sparse = self._probe(conn, 'SELECT rowid FROM device_search WHERE device_search MATCH ?', (phrase,))
+                if sparse:
+                    conditions.append('device_id IN (SELECT device_id FROM device_search WHERE device_search MATCH ?)')
+                    params.append(phrase)
+                else:
+                    conditions.append("device_id LIKE ? ESCAPE '\\'")
+                    params.append(like_pattern(query))
+            # Few matches are sorted after the fact; + keeps the covering sort
+            # index from driving the scan instead
+            sort_target = f'+{column}' if sparse else column
+            if column == 'timestamp_epoch':
+                conditions.append(f'{sort_target} IS NOT NULL')  # Rows the backfill has not reached yet
+            if after is not None:
+                operator = '<' if descending else '>'
+                if column == 'device_id':
+                    conditions.append(f'device_id {operator} ?')
+                    params.append(after[1])
+                else:
+                    conditions.append(f'({sort_target}, device_id) {operator} (?, ?)')
+                    params += list(after)
+            order = f'device_id {direction}' if column == 'device_id' else f'{sort_target} {direction}, device_id {direction}'
+            sql = SELECT_SEARCH_SQL.format(conditions=' AND '.join(conditions) or '1', order=order)
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+            elapsed = time.perf_counter() - started
+            record_phase('db_execute', elapsed)
+            metrics.observe('sqlite_query_duration_seconds', ('search',), elapsed)
+            metrics.inc('sqlite_rows_returned_total', ('search',), len(rows))
+        finally:
+            self.release(conn)
+        page = rows[:limit]
+        next_after = (page[-1][column], page[-1]['device_id']) if len(rows) > limit else None
+        return page, next_after
+
+    def _probe(self, conn, sql, params):
+        # True when sql returns fewer than SEARCH_PROBE_ROWS rows
+        probe = f'SELECT count(*) FROM ({sql} LIMIT {SEARCH_PROBE_ROWS})'
+        return conn.execute(probe, params).fetchone()[0] < SEARCH_PROBE_ROWS
+
+    def get(self, device_id):
+        conn = self.connect()
+        try:
+            started = time.perf_counter()
+            cursor = conn.execute(SELECT_DEVICE_SQL, (device_id,))
+            executed = time.perf_counter()
+            row = cursor.fetchone()
+            fetched = time.perf_counter()
+            record_phase('db_execute', executed - started)
+            record_phase('db_fetch', fetched - executed)
+            metrics.observe('sqlite_query_duration_seconds', ('get',), fetched - started)
+            metrics.inc('sqlite_rows_returned_total', ('get',), 0 if row is None else 1)
+            return row
+        finally:
+            self.release(conn)
+
+    def get_many(self, device_ids):
+        # One connection, chunked IN (...) queries
+        unique_ids = list(dict.fromkeys(device_ids))
+        rows = {}
+        if not unique_ids:
+            return rows
+        conn = self.connect()
+        elapsed = 0.0
+        try:
+            for start in range(0, len(unique_ids), GET_MANY_CHUNK_SIZE):
+                chunk = unique_ids[start:start + GET_MANY_CHUNK_SIZE]
+                sql = SELECT_MANY_SQL.format(placeholders=','.join('?' * len(chunk)))
+                started = time.perf_counter()
+                cursor = conn.execute(sql, chunk)
+                executed = time.perf_counter()
+                for row in cursor.fetchall():
+                    rows[row['device_id']] = row
+                fetched = time.perf_counter()
+                record_phase('db_execute', executed - started)
+                record_phase('db_fetch', fetched - executed)
+                elapsed += fetched - started
+            return rows
+        finally:
+            self.release(conn)
+            metrics.observe('sqlite_query_duration_seconds', ('get_many',), elapsed)
+            metrics.inc('sqlite_rows_returned_total', ('get_many',), len(rows))
+
+    def count(self):
+        conn = self.connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM device_status').fetchone()[0]
+        finally:
+            self.release(conn)
+
+    def _iterate(self, operation, page_sql, consistent=False):
+        # Stream rows page by page so large tables never sit in memory at once
+        # and no read lock is held while the caller processes a page
+        # consistent=True runs every page in one read transaction instead, so
+        # the scan sees a single snapshot. That needs WAL: in rollback-journal
+        # mode the read lock would block writers for the whole scan, so the
+        # scan stays paged (not point-in-time) there.
+        # Only time spent inside SQLite counts towards the query duration
+        conn = self.connect()
+        elapsed = 0.0
+        count = 0
+        try:
+            if consistent and conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+                conn.execute('BEGIN')  # Ended by release()
+            operator = '>='
+            last_id = ''
+            while True:
+                started = time.perf_counter()
+                cursor = conn.execute(page_sql.format(operator=operator), (last_id, SCAN_PAGE_SIZE))
+                executed = time.perf_counter()
+                rows = cursor.fetchall()
+                fetched = time.perf_counter()
+                record_phase('db_execute', executed - started)
+                record_phase('db_fetch', fetched - executed)
+                elapsed += fetched - started
+                count += len(rows)
+                yield from rows
+                if len(rows) < SCAN_PAGE_SIZE:
+                    break
+                operator = '>'
+                last_id = rows[-1]['device_id']
+        finally:
+            self.release(conn)
+            metrics.observe('sqlite_query_duration_seconds', (operation,), elapsed)
+            metrics.inc('sqlite_rows_returned_total', (operation,), count)
+
+    def iterate_summary(self):
+        return self._iterate('summary', SELECT_SUMMARY_PAGE_SQL)
+
+    def iterate_all(self, consistent=False):
+        return self._iterate('scan', SELECT_ALL_PAGE_SQL, consistent)
+
+
+class MemoryStatusStore(StatusStore):
+    # Pure in-memory StatusStore with periodic checkpoints to a SQLite file
+    # Reads never touch disk; the checkpoint file uses the device_status schema
+    # so it can be opened by SQLiteStatusStore as well. Checkpoints update
+    # device_status in place, so the file can also hold other tables (the
+    # device registry shares DATABASE_PATH by default).
+
+    def __init__(self, checkpoint_path=None, checkpoint_interval=30.0):
+        super().__init__()
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._records = {}
+        self._sorted_ids = []
+        self._lock = threading.Lock()
+        self._changed = set()  # Device ids written since the last checkpoint
+        self._stop = threading.Event()
+        self._thread = None
+
+    def initialize(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            self.load_checkpoint()
+        if self.checkpoint_path and self.checkpoint_interval and self._thread is None:
+            self._thread = threading.Thread(target=self._checkpoint_loop, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.checkpoint_path:
+            self.checkpoint()
+
+    def _put(self, data, created_at):
+        device_id = data['device_id']
+        record = DeviceRecord(
+            device_id,
+            data['timestamp'],
+            data['battery_level'],
+            data['rssi'],
+            data['online'],
+            created_at
+        )
+        if device_id not in self._records:
+            bisect.insort(self._sorted_ids, device_id)
+        self._records[device_id] = record
+        if self.checkpoint_path:
+            self._changed.add(device_id)
+
+    def upsert(self, data, created_at=None):
+        created_at = created_at or utc_now()
+        with self._ordered_write():
+            with self._lock:
+                self._put(data, created_at)
+            self._notify(data)
+
+    def batch_upsert(self, items, created_at=None):
+        created_at = created_at or utc_now()
+        items = list(items)
+        with self._ordered_write():
+            with self._lock:
+                for data in items:
+                    self._put(data, created_at)
+            for data in items:
+                self._notify(data)
+        return len(items)
+
+    def apply_rows(self, rows):
+        rows = list(rows)
+        with self._ordered_write():
+            with self._lock:
+                for row in rows:
+                    self._put(row, row['created_at'])
+            for row in rows:
+                self._notify(row)
+        return len(rows)
+
+    def update_fields(self, data, created_at=None):
+        created_at = created_at or utc_now()
+        with self._ordered_write():
+            with self._lock:
+                record = self._records.get(data['device_id'])
+                if record is None:
+                    return NOT_FOUND
+                row = {field: record[field] for field in DEVICE_FIELDS}
+                changes = {field: data[field] for field in ('timestamp',) + DELTA_FIELDS if field in data}
+                if all(row[field] == value for field, value in changes.items()):
+                    return UNCHANGED
+                row.update(changes, created_at=created_at)
+                self._put(row, created_at)
+            self._notify(row)
+        return UPDATED
+
+    def flush(self):
+        if self.checkpoint_path:
+            self.checkpoint()
+
+    def get(self, device_id):
+        return self._records.get(device_id)
+
+    def get_many(self, device_ids):
+        records = self._records
+        return {device_id: records[device_id] for device_id in device_ids if device_id in records}
+
+    def iterate_summary(self):
+        with self._lock:
+            records = [self._records[device_id] for device_id in self._sorted_ids]
+        return iter(records)
+
+    def iterate_all(self, consistent=False):
+        # Always consistent: the record list is copied under the lock
+        return self.iterate_summary()
+
+    def __len__(self):
+        return len(self._records)
+
+    def count(self):
+        return len(self._records)
+
+    def load_checkpoint(self):
+        # Replace in-memory state with the contents of the checkpoint file
+        conn = sqlite3.connect(self.checkpoint_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            migrate(conn)
+            rows = conn.execute(SELECT_ALL_SQL).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            self._records = {row['device_id']: DeviceRecord(*row) for row in rows}
+            self._sorted_ids = sorted(self._records)
+            self._changed = set()
+
+    def checkpoint(self):
+        # Upsert the devices written since the last checkpoint into
+        # checkpoint_path in one transaction
+        # Returns False when nothing changed since the last checkpoint
+        with self._lock:
+            if not self._changed:
+                return False
+            changed, self._changed = self._changed, set()
+            rows = [
+                tuple(self._records[device_id][field] for field in DEVICE_FIELDS)
+                for device_id in changed
+            ]
+        try:
+            conn = sqlite3.connect(self.checkpoint_path, timeout=30)
+            try:
+                migrate(conn)
+                run_backfills(conn)  # No-op once done; BackfillRunner only covers SQLite stores
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(UPSERT_SQL, rows)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            # Try again on the next checkpoint
+            with self._lock:
+                self._changed |= changed
+            raise
+        return True
+
+    def _checkpoint_loop(self):
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception:
+                # Keep the schedule running; the changes stay pending for the next interval
+                logger.exception('Checkpoint to %s failed', self.checkpoint_path)
+
+
+def create_store(database, checkpoint_path=None):
+    # Build the configured backend (STORAGE_BACKEND=sqlite|memory)
+    # checkpoint_path overrides MEMORY_CHECKPOINT_PATH for the memory backend
+    backend = os.getenv('STORAGE_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteStatusStore(database, int(os.getenv('SQLITE_POOL_SIZE', '8')))
+    if backend == 'memory':
+        if checkpoint_path is None:
+            checkpoint_path = os.getenv('MEMORY_CHECKPOINT_PATH', database)
+        return MemoryStatusStore(
+            checkpoint_path=checkpoint_path or None,
+            checkpoint_interval=float(os.getenv('MEMORY_CHECKPOINT_INTERVAL', '30'))
+        )
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
@@ -0,0 +1,210 @@
+# Multi-tenant isolation by API key
+# API_KEY_TENANTS maps keys to tenants ("key-a:acme,key-b:globex"); keys
+# without a mapping belong to the default tenant, which keeps using the
+# service's main store. Every other tenant gets its own partition - a
+# separate SQLite file (TENANT_DATA_DIR/<tenant>.db) holding its device
+# status and registry - so one tenant's summary scans only its own devices
+# and its writes never wait on another tenant's database lock.
+#
+# Quotas (TENANT_MAX_DEVICES, TENANT_INGEST_RATE readings/s with
+# TENANT_INGEST_BURST, TENANT_MAX_INFLIGHT requests) apply per tenant and can
+# be overridden with TENANT_QUOTAS="acme:max_devices=500:ingest_rate=50".
+
+import os
+import re
+import threading
+import time
+
+from registry import DeviceRegistry, GroupAggregates
+from storage import create_store
+
+DEFAULT_TENANT = 'default'
+TENANT_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+QUOTA_FIELDS = ('max_devices', 'ingest_rate', 'ingest_burst', 'max_inflight')
+
+
+class QuotaExceeded(Exception):
+    # A tenant limit was hit - status is the HTTP code to return
+
+    def __init__(self, message, status=429, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_tenant_map(text):
+    # "key-a:acme,key-b:globex" -> {'key-a': 'acme', 'key-b': 'globex'}
+    mapping = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        key, sep, tenant = item.rpartition(':')
+        if not sep or not key or not TENANT_NAME.match(tenant):
+            raise ValueError(f'Invalid API_KEY_TENANTS entry: {item!r} (expected key:tenant)')
+        mapping[key] = tenant
+    return mapping
+
+
+def parse_quota_overrides(text):
+    # "acme:max_devices=500:ingest_rate=50,globex:max_inflight=4" -> {tenant: {field: value}}
+    overrides = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        tenant, *settings = item.split(':')
+        values = {}
+        for setting in settings:
+            name, _, value = setting.partition('=')
+            if name not in QUOTA_FIELDS:
+                raise ValueError(f'Unknown tenant quota {name!r} (choose from {", ".join(QUOTA_FIELDS)})')
+            values[name] = float(value)
+        overrides[tenant] = values
+    return overrides
+
+
+class TokenBucket:
+    # rate tokens per second, holding at most burst
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, count):
+        # Remove count tokens if available - returns seconds to wait otherwise (0 when taken)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if count > self.burst:
+                return float('inf')
+            if self.tokens >= count:
+                self.tokens -= count
+                return 0.0
+            return (count - self.tokens) / self.rate
+
+
+class Partition:
+    # Storage objects owned by one tenant
+
+    def __init__(self, store, registry, group_aggregates):
+        self.store = store
+        self.registry = registry
+        self.group_aggregates = group_aggregates
+
+
+class TenantQuota:
+    # Per-tenant limits and their running state; 0 disables a limit
+
+    def __init__(self, max_devices=0, ingest_rate=0, ingest_burst=0, max_inflight=0):
+        self.max_devices = int(max_devices)
+        self.max_inflight = int(max_inflight)
+        self.bucket = None
+        if ingest_rate:
+            self.bucket = TokenBucket(float(ingest_rate), float(ingest_burst or ingest_rate))
+        self.inflight = threading.BoundedSemaphore(self.max_inflight) if self.max_inflight else None
+        self.device_count = None
+        self.lock = threading.Lock()
+
+
+class TenantManager:
+    # Resolves API keys to tenants, owns tenant partitions and enforces quotas
+
+    def __init__(self, key_tenants=None, data_dir='tenants', defaults=None, overrides=None):
+        self.key_tenants = dict(key_tenants or {})
+        self.data_dir = data_dir
+        self.defaults = dict(defaults or {})
+        self.overrides = dict(overrides or {})
+        self._partitions = {}
+        self._quotas = {}
+        self._lock = threading.Lock()
+
+    def tenant_for_key(self, api_key):
+        return self.key_tenants.get(api_key, DEFAULT_TENANT)
+
+    def tenant_names(self):
+        return sorted(set(self.key_tenants.values()))
+
+    def quota(self, tenant):
+        quota = self._quotas.get(tenant)
+        if quota is None:
+            with self._lock:
+                quota = self._quotas.get(tenant)
+                if quota is None:
+                    settings = dict(self.defaults, **self.overrides.get(tenant, {}))
+                    quota = self._quotas[tenant] = TenantQuota(**settings)
+        return quota
+
+    def partition(self, tenant):
+        # Storage for a non-default tenant, created and loaded on first use
+        partition = self._partitions.get(tenant)
+        if partition is None:
+            with self._lock:
+                partition = self._partitions.get(tenant)
+                if partition is None:
+                    partition = self._partitions[tenant] = self._open(tenant)
+        return partition
+
+    def _open(self, tenant):
+        os.makedirs(self.data_dir, exist_ok=True)
+        # One file per tenant holds device_status (or the memory checkpoint,
+        # which updates it in place) and the registry tables
+        path = os.path.join(self.data_dir, f'{tenant}.db')
+        store = create_store(path, checkpoint_path=path)
+        registry = DeviceRegistry(path)
+        group_aggregates = GroupAggregates()
+        store.initialize()
+        registry.initialize()
+        group_aggregates.load(registry.memberships(), store)
+        store.add_listener(group_aggregates.update)
+        return Partition(store, registry, group_aggregates)
+
+    def close(self):
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.store.close()
+            self._partitions = {}
+
+    def enter(self, tenant):
+        # Claim an in-flight slot for a request - pair with leave()
+        inflight = self.quota(tenant).inflight
+        if inflight is not None and not inflight.acquire(blocking=False):
+            raise QuotaExceeded(f'Tenant {tenant} has too many requests in flight')
+
+    def leave(self, tenant):
+        inflight = self.quota(tenant).inflight
+        if inflight is not None:
+            inflight.release()
+
+    def admit_ingest(self, tenant, store, device_ids):
+        # Check ingest rate and device count before storing readings
+        quota = self.quota(tenant)
+        if quota.bucket is not None:
+            wait = quota.bucket.take(len(device_ids))
+            if wait:
+                retry_after = None if wait == float('inf') else max(1, int(wait + 0.999))
+                raise QuotaExceeded(f'Tenant {tenant} ingest rate exceeded', 429, retry_after)
+        if quota.max_devices:
+            with quota.lock:
+                if quota.device_count is None:
+                    quota.device_count = store.count()
+                known = store.get_many(device_ids)
+                new_devices = len(set(device_ids) - set(known))
+                if quota.device_count + new_devices > quota.max_devices:
+                    raise QuotaExceeded(f'Tenant {tenant} device quota of {quota.max_devices} exceeded', 403)
+                # Reserved before the write; a failed write overcounts until restart
+                quota.device_count += new_devices
+
+
+def create_tenant_manager(valid_api_keys):
+    # Build the manager from the environment
+    key_tenants = parse_tenant_map(os.getenv('API_KEY_TENANTS', ''))
+    defaults = {
+        'max_devices': float(os.getenv('TENANT_MAX_DEVICES', '0')),
+        'ingest_rate': float(os.getenv('TENANT_INGEST_RATE', '0')),
+        'ingest_burst': float(os.getenv('TENANT_INGEST_BURST', '0')),
+        'max_inflight': float(os.getenv('TENANT_MAX_INFLIGHT', '0')),
+    }
+    overrides = parse_quota_overrides(os.getenv('TENANT_QUOTAS', ''))
+    unknown = set(key_tenants) - set(valid_api_keys)
+    if unknown:
+        raise ValueError('API_KEY_TENANTS maps keys that are not in API_KEYS')
+    return TenantManager(key_tenants, os.getenv('TENANT_DATA_DIR', 'tenants'), defaults, overrides)
@@ -0,0 +1,54 @@
+# Shared fixtures for tests that drive app.py through its test client
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from storage import MemoryStatusStore
+
+
+def make_device(device_id, battery_level=80, rssi=-60, online=True, timestamp="2025-06-19T14:00:00Z", **extra):
+    # Build a valid device payload; extra adds or overrides fields
+    return dict({
+        "device_id": device_id,
+        "timestamp": timestamp,
+        "battery_level": battery_level,
+        "rssi": rssi,
+        "online": online
+    }, **extra)
+
+
+def default_app_settings():
+    # An empty in-memory store and none of the optional ingest-side features
+    return {
+        'store': MemoryStatusStore(),
+        'ingest_log': None,
+        'fleet_table': None,
+        'summary_cache': None,
+    }
+
+
+@pytest.fixture
+def configure_app(monkeypatch):
+    # configure_app(**settings) patches app.py's module globals for one test
+    # and returns a test client; settings override default_app_settings()
+    def configure(**settings):
+        for name, value in dict(default_app_settings(), **settings).items():
+            monkeypatch.setattr(app_module, name, value)
+        return app_module.app.test_client()
+    return configure
+
+
+@pytest.fixture
+def app_settings():
+    # Module globals the client fixture overrides - redefine in a test module
+    # or class to change them
+    return {}
+
+
+@pytest.fixture
+def client(configure_app, app_settings):
+    return configure_app(**app_settings)
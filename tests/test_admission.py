@@ -0,0 +1,167 @@
+# Unit tests for priority-aware admission control
+
+import pytest
+import sqlite3
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+import storage
+from admission import INGEST, READ, SCAN, AdmissionController, AdmissionRejected
+from storage import SQLiteStatusStore
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+def controller(ingest=(2, 0.05), read=(2, 0.05), scan=(2, 0.05)):
+    return AdmissionController({INGEST: ingest, READ: read, SCAN: scan})
+
+
+class TestAdmissionController:
+    # Slots, queue timeouts and scan priority
+
+    def test_limit_and_timeout(self):
+        limits = controller(read=(1, 0.05))
+        limits.acquire(READ)
+
+        with pytest.raises(AdmissionRejected):
+            limits.acquire(READ)
+        limits.acquire(INGEST)  # Other classes have their own slots
+        limits.release(READ)
+        limits.acquire(READ)
+
+    def test_queued_request_gets_released_slot(self):
+        limits = controller(read=(1, 5))
+        limits.acquire(READ)
+        threading.Timer(0.05, limits.release, [READ]).start()
+
+        limits.acquire(READ)
+
+        assert limits.classes[READ].running == 1
+
+    def test_scan_waits_for_queued_ingest(self):
+        limits = controller(ingest=(1, 5), scan=(2, 0.05))
+        limits.acquire(INGEST)
+        waiter = threading.Thread(target=limits.acquire, args=(INGEST,))
+        waiter.start()
+        while not limits.classes[INGEST].queued:
+            time.sleep(0.001)
+
+        with pytest.raises(AdmissionRejected):
+            limits.acquire(SCAN)
+        limits.release(INGEST)
+        waiter.join()
+        limits.acquire(SCAN)
+
+    def test_one_scan_while_ingest_is_busy(self):
+        limits = controller(ingest=(2, 0.05), scan=(2, 0.05))
+        limits.acquire(SCAN)
+        limits.acquire(INGEST)
+
+        with pytest.raises(AdmissionRejected):
+            limits.acquire(SCAN)
+
+    def test_outcomes_are_counted(self):
+        metrics.registry.reset()
+        limits = controller(scan=(0, 0))
+        limits.acquire(READ)
+        with pytest.raises(AdmissionRejected):
+            limits.acquire(SCAN)
+
+        counters = metrics.registry.collect()['counters']
+        assert counters[('admission_requests_total', (READ, 'admitted'))] == 1
+        assert counters[('admission_requests_total', (SCAN, 'rejected'))] == 1
+
+
+class TestAdmissionEndpoints:
+    # Views are classified and rejected with 503
+
+    @pytest.fixture
+    def app_settings(self):
+        return {'admission': controller(scan=(0, 0))}
+
+    def test_scan_rejected_while_ingest_admitted(self, client):
+        response = client.get('/status/summary', headers=HEADERS)
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert client.post('/status', json=make_device("d1"), headers=HEADERS).status_code == 200
+        assert client.get('/status/d1', headers=HEADERS).status_code == 200
+        assert 'admission_in_flight{class="scan"} 0' in client.get('/metrics').get_data(as_text=True)
+
+
+class TestPagedScans:
+    # SQLite scans release the read lock between pages
+
+    def test_writer_not_blocked_between_pages(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage, 'SCAN_PAGE_SIZE', 2)
+        path = str(tmp_path / 'test.db')
+        store = SQLiteStatusStore(path)
+        store.initialize()
+        store.batch_upsert([make_device(f"d{index}") for index in range(5)])
+        writer = sqlite3.connect(path, timeout=0)
+
+        rows = store.iterate_summary()
+        first = next(rows)
+        writer.execute("UPDATE device_status SET battery_level = 1 WHERE device_id = 'd4'")
+        writer.commit()  # Would raise 'database is locked' if the scan held its read lock
+        remaining = list(rows)
+        writer.close()
+
+        assert [row['device_id'] for row in [first] + remaining] == ["d0", "d1", "d2", "d3", "d4"]
+        assert remaining[-1]['battery_level'] == 1
+
+    def test_empty_device_id_on_first_page(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage, 'SCAN_PAGE_SIZE', 2)
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        store.batch_upsert([make_device(device_id) for device_id in ["", "a", "b", "c"]])
+
+        assert [row['device_id'] for row in store.iterate_summary()] == ["", "a", "b", "c"]
+        assert [row['device_id'] for row in store.iterate_all(consistent=True)] == ["", "a", "b", "c"]
+
+    def test_consistent_scan_sees_one_snapshot(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage, 'SCAN_PAGE_SIZE', 2)
+        path = str(tmp_path / 'test.db')
+        store = SQLiteStatusStore(path)
+        store.initialize()
+        store.batch_upsert([make_device(f"d{index}") for index in range(5)])
+        writer = sqlite3.connect(path, timeout=0)
+
+        rows = store.iterate_all(consistent=True)
+        first = next(rows)
+        # initialize() switched to WAL, so the write does not wait for the scan
+        writer.execute("UPDATE device_status SET battery_level = 1 WHERE device_id = 'd4'")
+        writer.commit()
+        writer.close()
+        remaining = list(rows)
+
+        assert [row['device_id'] for row in [first] + remaining] == ["d0", "d1", "d2", "d3", "d4"]
+        assert remaining[-1]['battery_level'] == 80
+        assert store.get("d4")['battery_level'] == 1
+
+    def test_consistent_scan_is_paged_without_wal(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage, 'SCAN_PAGE_SIZE', 2)
+        path = str(tmp_path / 'test.db')
+        store = SQLiteStatusStore(path)
+        store.initialize()
+        store.batch_upsert([make_device(f"d{index}") for index in range(5)])
+        store.close()
+        writer = sqlite3.connect(path, timeout=0)
+        writer.execute('PRAGMA journal_mode=DELETE')
+
+        rows = store.iterate_all(consistent=True)
+        first = next(rows)
+        # Would raise 'database is locked' if the scan held its read lock
+        writer.execute("UPDATE device_status SET battery_level = 1 WHERE device_id = 'd4'")
+        writer.commit()
+        writer.close()
+        remaining = list(rows)
+
+        assert [row['device_id'] for row in [first] + remaining] == ["d0", "d1", "d2", "d3", "d4"]
+        assert remaining[-1]['battery_level'] == 1
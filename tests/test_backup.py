@@ -0,0 +1,129 @@
+# Unit tests for online SQLite backups and restore
+
+import pytest
+import sqlite3
+import sys
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import backup
+from registry import DeviceRegistry
+from storage import SQLiteStatusStore
+from tests.conftest import make_device
+
+
+@pytest.fixture
+def database(tmp_path):
+    # SQLite store with enough rows to need several backup steps
+    path = str(tmp_path / 'test.db')
+    store = SQLiteStatusStore(path)
+    store.initialize()
+    store.batch_upsert([make_device(f"sensor-{index:04d}") for index in range(2000)])
+    store.close()
+    return path
+
+
+@pytest.fixture
+def rollback_database(database):
+    # The same database in rollback-journal mode
+    conn = sqlite3.connect(database)
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+    return database
+
+
+class TestBackup:
+    # backup.backup_database and backup sets
+
+    def test_wal_backup_is_one_step(self, database, tmp_path):
+        dest_path = str(tmp_path / 'copy.db')
+        stats = backup.backup_database(database, dest_path, pages=4, sleep=0)
+
+        assert stats.steps == 1
+        assert stats.bytes == os.path.getsize(dest_path)
+        assert backup.check_integrity(dest_path) == []
+        assert SQLiteStatusStore(dest_path).count() == 2000
+        assert not os.path.exists(dest_path + '-wal')
+
+    def test_paged_backup(self, rollback_database, tmp_path):
+        dest_path = str(tmp_path / 'copy.db')
+        stats = backup.backup_database(rollback_database, dest_path, pages=4, sleep=0)
+
+        assert stats.steps > 1
+        assert stats.bytes == os.path.getsize(dest_path)
+        assert backup.check_integrity(dest_path) == []
+        assert SQLiteStatusStore(dest_path).count() == 2000
+
+    def test_busy_source_fails_instead_of_locking(self, rollback_database, tmp_path, monkeypatch):
+        writer = sqlite3.connect(rollback_database)
+
+        def write_between_steps(seconds):
+            # Every write through another connection restarts the paged copy
+            writer.execute("UPDATE device_status SET battery_level = battery_level - 1 WHERE device_id = 'sensor-0000'")
+            writer.commit()
+
+        monkeypatch.setattr(backup, 'time', SimpleNamespace(sleep=write_between_steps, perf_counter=time.perf_counter))
+        with pytest.raises(backup.BackupRestarted):
+            backup.backup_database(rollback_database, str(tmp_path / 'copy.db'), pages=4, sleep=0.001, max_restarts=2)
+        writer.close()
+
+        assert os.listdir(tmp_path) == ['test.db']
+
+    def test_missing_source_is_not_created(self, tmp_path):
+        with pytest.raises(sqlite3.OperationalError):
+            backup.backup_database(str(tmp_path / 'missing.db'), str(tmp_path / 'copy.db'))
+        assert not os.path.exists(tmp_path / 'missing.db')
+
+    def test_integrity_check_reports_corruption(self, tmp_path):
+        path = str(tmp_path / 'corrupt.db')
+        with open(path, 'wb') as f:
+            f.write(b'SQLite format 3\x00' + b'\xff' * 4096)
+
+        assert backup.check_integrity(path) != []
+
+    def test_sets_are_pruned(self, database, tmp_path):
+        out_dir = str(tmp_path / 'backups')
+        for hour in range(3):
+            backup_time = datetime(2025, 6, 19, hour, tzinfo=timezone.utc)
+            backup.backup_set([database], out_dir, sleep=0, backup_time=backup_time)
+
+        assert backup.prune_backup_sets(out_dir, keep=2) == [os.path.join(out_dir, 'backup-20250619T000000Z')]
+        assert len(backup.list_backup_sets(out_dir)) == 2
+
+    def test_restore(self, database, tmp_path):
+        dest_path = str(tmp_path / 'copy.db')
+        backup.backup_database(database, dest_path, sleep=0)
+        conn = sqlite3.connect(database)
+        conn.execute("DELETE FROM device_status")
+        conn.commit()
+        conn.close()
+
+        backup.restore_database(dest_path, database)
+
+        assert SQLiteStatusStore(database).count() == 2000
+
+
+class TestCommands:
+    # flask backup / restore
+
+    def test_backup_then_restore(self, database, tmp_path, configure_app):
+        store = SQLiteStatusStore(database)
+        configure_app(store=store, registry=DeviceRegistry(database))
+        out_dir = str(tmp_path / 'backups')
+        runner = app_module.app.test_cli_runner()
+
+        result = runner.invoke(args=['backup', '--out-dir', out_dir, '--sleep-ms', '0'])
+        assert result.exit_code == 0
+        assert 'MB/s' in result.output and 'integrity ok' in result.output
+
+        store.upsert(make_device("after-backup"))
+        set_dir = backup.list_backup_sets(out_dir)[0]
+        result = runner.invoke(args=['restore', set_dir])
+        assert result.exit_code == 0
+        assert store.get("after-backup") is None
+        assert store.count() == 2000
@@ -0,0 +1,74 @@
+# Unit tests for the benchmark fleet generator
+
+import sys
+import os
+import random
+
+# Add bench directory to path so we can import the fleet helpers
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import validate_device_data
+from fleet import Fleet, device_id, percentile
+
+
+class TestFleet:
+    # Synthetic fleets must produce valid, reproducible readings
+
+    def test_readings_are_valid(self):
+        fleet = Fleet(500, seed=1)
+
+        for reading in fleet.seed_readings():
+            assert validate_device_data(reading) == (True, None)
+
+    def test_same_seed_same_fleet(self):
+        assert list(Fleet(100, seed=7).rssi) == list(Fleet(100, seed=7).rssi)
+
+    def test_reporting_distribution_is_skewed(self):
+        fleet = Fleet(1000, seed=3)
+        rng = random.Random(3)
+        counts = {}
+        for _ in range(20000):
+            index = fleet.pick(rng)
+            counts[index] = counts.get(index, 0) + 1
+
+        busiest = sorted(counts.values(), reverse=True)
+        # The busiest 1% of devices send far more than 1% of readings
+        assert sum(busiest[:10]) > 0.2 * 20000
+
+    def test_device_id_format(self):
+        assert device_id(0) == 'sensor-kitchen-0000000'
+
+
+class TestPercentile:
+    # Nearest-rank percentile
+
+    def test_percentiles(self):
+        values = list(range(1, 101))
+
+        assert percentile(values, 0.50) == 50
+        assert percentile(values, 0.99) == 99
+        assert percentile([], 0.5) is None
+
+
+class TestRegressionCheck:
+    # Microbenchmark baseline comparison
+
+    def test_slowdown_over_threshold_reported(self):
+        from microbench import find_regressions
+
+        baseline = {'validate/valid': 1.0e-6, 'format/device_response': 1.0e-6}
+        results = {'validate/valid': 1.05e-6, 'format/device_response': 1.5e-6, 'sqlite/get': 1.0}
+
+        regressions = find_regressions(results, baseline, threshold_percent=10)
+
+        assert [name for name, _, _, _ in regressions] == ['format/device_response']
+
+
+class TestBenchLayout:
+    # bench/ is put on sys.path, so its scripts must not shadow app modules
+
+    def test_no_shadowed_modules(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        modules = lambda path: {name[:-3] for name in os.listdir(path) if name.endswith('.py')}
+
+        assert modules(os.path.join(root, 'bench')) & modules(root) == set()
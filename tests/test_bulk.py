@@ -0,0 +1,120 @@
+# Unit tests for bulk NDJSON import/export
+
+import sys
+import os
+import gzip
+import json
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import bulk
+from app import validate_device_data
+from registry import DeviceRegistry
+from storage import MemoryStatusStore, SQLiteStatusStore
+from tests.conftest import make_device
+
+
+def write_ndjson(path, records, compress=False):
+    # Write records (dicts or raw strings) as NDJSON
+    lines = [r if isinstance(r, str) else json.dumps(r) for r in records]
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+    with (gzip.open(path, 'wb') if compress else open(path, 'wb')) as f:
+        f.write(data)
+
+
+class TestImportNdjson:
+    # bulk.import_ndjson
+
+    def test_import_plain(self, tmp_path):
+        path = str(tmp_path / 'readings.ndjson')
+        write_ndjson(path, [make_device(f"sensor-{i}") for i in range(25)])
+        store = MemoryStatusStore()
+
+        stats = bulk.import_ndjson(store, path, validate_device_data, batch_size=10)
+
+        assert stats.imported == 25
+        assert stats.rejected == 0
+        assert stats.offset == os.path.getsize(path)
+        assert len(store) == 25
+
+    def test_import_gzip(self, tmp_path):
+        path = str(tmp_path / 'readings.ndjson.gz')
+        write_ndjson(path, [make_device("sensor-1"), make_device("sensor-2")], compress=True)
+        store = MemoryStatusStore()
+
+        stats = bulk.import_ndjson(store, path, validate_device_data)
+
+        assert stats.imported == 2
+
+    def test_invalid_lines_rejected(self, tmp_path):
+        path = str(tmp_path / 'readings.ndjson')
+        write_ndjson(path, [
+            make_device("sensor-1"),
+            "{not json",
+            "[1, 2]",
+            make_device("sensor-2", battery_level=150),
+            dict(make_device("sensor-3"), timestamp=12345),
+        ])
+        store = MemoryStatusStore()
+        rejected = []
+
+        stats = bulk.import_ndjson(
+            store, path, validate_device_data,
+            on_reject=lambda offset, error: rejected.append(error)
+        )
+
+        assert stats.imported == 1
+        assert stats.rejected == 4
+        assert rejected[0] == 'invalid JSON'
+        assert 'battery_level' in rejected[2]
+
+    def test_resume_from_offset(self, tmp_path):
+        path = str(tmp_path / 'readings.ndjson')
+        write_ndjson(path, [make_device(f"sensor-{i}") for i in range(10)])
+        offsets = []
+        bulk.import_ndjson(
+            MemoryStatusStore(), path, validate_device_data, batch_size=4,
+            on_progress=lambda stats: offsets.append(stats.offset)
+        )
+
+        store = MemoryStatusStore()
+        stats = bulk.import_ndjson(store, path, validate_device_data, offset=offsets[1])
+
+        assert stats.imported == 2
+        assert [row['device_id'] for row in store.iterate_summary()] == ["sensor-8", "sensor-9"]
+
+
+class TestExportNdjson:
+    # bulk.export_ndjson
+
+    def test_export_round_trip(self, tmp_path):
+        source = MemoryStatusStore()
+        source.batch_upsert([make_device("sensor-1", 10), make_device("sensor-2", 20)])
+        path = str(tmp_path / 'export.ndjson.gz')
+
+        assert bulk.export_ndjson(source, path, compress=True) == 2
+
+        target = MemoryStatusStore()
+        bulk.import_ndjson(target, path, validate_device_data)
+        assert target.get("sensor-2")['battery_level'] == 20
+
+
+class TestCommands:
+    # flask import-ndjson / export-ndjson
+
+    def test_import_then_export(self, tmp_path, configure_app):
+        configure_app(store=SQLiteStatusStore(str(tmp_path / 'test.db')), registry=DeviceRegistry(str(tmp_path / 'test.db')))
+        source = str(tmp_path / 'readings.ndjson')
+        write_ndjson(source, [make_device("sensor-1"), make_device("sensor-2")])
+        runner = app_module.app.test_cli_runner()
+
+        result = runner.invoke(args=['import-ndjson', source, '--quiet'])
+        assert result.exit_code == 0
+        assert 'Imported 2 readings' in result.output
+
+        target = str(tmp_path / 'export.ndjson')
+        result = runner.invoke(args=['export-ndjson', target])
+        assert result.exit_code == 0
+        with open(target) as f:
+            assert [json.loads(line)['device_id'] for line in f] == ["sensor-1", "sensor-2"]
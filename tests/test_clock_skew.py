@@ -0,0 +1,114 @@
+# Unit tests for device clock skew detection
+
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import metrics
+from clock_skew import CLAMP, CLAMPED, OBSERVE, OK, OUT_OF_BOUNDS, REJECT, REJECTED, SkewTracker
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+def iso(seconds_from_now):
+    moment = datetime.now(timezone.utc) + timedelta(seconds=seconds_from_now)
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class TestSkewTracker:
+    # Bounds and the per-device estimate
+
+    def test_bounds_by_mode(self):
+        assert SkewTracker(REJECT, max_future=300).check('d1', 1000, 1000)[0] == OK
+        assert SkewTracker(REJECT, max_future=300).check('d1', 1301, 1000)[0] == REJECTED
+        assert SkewTracker(CLAMP, max_past=60).check('d1', 0, 1000)[0] == CLAMPED
+        assert SkewTracker(OBSERVE, max_past=60).check('d1', 0, 1000) == (OUT_OF_BOUNDS, -1000)
+
+    def test_estimate_is_smoothed(self):
+        tracker = SkewTracker(alpha=0.5)
+        tracker.observe('d1', 100)
+        tracker.observe('d1', 0)
+
+        assert tracker.estimate('d1') == 50
+        assert tracker.skewed(60) == []
+        assert tracker.skewed(50) == [('d1', 50)]
+
+
+class TestSkewedIngest:
+    # POST /status and POST /status/batch with bad device clocks
+
+    def test_future_reading_rejected(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'skew_tracker', SkewTracker(REJECT, max_future=300))
+
+        response = client.post('/status', json=make_device("d1", timestamp=iso(3600)), headers=HEADERS)
+
+        assert response.status_code == 400
+        assert 'from server time' in response.get_json()['error']
+        assert app_module.store.get("d1") is None
+
+    def test_1970_reading_clamped_to_server_time(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'skew_tracker', SkewTracker(CLAMP))
+
+        before = time.time()
+        client.post('/status', json=make_device("d1", timestamp="1970-01-01T00:00:00Z"), headers=HEADERS)
+
+        stored = datetime.fromisoformat(app_module.store.get("d1")['timestamp'].replace('Z', '+00:00'))
+        assert stored.timestamp() >= int(before)
+        assert app_module.skew_tracker.estimate(('default', 'd1')) < -1e9
+
+    def test_batch_reports_skewed_readings_by_index(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'skew_tracker', SkewTracker(REJECT))
+        readings = [{"device_id": "bad"}, make_device("d1", timestamp=iso(0)), make_device("d2", timestamp=iso(86400))]
+
+        body = client.post('/status/batch', json=readings, headers=HEADERS).get_json()
+
+        assert body['accepted'] == 1
+        assert [entry['index'] for entry in body['rejected']] == [0, 2]
+
+    def test_skew_counts_on_metrics(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'skew_tracker', SkewTracker(OBSERVE))
+        metrics.registry.reset()
+        client.post('/status', json=make_device("fast", timestamp=iso(600)), headers=HEADERS)
+        client.post('/status', json=make_device(42, timestamp=iso(-600)), headers=HEADERS)  # device_id is not type-checked
+        client.post('/status', json=make_device("good", timestamp=iso(0)), headers=HEADERS)
+
+        response = client.get('/metrics')
+        text = response.get_data(as_text=True)
+
+        assert response.status_code == 200
+        assert 'clock_skew_devices{direction="ahead"} 1' in text
+        assert 'clock_skew_devices{direction="behind"} 1' in text
+        assert 'clock_skew_tracked_devices 3' in text
+        assert 'device_id=' not in text and 'tenant=' not in text
+        assert 'clock_skew_readings_total{result="out_of_bounds"} 1' in text
+        assert app_module.store.get("fast") is not None  # Observe mode stores it as reported
+
+    def test_skewed_devices_listed_for_own_tenant(self, client, monkeypatch):
+        tracker = SkewTracker(OBSERVE)
+        tracker.observe(('other', 'secret'), 600)
+        monkeypatch.setattr(app_module, 'skew_tracker', tracker)
+        client.post('/status', json=make_device("fast", timestamp=iso(600)), headers=HEADERS)
+        client.post('/status', json=make_device(42, timestamp=iso(-600)), headers=HEADERS)
+
+        body = client.get('/clock-skew', headers=HEADERS).get_json()
+
+        assert [device['device_id'] for device in body['devices']] == [42, "fast"]
+        assert client.get('/clock-skew').status_code == 401
+        assert client.get('/clock-skew?min_seconds=soon', headers=HEADERS).status_code == 400
+
+
+class TestSkewTrackerBounds:
+    # Memory stays bounded
+
+    def test_least_recent_device_dropped(self):
+        tracker = SkewTracker(max_devices=2)
+        for key in ('a', 'b', 'a', 'c'):
+            tracker.observe(key, 100)
+
+        assert tracker.estimate('b') is None
+        assert tracker.estimate('a') == 100 and tracker.estimate('c') == 100
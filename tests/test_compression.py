@@ -0,0 +1,122 @@
+# Unit tests for request decompression and response compression
+
+import pytest
+import sys
+import os
+import io
+import gzip
+import json
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from compression import ResponseCompressor, decompress_body, zstandard
+from ingest_formats import PayloadError
+from storage import MemoryStatusStore
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+def codings():
+    return ['gzip', 'zstd'] if zstandard is not None else ['gzip']
+
+
+def compress(body, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor().compress(body)
+    return gzip.compress(body)
+
+
+class TestDecompressBody:
+    # Streaming decompression with an output cap
+
+    @pytest.mark.parametrize("encoding", codings())
+    def test_round_trip(self, encoding):
+        body = b'{"device_id": "sensor-1"}' * 1000
+
+        assert decompress_body(io.BytesIO(compress(body, encoding)), encoding, len(body)) == body
+
+    @pytest.mark.parametrize("encoding", codings())
+    def test_bomb_rejected(self, encoding):
+        # 10 MB of zeros compresses to a few KB
+        bomb = compress(bytes(10 * 1024 * 1024), encoding)
+
+        with pytest.raises(PayloadError) as error:
+            decompress_body(io.BytesIO(bomb), encoding, 1024 * 1024)
+        assert error.value.status == 413
+
+    def test_concatenated_gzip_members(self):
+        body = gzip.compress(b'[1,') + gzip.compress(b'2]')
+
+        assert decompress_body(io.BytesIO(body), 'gzip', 100) == b'[1,2]'
+
+    def test_corrupt_body_is_400(self):
+        with pytest.raises(PayloadError) as error:
+            decompress_body(io.BytesIO(b'not gzip'), 'gzip', 100)
+        assert error.value.status == 400
+
+    def test_unknown_coding_is_415(self):
+        with pytest.raises(PayloadError) as error:
+            decompress_body(io.BytesIO(b''), 'br', 100)
+        assert error.value.status == 415
+
+
+class TestCompressionEndpoints:
+    # Compressed ingest and Accept-Encoding negotiation
+
+    @pytest.fixture
+    def app_settings(self):
+        store = MemoryStatusStore()
+        for i in range(200):
+            store.upsert(make_device(f"sensor-{i:03d}"))
+        return {'store': store, 'response_compressor': ResponseCompressor(min_bytes=1024)}
+
+    @pytest.mark.parametrize("encoding", codings())
+    def test_compressed_batch(self, client, encoding):
+        readings = [make_device(f"new-{i}") for i in range(100)]
+        response = client.post(
+            '/status/batch',
+            data=compress(json.dumps(readings).encode(), encoding),
+            content_type='application/json',
+            headers=dict(HEADERS, **{'Content-Encoding': encoding})
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()['accepted'] == 100
+
+    def test_compressed_bomb_is_413(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'MAX_DECOMPRESSED_BYTES', 1024)
+        response = client.post(
+            '/status',
+            data=gzip.compress(bytes(100000)),
+            content_type='application/json',
+            headers=dict(HEADERS, **{'Content-Encoding': 'gzip'})
+        )
+
+        assert response.status_code == 413
+
+    def test_summary_gzip(self, client):
+        response = client.get('/status/summary', headers=dict(HEADERS, **{'Accept-Encoding': 'gzip'}))
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(json.loads(gzip.decompress(response.data))['devices']) == 200
+
+    @pytest.mark.skipif(zstandard is None, reason="zstandard not installed")
+    def test_summary_prefers_zstd(self, client):
+        response = client.get('/status/summary', headers=dict(HEADERS, **{'Accept-Encoding': 'gzip, zstd'}))
+
+        assert response.headers['Content-Encoding'] == 'zstd'
+
+    def test_small_response_not_compressed(self, client):
+        response = client.get('/status/sensor-001', headers=dict(HEADERS, **{'Accept-Encoding': 'gzip'}))
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json()['device_id'] == 'sensor-001'
+
+    def test_no_accept_encoding(self, client):
+        response = client.get('/status/summary', headers=HEADERS)
+
+        assert 'Content-Encoding' not in response.headers
+        assert len(response.get_json()['devices']) == 200
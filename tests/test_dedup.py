@@ -0,0 +1,114 @@
+# Unit tests for idempotent ingest and the dedup index
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import metrics
+from dedup import BLOOM, LRU, DedupIndex
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+class TestDedupIndex:
+    # Exact LRU, Bloom buckets and persistence
+
+    def test_lru_then_bloom(self):
+        index = DedupIndex(lru_size=2, bits=1 << 12)
+        for key in ('a', 'b', 'c'):
+            index.add(key)
+
+        assert index.check('c') == LRU
+        assert index.check('a') == BLOOM  # Evicted from the LRU, still in the filter
+        assert index.check('never-added') is None
+
+    def test_buckets_expire_after_window(self):
+        index = DedupIndex(lru_size=0, window=7200, bucket_seconds=3600, bits=1 << 12)
+        index.add('old', now=0)
+
+        assert index.check('old', now=3600) == BLOOM
+        assert index.check('old', now=7200) is None
+
+    def test_saved_filter_survives_restart(self, tmp_path):
+        path = str(tmp_path / 'dedup.bin')
+        index = DedupIndex(bits=1 << 12, path=path)
+        index.add('message-1')
+        index.stop()
+
+        assert DedupIndex(bits=1 << 12, path=path).check('message-1') == BLOOM
+        assert DedupIndex(bits=1 << 13, path=path).check('message-1') is None  # Other parameters: ignored
+
+
+class TestIdempotentIngest:
+    # POST /status and POST /status/batch with message ids
+
+    @pytest.fixture
+    def app_settings(self):
+        return {'dedup_index': DedupIndex(bits=1 << 12)}
+
+    def test_retry_is_not_written(self, client):
+        client.post('/status', json=make_device("d1", message_id="m1"), headers=HEADERS)
+        created_at = app_module.store.get("d1")['created_at']
+
+        response = client.post('/status', json=make_device("d1", battery_level=5, message_id="m1"), headers=HEADERS)
+
+        assert response.status_code == 200
+        assert response.get_json()['duplicate'] is True
+        assert app_module.store.get("d1")['battery_level'] == 80
+        assert app_module.store.get("d1")['created_at'] == created_at
+
+    def test_idempotency_key_header(self, client):
+        headers = dict(HEADERS, **{'Idempotency-Key': 'k1'})
+        client.post('/status', json=make_device("d1"), headers=headers)
+
+        assert client.post('/status', json=make_device("d1"), headers=headers).get_json()['duplicate'] is True
+        assert 'duplicate' not in client.post('/status', json=make_device("d1"), headers=HEADERS).get_json()
+
+    def test_invalid_message_id(self, client):
+        response = client.post('/status', json=make_device("d1", message_id=""), headers=HEADERS)
+
+        assert response.status_code == 400
+
+    def test_bloom_hit_confirmed_by_stored_timestamp(self, client):
+        app_module.dedup_index.lru_size = 0
+        metrics.registry.reset()
+        client.post('/status', json=make_device("d1", message_id="m1"), headers=HEADERS)
+
+        # Retry of the stored reading: dropped
+        client.post('/status', json=make_device("d1", battery_level=5, message_id="m1"), headers=HEADERS)
+        assert app_module.store.get("d1")['battery_level'] == 80
+
+        # Same key but a newer reading than stored: a false positive, applied
+        newer = make_device("d1", battery_level=5, timestamp="2025-06-19T15:00:00Z", message_id="m1")
+        client.post('/status', json=newer, headers=HEADERS)
+        assert app_module.store.get("d1")['battery_level'] == 5
+
+        counters = metrics.registry.collect()['counters']
+        assert counters[('ingest_dedup_total', (BLOOM,))] == 1
+        assert counters[('ingest_dedup_total', ('false_positive',))] == 1
+
+    def test_retried_patch_is_not_applied_again(self, client):
+        client.post('/status', json=make_device("d1"), headers=HEADERS)
+        delta = {"device_id": "d1", "timestamp": "2025-06-19T14:05:00Z", "rssi": -70, "message_id": "p1"}
+        client.patch('/status', json=delta, headers=HEADERS)
+        client.patch('/status', json={"device_id": "d1", "timestamp": "2025-06-19T14:06:00Z", "rssi": -50}, headers=HEADERS)
+
+        response = client.patch('/status', json=delta, headers=HEADERS)
+
+        assert response.get_json() == {'message': 'Status updated successfully', 'changed': False, 'duplicate': True}
+        assert app_module.store.get("d1")['rssi'] == -50
+
+    def test_retried_batch(self, client):
+        headers = dict(HEADERS, **{'Idempotency-Key': 'batch-1'})
+        readings = [make_device("d1"), make_device("d2", message_id="m2"), {"device_id": "bad"}]
+        first = client.post('/status/batch', json=readings, headers=headers).get_json()
+
+        retry = client.post('/status/batch', json=readings, headers=headers).get_json()
+
+        assert first == {'accepted': 2, 'rejected': first['rejected']}
+        assert retry['accepted'] == 2
+        assert retry['duplicates'] == 2
@@ -0,0 +1,112 @@
+# Unit tests for partial-field delta updates (PATCH /status)
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from ingest_log import IngestLog
+from storage import NOT_FOUND, UNCHANGED, UPDATED, MemoryStatusStore, SQLiteStatusStore
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+    else:
+        store = MemoryStatusStore()
+    store.initialize()
+    store.upsert(make_device("d1"), "2025-06-19T14:00:01")
+    return store
+
+
+class TestUpdateFields:
+    # StatusStore.update_fields on both backends
+
+    def test_changed_columns_only(self, store):
+        notified = []
+        store.add_listener(notified.append)
+
+        result = store.update_fields({"device_id": "d1", "timestamp": "2025-06-19T14:01:00Z", "rssi": -70}, "2025-06-19T14:01:01")
+
+        row = store.get("d1")
+        assert result == UPDATED
+        assert (row['timestamp'], row['battery_level'], row['rssi'], bool(row['online'])) == ("2025-06-19T14:01:00Z", 80, -70, True)
+        assert notified[0]['battery_level'] == 80 and notified[0]['created_at'] == "2025-06-19T14:01:01"
+
+    def test_identical_reading_is_not_written(self, store):
+        notified = []
+        store.add_listener(notified.append)
+
+        result = store.update_fields({"device_id": "d1", "timestamp": "2025-06-19T14:00:00Z", "rssi": -60})
+
+        assert result == UNCHANGED
+        assert notified == []
+        assert next(store.iterate_all())['created_at'] == "2025-06-19T14:00:01"
+
+    def test_unknown_device(self, store):
+        assert store.update_fields({"device_id": "nope", "timestamp": "2025-06-19T14:00:00Z"}) == NOT_FOUND
+        assert store.get("nope") is None
+
+    def test_sqlite_keeps_timestamp_epoch_in_step(self, tmp_path):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        store.upsert(make_device("d1"))
+        store.update_fields({"device_id": "d1", "timestamp": "2025-06-19T15:00:00Z"})
+
+        conn = store.connect()
+        epoch = conn.execute("SELECT timestamp_epoch FROM device_status WHERE device_id = 'd1'").fetchone()[0]
+        store.release(conn)
+        assert epoch == 1750345200
+
+
+class TestPatchStatus:
+    # PATCH /status
+
+    def test_partial_update(self, client):
+        client.post('/status', json=make_device("d1"), headers=HEADERS)
+
+        response = client.patch('/status', json={"device_id": "d1", "timestamp": "2025-06-19T14:05:00Z", "rssi": -75}, headers=HEADERS)
+
+        assert response.get_json() == {'message': 'Status updated successfully', 'changed': True}
+        body = client.get('/status/d1', headers=HEADERS).get_json()
+        assert (body['rssi'], body['battery_level'], body['timestamp']) == (-75, 80, "2025-06-19T14:05:00Z")
+
+    def test_retry_changes_nothing(self, client):
+        client.post('/status', json=make_device("d1"), headers=HEADERS)
+        delta = {"device_id": "d1", "timestamp": "2025-06-19T14:05:00Z", "online": False}
+        client.patch('/status', json=delta, headers=HEADERS)
+
+        assert client.patch('/status', json=delta, headers=HEADERS).get_json()['changed'] is False
+
+    def test_unknown_device(self, client):
+        response = client.patch('/status', json={"device_id": "nope", "timestamp": "2025-06-19T14:05:00Z"}, headers=HEADERS)
+
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('delta, error', [
+        ({"device_id": "d1", "rssi": -70}, 'Missing required field: timestamp'),
+        ({"device_id": "d1", "timestamp": "2025-06-19T14:05:00Z", "battery": 5}, 'Unknown field: battery'),
+        ({"device_id": "d1", "timestamp": "2025-06-19T14:05:00Z", "battery_level": 101}, 'battery_level must be an integer between 0 and 100'),
+    ])
+    def test_validation(self, client, delta, error):
+        response = client.patch('/status', json=delta, headers=HEADERS)
+
+        assert response.status_code == 400
+        assert response.get_json()['error'] == error
+
+    def test_ingest_log_replays_deltas_in_order(self, client, tmp_path, monkeypatch):
+        log = IngestLog(str(tmp_path / 'ingest.log'), fsync_mode='off')
+        monkeypatch.setattr(app_module, 'ingest_log', log)
+        client.post('/status', json=make_device("d1"), headers=HEADERS)
+        client.patch('/status', json={"device_id": "d1", "timestamp": "2025-06-19T14:05:00Z", "rssi": -75}, headers=HEADERS)
+
+        # Replay into an empty store, as after a crash before the writes landed
+        monkeypatch.setattr(app_module, 'store', MemoryStatusStore())
+        assert app_module.replay_ingest_log() == 2
+        assert app_module.store.get("d1")['rssi'] == -75
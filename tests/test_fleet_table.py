@@ -0,0 +1,97 @@
+# Unit tests for the columnar fleet table
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from fleet_table import FleetTable, load_numpy, timestamp_to_epoch
+from storage import MemoryStatusStore
+from tests.conftest import make_device
+
+
+def numpy_modes():
+    # Always test the pure Python path, and the NumPy path when installed
+    return [False, True] if load_numpy() is not None else [False]
+
+
+@pytest.fixture(params=numpy_modes(), ids=lambda use_numpy: 'numpy' if use_numpy else 'python')
+def table(request):
+    table = FleetTable(use_numpy=request.param)
+    table.upsert(make_device("a", battery_level=90, rssi=-50, online=True, timestamp="2025-06-19T10:00:00Z"))
+    table.upsert(make_device("b", battery_level=10, rssi=-90, online=False, timestamp="2025-06-19T11:00:00Z"))
+    table.upsert(make_device("c", battery_level=50, rssi=-70, online=True, timestamp="2025-06-19T12:00:00Z"))
+    return table
+
+
+class TestFleetTable:
+    # Aggregation and filtering over the column arrays
+
+    def test_aggregate_all(self, table):
+        result = table.aggregate()
+
+        assert result['count'] == 3
+        assert result['online_count'] == 2
+        assert result['battery_level'] == {'avg': 50.0, 'min': 10, 'max': 90}
+        assert result['rssi'] == {'avg': -70.0, 'min': -90, 'max': -50}
+
+    def test_aggregate_online_only(self, table):
+        result = table.aggregate(online=True)
+
+        assert result['count'] == 2
+        assert result['battery_level']['avg'] == 70.0
+
+    def test_aggregate_no_match(self, table):
+        result = table.aggregate(min_battery=95)
+
+        assert result['count'] == 0
+        assert result['battery_level']['avg'] is None
+
+    def test_filter_ids(self, table):
+        assert table.filter_ids(max_battery=50) == ["b", "c"]
+        assert table.filter_ids(online=False) == ["b"]
+        assert table.filter_ids(since=timestamp_to_epoch("2025-06-19T11:30:00Z")) == ["c"]
+
+    def test_upsert_updates_slot(self, table):
+        table.upsert(make_device("b", battery_level=100, online=True))
+
+        assert len(table) == 3
+        assert table.aggregate(online=False)['count'] == 0
+        assert table.aggregate()['battery_level']['max'] == 100
+
+    def test_compact_memory(self):
+        table = FleetTable()
+        for i in range(1000):
+            table.upsert(make_device(f"sensor-{i}", online=i % 2 == 0))
+
+        # 1 + 2 + 8 bytes of columns plus one online bit per device
+        assert table.nbytes() <= 12 * 1000
+        assert table.aggregate()['online_count'] == 500
+
+
+class TestAggregateEndpoint:
+    # GET /status/aggregate
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        store = MemoryStatusStore()
+        store.upsert(make_device("a", battery_level=90, online=True))
+        store.upsert(make_device("b", battery_level=10, online=False))
+        monkeypatch.setattr(app_module, 'store', store)
+        monkeypatch.setattr(app_module, 'fleet_table', None)
+        return app_module.app.test_client()
+
+    def test_aggregate_with_filter(self, client):
+        response = client.get('/status/aggregate?online=true', headers={'X-API-Key': 'dev-key-123'})
+
+        assert response.status_code == 200
+        assert response.get_json()['count'] == 1
+        assert response.get_json()['battery_level']['avg'] == 90.0
+
+    def test_aggregate_invalid_filter(self, client):
+        response = client.get('/status/aggregate?min_battery=low', headers={'X-API-Key': 'dev-key-123'})
+
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'min_battery must be an integer'
@@ -0,0 +1,124 @@
+# Unit tests for liveness, readiness and database health probes
+
+import pytest
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from health import DEGRADED, FAILING, OK, HealthMonitor, HealthThresholds
+from startup import Warmup
+from storage import SQLiteStatusStore
+
+# Disk space and latency depend on the machine running the tests
+NO_LIMITS = HealthThresholds(max_latency_ms=0, max_wal_bytes=0, min_disk_free_bytes=0, max_write_queue=0)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'test.db')
+    store = SQLiteStatusStore(path)
+    store.initialize()
+    store.close()
+    return path
+
+
+def monitor_for(paths, write_queue=0, thresholds=NO_LIMITS, interval=5.0):
+    return HealthMonitor(lambda: paths, lambda: write_queue, thresholds, interval, timeout=0.05)
+
+
+class TestProbes:
+    # Database probe results and thresholds
+
+    def test_healthy_database(self, database):
+        result = monitor_for([database]).check()
+
+        assert result['status'] == OK
+        assert result['databases'][0]['latency_ms'] >= 0
+        assert result['databases'][0]['disk_free_bytes'] > 0
+
+    def test_missing_database_fails_without_creating_it(self, tmp_path):
+        path = str(tmp_path / 'missing.db')
+        result = monitor_for([path]).check()
+
+        assert result['status'] == FAILING
+        assert not os.path.exists(path)
+
+    def test_locked_database_fails(self, database):
+        holder = sqlite3.connect(database)
+        holder.execute('PRAGMA journal_mode=DELETE')  # WAL readers are never locked out
+        holder.execute('BEGIN EXCLUSIVE')
+        try:
+            result = monitor_for([database]).check()
+        finally:
+            holder.rollback()
+            holder.close()
+
+        assert result['status'] == FAILING
+        assert 'locked' in result['reasons'][0]
+
+    def test_thresholds_degrade(self, database):
+        conn = sqlite3.connect(database)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Any committed write leaves frames in the WAL
+        conn.execute("INSERT INTO device_status (device_id, timestamp, battery_level, rssi, online, created_at) "
+                     "VALUES ('d1', '2025-06-19T14:00:00Z', 80, -60, 1, '2025-06-19T14:00:01')")
+        conn.commit()
+        thresholds = HealthThresholds(max_latency_ms=0, max_wal_bytes=1, min_disk_free_bytes=0, max_write_queue=5)
+
+        result = monitor_for([database], write_queue=6, thresholds=thresholds).check()
+        conn.close()
+
+        assert result['status'] == DEGRADED
+        assert len(result['reasons']) == 2
+
+    def test_probes_are_cached(self, database):
+        calls = []
+        monitor = HealthMonitor(lambda: calls.append(1) or [database], lambda: 0, NO_LIMITS, interval=60)
+
+        monitor.check()
+        monitor.check()
+        assert len(calls) == 1
+
+        monitor.interval = 0
+        monitor.check()
+        assert len(calls) == 2
+
+
+class TestHealthEndpoints:
+    # GET /health/live and GET /health/ready
+
+    @pytest.fixture
+    def warm(self, monkeypatch):
+        warmup = Warmup()
+        warmup.run()
+        monkeypatch.setattr(app_module, 'warmup', warmup)
+        return app_module.app.test_client()
+
+    def test_live_never_probes(self, warm, monkeypatch, tmp_path):
+        monkeypatch.setattr(app_module, 'health_monitor', monitor_for([str(tmp_path / 'missing.db')]))
+
+        response = warm.get('/health/live')
+
+        assert response.status_code == 200
+        assert response.get_json() == {'status': 'alive'}
+
+    def test_ready_fails_with_database(self, warm, monkeypatch, tmp_path):
+        monkeypatch.setattr(app_module, 'health_monitor', monitor_for([str(tmp_path / 'missing.db')]))
+
+        response = warm.get('/health/ready')
+
+        assert response.status_code == 503
+        assert response.get_json()['status'] == FAILING
+
+    def test_degraded_stays_ready(self, warm, monkeypatch, database):
+        thresholds = HealthThresholds(max_latency_ms=0, max_wal_bytes=0, min_disk_free_bytes=0, max_write_queue=1)
+        monkeypatch.setattr(app_module, 'health_monitor', monitor_for([database], 2, thresholds))
+
+        response = warm.get('/health/ready')
+
+        assert response.status_code == 200
+        assert response.get_json()['status'] == DEGRADED
+        assert 'write_queue_depth 2' in warm.get('/metrics').get_data(as_text=True)
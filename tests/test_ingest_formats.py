@@ -0,0 +1,136 @@
+# Unit tests for the binary ingest formats and batch endpoint
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from ingest_formats import (
+    CBOR, MSGPACK, STRUCT, FRAME_HEADER, FRAME_RECORD, PayloadError, cbor2, msgpack,
+    decode_payload, decode_struct_frame, encode_struct_frame, epoch_ms_to_iso, iso_to_epoch_ms
+)
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+def binary_encoders():
+    # (mimetype, encode) for each installed binary format
+    encoders = []
+    if msgpack is not None:
+        encoders.append((MSGPACK, msgpack.packb))
+    if cbor2 is not None:
+        encoders.append((CBOR, cbor2.dumps))
+    return encoders
+
+
+class TestStructFrame:
+    # Fixed-width batch frames
+
+    def test_round_trip(self):
+        readings = [make_device("sensor-1"), make_device("sensor-2", battery_level=0, online=False)]
+
+        assert decode_struct_frame(encode_struct_frame(readings)) == readings
+
+    def test_record_size(self):
+        body = encode_struct_frame([make_device("sensor-1")] * 10)
+
+        assert len(body) == FRAME_HEADER.size + 10 * FRAME_RECORD.size
+        assert FRAME_RECORD.size == 44
+
+    def test_truncated_frame_rejected(self):
+        body = encode_struct_frame([make_device("sensor-1")])
+
+        with pytest.raises(PayloadError):
+            decode_struct_frame(body[:-1])
+
+    def test_bad_magic_rejected(self):
+        body = encode_struct_frame([make_device("sensor-1")])
+
+        with pytest.raises(PayloadError):
+            decode_struct_frame(b'XX' + body[2:])
+
+    def test_timestamp_conversion(self):
+        assert epoch_ms_to_iso(iso_to_epoch_ms("2025-06-19T14:00:00Z")) == "2025-06-19T14:00:00Z"
+        assert epoch_ms_to_iso(iso_to_epoch_ms("2025-06-19T14:00:00.250Z")) == "2025-06-19T14:00:00.250Z"
+
+
+class TestDecodePayload:
+    # Content-Type dispatch
+
+    @pytest.mark.parametrize("mimetype,encode", binary_encoders())
+    def test_binary_formats_match_json(self, mimetype, encode):
+        data = make_device("sensor-1")
+
+        assert decode_payload(encode(data), mimetype) == data
+
+    def test_struct_only_when_allowed(self):
+        body = encode_struct_frame([make_device("sensor-1")])
+
+        with pytest.raises(PayloadError) as error:
+            decode_payload(body, STRUCT)
+        assert error.value.status == 415
+
+    def test_unknown_type_is_415(self):
+        with pytest.raises(PayloadError) as error:
+            decode_payload(b'<xml/>', 'application/xml')
+        assert error.value.status == 415
+
+    @pytest.mark.skipif(msgpack is None, reason="msgpack not installed")
+    def test_corrupt_body_is_400(self):
+        with pytest.raises(PayloadError) as error:
+            decode_payload(b'\xc1', MSGPACK)
+        assert error.value.status == 400
+
+
+class TestIngestEndpoints:
+    # POST /status and POST /status/batch with binary bodies
+
+    @pytest.mark.parametrize("mimetype,encode", binary_encoders())
+    def test_submit_status_binary(self, client, mimetype, encode):
+        response = client.post(
+            '/status', data=encode(make_device("sensor-1")), content_type=mimetype, headers=HEADERS
+        )
+
+        assert response.status_code == 200
+        assert app_module.store.get("sensor-1")['battery_level'] == 80
+
+    def test_submit_status_unsupported_type(self, client):
+        response = client.post('/status', data=b'device_id=1', content_type='text/plain', headers=HEADERS)
+
+        assert response.status_code == 415
+
+    def test_batch_struct_frame(self, client):
+        readings = [make_device(f"sensor-{i}") for i in range(50)]
+        response = client.post(
+            '/status/batch', data=encode_struct_frame(readings), content_type=STRUCT, headers=HEADERS
+        )
+
+        assert response.status_code == 200
+        assert response.get_json() == {'accepted': 50, 'rejected': []}
+        assert len(app_module.store) == 50
+
+    def test_batch_reports_rejected_readings(self, client):
+        readings = [make_device("sensor-1"), make_device("sensor-2", battery_level=150), "nope"]
+        response = client.post('/status/batch', json={'readings': readings}, headers=HEADERS)
+
+        body = response.get_json()
+        assert response.status_code == 200
+        assert body['accepted'] == 1
+        assert [item['index'] for item in body['rejected']] == [1, 2]
+        assert app_module.store.get("sensor-2") is None
+
+    def test_batch_too_large(self, client, monkeypatch):
+        monkeypatch.setattr(app_module, 'BATCH_MAX_READINGS', 2)
+        readings = [make_device(f"sensor-{i}") for i in range(3)]
+        response = client.post('/status/batch', json=readings, headers=HEADERS)
+
+        assert response.status_code == 413
+        assert len(app_module.store) == 0
+
+    def test_batch_requires_list(self, client):
+        response = client.post('/status/batch', json=make_device("sensor-1"), headers=HEADERS)
+
+        assert response.status_code == 400
@@ -0,0 +1,152 @@
+# Unit tests for the write-ahead ingest log
+
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from ingest_log import IngestLog
+from registry import DeviceRegistry
+from storage import SQLiteStatusStore
+from tests.conftest import make_device
+
+
+class TestIngestLog:
+    # Append, replay and checkpoint
+
+    def test_append_and_replay(self, tmp_path):
+        log = IngestLog(str(tmp_path / 'ingest.log'))
+        log.append(make_device("sensor-1"), "2025-06-19T14:00:01")
+        log.append(make_device("sensor-2"), "2025-06-19T14:00:02")
+        log.close()
+
+        rows = list(IngestLog(str(tmp_path / 'ingest.log')).replay())
+        assert [row['device_id'] for row in rows] == ["sensor-1", "sensor-2"]
+        assert rows[1]['created_at'] == "2025-06-19T14:00:02"
+
+    def test_torn_tail_is_ignored(self, tmp_path):
+        path = str(tmp_path / 'ingest.log')
+        log = IngestLog(path, fsync_mode='off')
+        log.append(make_device("sensor-1"), "2025-06-19T14:00:01")
+        log.close()
+        with open(path, 'ab') as f:
+            f.write(b'\x40\x00\x00\x00garbage')  # Partial record from a crash
+
+        rows = list(IngestLog(path).replay())
+        assert [row['device_id'] for row in rows] == ["sensor-1"]
+
+    def test_checkpoint_truncates(self, tmp_path):
+        log = IngestLog(str(tmp_path / 'ingest.log'))
+        log.append(make_device("sensor-1"), "2025-06-19T14:00:01")
+        log.done()
+        flushed = []
+
+        log.checkpoint(lambda: flushed.append(True))
+
+        assert flushed == [True]
+        assert log.size() == 0
+        assert list(log.replay()) == []
+
+    def test_concurrent_appends_group_commit(self, tmp_path):
+        log = IngestLog(str(tmp_path / 'ingest.log'), fsync_delay=0.001)
+
+        def writer(worker):
+            for i in range(50):
+                log.append(make_device(f"sensor-{worker}-{i}"), "2025-06-19T14:00:00")
+                log.done()
+
+        threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(list(log.replay())) == 200
+
+    def test_append_many_one_fsync(self, tmp_path, monkeypatch):
+        log = IngestLog(str(tmp_path / 'ingest.log'))
+        fsyncs = []
+        fsync = os.fsync
+        monkeypatch.setattr(os, 'fsync', lambda fd: (fsyncs.append(fd), fsync(fd)))
+
+        log.append_many([make_device(f"sensor-{i}") for i in range(10)], "2025-06-19T14:00:01")
+
+        assert len(fsyncs) == 1
+        assert log.pending() == 10
+        assert len(list(log.replay())) == 10
+
+    def test_invalid_fsync_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            IngestLog(str(tmp_path / 'ingest.log'), fsync_mode='sometimes')
+
+
+class TestReplayOnStartup:
+    # init_db replays the log into storage and truncates it
+
+    def test_init_db_replays_log(self, tmp_path, configure_app):
+        log_path = str(tmp_path / 'ingest.log')
+        crashed = IngestLog(log_path)
+        crashed.append(make_device("sensor-1", battery_level=12), "2025-06-19T14:00:01")
+        crashed.close()  # Acknowledged but never written to storage
+
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        log = IngestLog(log_path)
+        configure_app(store=store, ingest_log=log, registry=DeviceRegistry(str(tmp_path / 'test.db')))
+
+        app_module.init_db()
+
+        assert store.get("sensor-1")['battery_level'] == 12
+        assert log.size() == 0
+
+    def test_submit_status_logs_before_storing(self, tmp_path, configure_app):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        log = IngestLog(str(tmp_path / 'ingest.log'))
+        client = configure_app(store=store, ingest_log=log)
+
+        response = client.post('/status', json=make_device("sensor-1"), headers={'X-API-Key': 'dev-key-123'})
+
+        assert response.status_code == 200
+        assert [row['device_id'] for row in log.replay()] == ["sensor-1"]
+        assert store.get("sensor-1") is not None
+
+    def test_checkpoint_during_batch_ingest(self, tmp_path, configure_app, monkeypatch):
+        # A checkpoint that starts while a batch is being logged waits for the
+        # batch to be stored, then truncates the log; neither side hangs
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        log = IngestLog(str(tmp_path / 'ingest.log'))
+        client = configure_app(store=store, ingest_log=log)
+        syncing = threading.Event()
+        release = threading.Event()
+        fsync = os.fsync
+
+        def slow_first_fsync(fd):
+            if not syncing.is_set():
+                syncing.set()
+                release.wait(5)
+            fsync(fd)
+
+        monkeypatch.setattr(os, 'fsync', slow_first_fsync)
+        responses = []
+        readings = [make_device(f"sensor-{i}") for i in range(20)]
+        batch = threading.Thread(target=lambda: responses.append(
+            client.post('/status/batch', json=readings, headers={'X-API-Key': 'dev-key-123'})), daemon=True)
+        batch.start()
+        assert syncing.wait(5)
+        checkpoint = threading.Thread(target=log.checkpoint, args=(store.flush,), daemon=True)
+        checkpoint.start()
+        while not log._checkpointing:
+            time.sleep(0.001)
+        release.set()
+        batch.join(5)
+        checkpoint.join(5)
+
+        assert not batch.is_alive() and not checkpoint.is_alive()
+        assert responses[0].get_json()['accepted'] == 20
+        assert log.pending() == 0 and log.size() == 0
+        assert store.count() == 20
@@ -0,0 +1,104 @@
+# Unit tests for the JSON provider and summary fragment cache
+
+import pytest
+import sys
+import os
+import json
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from app import format_summary_device
+from json_provider import SummaryFragmentCache, orjson, orjson_compact, stdlib_compact
+from storage import MemoryStatusStore
+from tests.conftest import make_device
+
+
+def encoders():
+    return [stdlib_compact, orjson_compact] if orjson is not None else [stdlib_compact]
+
+
+@pytest.fixture(params=encoders(), ids=lambda encoder: encoder.__name__)
+def cache_and_store(request):
+    store = MemoryStatusStore()
+    cache = SummaryFragmentCache(format_summary_device, encoder=request.param)
+    store.add_listener(cache.invalidate)
+    return cache, store
+
+
+def summary_ids(body):
+    return [device['device_id'] for device in json.loads(body)['devices']]
+
+
+class TestSummaryFragmentCache:
+    # Byte-joined summaries must match a full re-encode
+
+    def test_matches_jsonify_output(self, cache_and_store):
+        cache, store = cache_and_store
+        store.batch_upsert([make_device("b", 20), make_device("a", 10, online=False)])
+
+        with app_module.app.app_context():
+            expected = app_module.app.json.response(
+                {'devices': [format_summary_device(row) for row in store.iterate_summary()]}
+            ).get_data()
+        assert cache.render(store) == expected
+
+    def test_upsert_invalidates_fragment(self, cache_and_store):
+        cache, store = cache_and_store
+        store.upsert(make_device("a", 10))
+        cache.render(store)
+
+        store.upsert(make_device("a", 99))
+
+        assert json.loads(cache.render(store))['devices'][0]['battery_level'] == 99
+
+    def test_new_device_inserted_in_order(self, cache_and_store):
+        cache, store = cache_and_store
+        store.batch_upsert([make_device("a"), make_device("c")])
+        cache.render(store)
+
+        store.upsert(make_device("b"))
+
+        assert summary_ids(cache.render(store)) == ["a", "b", "c"]
+
+    def test_many_invalidations_trigger_rebuild(self, cache_and_store):
+        cache, store = cache_and_store
+        store.batch_upsert([make_device(f"d-{i:04d}") for i in range(300)])
+        cache.render(store)
+
+        store.batch_upsert([make_device(f"d-{i:04d}", battery_level=1) for i in range(300)])
+
+        body = json.loads(cache.render(store))
+        assert len(body['devices']) == 300
+        assert all(device['battery_level'] == 1 for device in body['devices'])
+
+    def test_empty_store(self, cache_and_store):
+        cache, store = cache_and_store
+
+        assert json.loads(cache.render(store)) == {'devices': []}
+
+
+class TestSummaryEndpointWithCache:
+    # GET /status/summary served from the fragment cache
+
+    def test_summary_endpoint(self, monkeypatch):
+        store = MemoryStatusStore()
+        cache = SummaryFragmentCache(format_summary_device)
+        store.add_listener(cache.invalidate)
+        monkeypatch.setattr(app_module, 'store', store)
+        monkeypatch.setattr(app_module, 'summary_cache', cache)
+        monkeypatch.setattr(app_module, 'ingest_log', None)
+        client = app_module.app.test_client()
+        headers = {'X-API-Key': 'dev-key-123'}
+
+        client.post('/status', json=make_device("sensor-1", 42), headers=headers)
+        response = client.get('/status/summary', headers=headers)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == {'devices': [{
+            'device_id': "sensor-1",
+            'battery_level': 42,
+            'online': True,
+            'last_update': "2025-06-19T14:00:00Z"
+        }]}
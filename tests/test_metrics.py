@@ -0,0 +1,85 @@
+# Unit tests for the metrics subsystem
+
+import sys
+import os
+import threading
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import metrics
+from storage import SQLiteStatusStore
+
+
+class TestMetricsRegistry:
+    # Per-thread counters and histograms
+
+    def test_counters_summed_across_threads(self):
+        registry = metrics.MetricsRegistry()
+
+        def work():
+            for _ in range(1000):
+                registry.inc('http_requests_total', ('/status', 'POST', '200'))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        totals = registry.collect()
+        assert totals['counters'][('http_requests_total', ('/status', 'POST', '200'))] == 4000
+
+    def test_histogram_buckets(self):
+        registry = metrics.MetricsRegistry(buckets=(0.01, 0.1))
+        for seconds in (0.005, 0.05, 0.05, 5.0):
+            registry.observe('http_request_duration_seconds', ('/status', 'GET'), seconds)
+
+        histogram = registry.collect()['histograms'][('http_request_duration_seconds', ('/status', 'GET'))]
+        assert histogram[:3] == [1, 2, 1]
+        assert histogram[-1] == 4
+
+    def test_render_prometheus_text(self):
+        registry = metrics.MetricsRegistry()
+        registry.observe('http_request_duration_seconds', ('/status/summary', 'GET'), 0.003)
+
+        text = metrics.render(registry.collect())
+
+        assert '# TYPE http_request_duration_seconds histogram' in text
+        assert 'http_request_duration_seconds_bucket{route="/status/summary",method="GET",le="0.005"} 1' in text
+        assert 'http_request_duration_seconds_bucket{route="/status/summary",method="GET",le="+Inf"} 1' in text
+        assert 'http_request_duration_seconds_count{route="/status/summary",method="GET"} 1' in text
+
+    def test_process_exporter_merges_files(self, tmp_path):
+        first = metrics.MetricsRegistry()
+        first.inc('sqlite_connections_total', (), 3)
+        metrics.ProcessExporter(first, str(tmp_path)).write()
+
+        second = metrics.MetricsRegistry()
+        second.inc('sqlite_connections_total', (), 2)
+        exporter = metrics.ProcessExporter(second, str(tmp_path))
+        exporter.path = str(tmp_path / 'metrics-other.json')
+
+        totals = exporter.collect_all()
+        assert totals['counters'][('sqlite_connections_total', ())] == 5
+
+
+class TestMetricsEndpoint:
+    # GET /metrics
+
+    def test_requests_and_sqlite_recorded(self, tmp_path, monkeypatch):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        monkeypatch.setattr(app_module, 'store', store)
+        monkeypatch.setattr(app_module, 'metrics_exporter', None)
+        metrics.registry.reset()
+        client = app_module.app.test_client()
+
+        client.get('/status/missing', headers={'X-API-Key': 'dev-key-123'})
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        text = response.get_data(as_text=True)
+        assert 'http_requests_total{route="/status/<device_id>",method="GET",status="404"} 1' in text
+        assert 'sqlite_rows_returned_total{operation="get"} 0' in text
+        assert 'sqlite_query_duration_seconds_count{operation="get"} 1' in text
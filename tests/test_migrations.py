@@ -0,0 +1,182 @@
+# Unit tests for schema migrations and batched backfills
+
+import sys
+import os
+import sqlite3
+import threading
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrations import LATEST_VERSION, MIGRATIONS, BackfillRunner, migrate, migration_status, run_backfills
+from storage import MemoryStatusStore, SQLiteStatusStore
+from tests.conftest import make_device
+
+# device_status as created before migrations existed
+LEGACY_SCHEMA = '''
+    CREATE TABLE device_status (
+        device_id TEXT PRIMARY KEY,
+        timestamp TEXT NOT NULL,
+        battery_level INTEGER NOT NULL,
+        rssi INTEGER NOT NULL,
+        online BOOLEAN NOT NULL,
+        created_at TEXT NOT NULL
+    )
+'''
+
+
+def legacy_database(path, rows=10):
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany(
+        'INSERT INTO device_status VALUES (?, ?, ?, ?, ?, ?)',
+        [(f"sensor-{i:03d}", "2025-06-19T14:00:00Z", 80, -60, 1, "2025-06-19T14:00:01") for i in range(rows)]
+    )
+    conn.commit()
+    return conn
+
+
+def epochs(conn):
+    return [row[0] for row in conn.execute('SELECT timestamp_epoch FROM device_status ORDER BY device_id')]
+
+
+class TestMigrate:
+    # Versioned DDL
+
+    def test_fresh_database(self, tmp_path):
+        conn = sqlite3.connect(str(tmp_path / 'fresh.db'))
+
+        assert migrate(conn) == list(range(1, LATEST_VERSION + 1))
+        assert migrate(conn) == []
+        # Nothing to backfill on an empty table
+        assert all(entry['backfill_done'] for entry in migration_status(conn))
+
+    def test_legacy_database_needs_backfill(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+
+        assert migrate(conn) == [1, 2, 3]
+        assert epochs(conn) == [None] * 10
+        assert migration_status(conn)[1]['backfill_done'] == False
+        assert migration_status(conn)[2]['backfill_done'] == False
+
+    def test_backfill_in_batches(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+        migrate(conn)
+        progress = []
+
+        updated = run_backfills(conn, batch_size=3, on_progress=lambda migration, rows: progress.append(rows))
+
+        # timestamp_epoch, then the device_search index
+        assert updated == 20
+        assert progress == [3, 6, 9, 10, 3, 6, 9, 10]
+        assert epochs(conn) == [1750341600] * 10
+        assert conn.execute("SELECT count(*) FROM device_search WHERE device_search MATCH '\"sor-00\"'").fetchone()[0] == 10
+        assert migration_status(conn)[1] == {
+            'version': 2, 'name': 'add device_status.timestamp_epoch',
+            'applied_at': migration_status(conn)[1]['applied_at'], 'backfill_rows': 10, 'backfill_done': True
+        }
+
+    def test_backfill_resumes(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+        migrate(conn)
+        stop = threading.Event()
+
+        # Interrupted after the first batch
+        run_backfills(conn, batch_size=4, on_progress=lambda migration, rows: stop.set(), stop=stop)
+        assert epochs(conn).count(None) == 6
+
+        assert run_backfills(conn, batch_size=4) == 6 + 10
+        assert None not in epochs(conn)
+        assert migration_status(conn)[1]['backfill_rows'] == 10
+
+    def test_backfill_includes_the_empty_key(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+        migrate(conn)
+        conn.execute('INSERT INTO device_status VALUES (?, ?, ?, ?, ?, ?, NULL)',
+                     ('', "2025-06-19T14:00:00Z", 80, -60, 1, "2025-06-19T14:00:01"))
+        conn.commit()
+
+        assert run_backfills(conn, batch_size=4) == 11 + 11
+        assert epochs(conn) == [1750341600] * 11
+        assert conn.execute("SELECT count(*) FROM device_search WHERE device_id = ''").fetchone()[0] == 1
+
+    def test_search_index_backfill_with_new_devices(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+        migrate(conn)
+        run_backfills(conn, migrations=MIGRATIONS[:2])
+        stop = threading.Event()
+        run_backfills(conn, batch_size=4, on_progress=lambda migration, rows: stop.set(), stop=stop)
+
+        # Behind the backfill cursor the trigger indexes a new device, past it the backfill does
+        conn.executemany(
+            'INSERT INTO device_status VALUES (?, ?, ?, ?, ?, ?, NULL)',
+            [(device_id, "2025-06-19T14:00:00Z", 80, -60, 1, "2025-06-19T14:00:01")
+             for device_id in ["sensor-001a", "sensor-009a"]]
+        )
+        conn.commit()
+        run_backfills(conn, batch_size=4)
+
+        indexed = [row[0] for row in conn.execute('SELECT device_id FROM device_search ORDER BY device_id')]
+        assert indexed == sorted([f"sensor-{i:03d}" for i in range(10)] + ["sensor-001a", "sensor-009a"])
+
+    def test_each_index_is_built_in_its_own_transaction(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+        migrate(conn, MIGRATIONS[:2])
+        statements = []
+        conn.set_trace_callback(statements.append)
+
+        assert migrate(conn) == [3]
+        transactions = [statement for statement in statements if statement == 'BEGIN IMMEDIATE']
+        assert len(transactions) == 4
+
+    def test_interrupted_steps_are_repeated(self, tmp_path):
+        conn = legacy_database(str(tmp_path / 'legacy.db'))
+        migrate(conn, MIGRATIONS[:2])
+        # A crash after the first index, before version 3 was recorded
+        conn.execute(MIGRATIONS[2].steps[0][0])
+        conn.commit()
+
+        assert migrate(conn) == [3]
+        assert run_backfills(conn, migrations=MIGRATIONS[2:]) == 10
+
+    def test_runner_thread(self, tmp_path):
+        path = str(tmp_path / 'legacy.db')
+        legacy_database(path, rows=50).close()
+        conn = sqlite3.connect(path)
+        migrate(conn)
+
+        runner = BackfillRunner([path], batch_size=7, pause=0)
+        runner.start()
+        runner._thread.join(5)
+
+        assert runner.error is None and not runner.running
+        assert runner.rows == 2 * 50
+        assert None not in epochs(conn)
+
+
+class TestStoresMigrate:
+    # Stores run migrations on initialize and write the new column
+
+    def test_sqlite_store_on_legacy_database(self, tmp_path):
+        path = str(tmp_path / 'legacy.db')
+        legacy_database(path).close()
+        store = SQLiteStatusStore(path)
+        store.initialize()
+
+        store.upsert(make_device("sensor-new", timestamp="2025-06-19T16:00:00+02:00"))
+
+        conn = sqlite3.connect(path)
+        epoch = conn.execute("SELECT timestamp_epoch FROM device_status WHERE device_id = 'sensor-new'").fetchone()[0]
+        assert epoch == 1750341600
+        assert store.get("sensor-000")['battery_level'] == 80
+
+    def test_memory_checkpoint_is_migrated(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.db')
+        legacy_database(path).close()
+        store = MemoryStatusStore(checkpoint_path=path, checkpoint_interval=0)
+        store.initialize()
+        store.upsert(make_device("sensor-new"))
+
+        assert store.checkpoint()
+        conn = sqlite3.connect(path)
+        assert epochs(conn) == [1750341600] * 11
+        assert all(entry['backfill_done'] for entry in migration_status(conn))
@@ -0,0 +1,80 @@
+# Unit tests for request profiling
+
+import pytest
+import sys
+import os
+import json
+import logging
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from profiling import PhaseTimer, RequestProfiler
+from storage import SQLiteStatusStore
+
+
+class TestPhaseTimer:
+    # Exclusive phase accounting
+
+    def test_nested_time_subtracted_from_parent(self):
+        timer = PhaseTimer()
+        timer.enter()
+        timer.record('db_fetch', 0.3)
+        timer.exit('format', 1.0)
+
+        assert timer.phases['db_fetch'] == 0.3
+        assert timer.phases['format'] == pytest.approx(0.7)
+
+    def test_repeated_phases_accumulate(self):
+        timer = PhaseTimer()
+        timer.record('db_fetch', 0.1)
+        timer.record('db_fetch', 0.2)
+
+        assert timer.phases['db_fetch'] == pytest.approx(0.3)
+
+
+class TestRequestProfiler:
+    # Slow-request log and sampling profiler on real requests
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        monkeypatch.setattr(app_module, 'store', store)
+        monkeypatch.setattr(app_module, 'ingest_log', None)
+        return app_module.app.test_client()
+
+    def test_disabled_by_default(self):
+        assert RequestProfiler().enabled == False
+
+    def test_slow_request_logged_with_phases(self, client, monkeypatch, caplog):
+        monkeypatch.setattr(app_module, 'profiler', RequestProfiler(slow_request_ms=0))
+
+        with caplog.at_level(logging.WARNING, logger='slow_requests'):
+            response = client.get('/status/summary', headers={'X-API-Key': 'dev-key-123'})
+
+        assert 'format;dur=' in response.headers['Server-Timing']
+        entry = json.loads(caplog.records[-1].getMessage())
+        assert entry['event'] == 'slow_request'
+        assert entry['route'] == '/status/summary'
+        assert set(entry['phases_ms']) >= {'auth', 'db_execute', 'db_fetch', 'format', 'serialize'}
+
+    def test_fast_request_not_logged(self, client, monkeypatch, caplog):
+        monkeypatch.setattr(app_module, 'profiler', RequestProfiler(slow_request_ms=60000))
+
+        with caplog.at_level(logging.WARNING, logger='slow_requests'):
+            client.get('/status/summary', headers={'X-API-Key': 'dev-key-123'})
+
+        assert caplog.records == []
+
+    def test_header_triggers_folded_profile(self, client, tmp_path, monkeypatch):
+        profile_dir = tmp_path / 'profiles'
+        monkeypatch.setattr(app_module, 'profiler', RequestProfiler(
+            allow_header=True, profile_dir=str(profile_dir), sample_interval=0.0001
+        ))
+
+        client.get('/status/summary', headers={'X-API-Key': 'dev-key-123', 'X-Profile': '1'})
+
+        files = os.listdir(profile_dir)
+        assert len(files) == 1
+        assert files[0].endswith('-GET-status_summary.folded')
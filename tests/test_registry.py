@@ -0,0 +1,191 @@
+# Unit tests for the device registry and group aggregates
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from registry import DeviceRegistry, GroupAggregates, validate_registration
+from storage import MemoryStatusStore
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = DeviceRegistry(str(tmp_path / 'registry.db'))
+    registry.initialize()
+    return registry
+
+
+class TestDeviceRegistry:
+    # Registry tables and index lookups
+
+    def test_register_and_get(self, registry):
+        registry.register("sensor-1", "Kitchen", tags=["temp"], groups=["site-42", "building-a"], metadata={"floor": 2})
+
+        entry = registry.get("sensor-1")
+        assert entry['name'] == "Kitchen"
+        assert entry['tags'] == ["temp"]
+        assert entry['groups'] == ["building-a", "site-42"]
+        assert entry['metadata'] == {"floor": 2}
+
+    def test_register_replaces_groups(self, registry):
+        registry.register("sensor-1", groups=["site-1"])
+        registry.register("sensor-1", groups=["site-2"])
+
+        assert registry.group_members("site-1") == []
+        assert registry.group_members("site-2") == ["sensor-1"]
+
+    def test_group_members_sorted(self, registry):
+        for device_id in ["c", "a", "b"]:
+            registry.register(device_id, groups=["site-42"], tags=["t"])
+
+        assert registry.group_members("site-42") == ["a", "b", "c"]
+        assert registry.tagged("t") == ["a", "b", "c"]
+
+    def test_group_lookup_uses_index(self, registry):
+        conn = registry.connect()
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT device_id FROM device_groups WHERE group_id = ? ORDER BY device_id', ("x",)))
+        conn.close()
+
+        assert 'SEARCH' in plan and 'SCAN' not in plan
+
+    def test_unknown_device(self, registry):
+        assert registry.get("missing") is None
+
+    def test_validate_registration(self):
+        assert validate_registration({"groups": ["a"], "tags": []}) == (True, None)
+        assert validate_registration({"groups": "a"})[0] == False
+        assert validate_registration({"metadata": []})[0] == False
+        assert validate_registration(None)[0] == False
+
+
+class TestGroupAggregates:
+    # Incremental online count and min battery
+
+    def test_updates_on_ingest(self):
+        store = MemoryStatusStore()
+        aggregates = GroupAggregates()
+        store.add_listener(aggregates.update)
+        aggregates.set_groups("a", ["site"])
+        aggregates.set_groups("b", ["site"])
+
+        store.upsert(make_device("a", battery_level=40, online=True))
+        store.upsert(make_device("b", battery_level=20, online=False))
+        assert aggregates.get("site") == {
+            'group': "site", 'device_count': 2, 'reporting_count': 2, 'online_count': 1, 'min_battery': 20
+        }
+
+        # Battery rising on the lowest device moves the minimum up
+        store.upsert(make_device("b", battery_level=90, online=True))
+        assert aggregates.get("site")['min_battery'] == 40
+        assert aggregates.get("site")['online_count'] == 2
+
+    def test_ungrouped_devices_ignored(self):
+        aggregates = GroupAggregates()
+        aggregates.update(make_device("loner"))
+
+        assert aggregates.get("site") is None
+
+    def test_regrouping_moves_contribution(self):
+        aggregates = GroupAggregates()
+        aggregates.set_groups("a", ["site-1"], make_device("a", battery_level=5))
+        aggregates.set_groups("a", ["site-2"])
+
+        assert aggregates.get("site-1") is None
+        assert aggregates.get("site-2")['min_battery'] == 5
+
+    def test_load_matches_incremental(self, registry):
+        store = MemoryStatusStore()
+        for i in range(10):
+            store.upsert(make_device(f"d{i}", battery_level=10 + i, online=i % 2 == 0))
+            registry.register(f"d{i}", groups=["even" if i % 2 == 0 else "odd", "all"])
+
+        aggregates = GroupAggregates()
+        aggregates.load(registry.memberships(), store)
+
+        assert aggregates.get("all") == {
+            'group': "all", 'device_count': 10, 'reporting_count': 10, 'online_count': 5, 'min_battery': 10
+        }
+        assert aggregates.get("odd")['min_battery'] == 11
+
+
+class TestRegistryEndpoints:
+    # PUT/GET /devices, GET /groups and GET /status/summary?group=
+
+    @pytest.fixture
+    def client(self, registry, monkeypatch):
+        store = MemoryStatusStore()
+        aggregates = GroupAggregates()
+        store.add_listener(aggregates.update)
+        monkeypatch.setattr(app_module, 'store', store)
+        monkeypatch.setattr(app_module, 'registry', registry)
+        monkeypatch.setattr(app_module, 'group_aggregates', aggregates)
+        monkeypatch.setattr(app_module, 'ingest_log', None)
+        monkeypatch.setattr(app_module, 'fleet_table', None)
+        monkeypatch.setattr(app_module, 'summary_cache', None)
+        return app_module.app.test_client()
+
+    def test_group_summary_and_aggregate(self, client):
+        client.put('/devices/a', json={'groups': ['site-42'], 'tags': ['temp']}, headers=HEADERS)
+        client.put('/devices/b', json={'groups': ['site-42']}, headers=HEADERS)
+        client.put('/devices/c', json={'groups': ['site-7']}, headers=HEADERS)
+        for device_id, battery_level in [("a", 50), ("b", 15), ("c", 1)]:
+            client.post('/status', json=make_device(device_id, battery_level), headers=HEADERS)
+
+        response = client.get('/status/summary?group=site-42', headers=HEADERS)
+        assert [device['device_id'] for device in response.get_json()['devices']] == ["a", "b"]
+
+        response = client.get('/status/summary?group=site-42&tag=temp', headers=HEADERS)
+        assert [device['device_id'] for device in response.get_json()['devices']] == ["a"]
+
+        response = client.get('/groups/site-42', headers=HEADERS)
+        assert response.get_json()['min_battery'] == 15
+        assert response.get_json()['online_count'] == 2
+
+    def test_register_existing_device_counts_reading(self, client):
+        client.post('/status', json=make_device("a", battery_level=7, online=False), headers=HEADERS)
+        client.put('/devices/a', json={'groups': ['site-1']}, headers=HEADERS)
+
+        response = client.get('/groups/site-1', headers=HEADERS)
+        assert response.get_json()['min_battery'] == 7
+        assert response.get_json()['online_count'] == 0
+
+    def test_get_registration(self, client):
+        response = client.put('/devices/a', json={'name': 'Kitchen', 'metadata': {'floor': 1}}, headers=HEADERS)
+        assert response.status_code == 200
+
+        response = client.get('/devices/a', headers=HEADERS)
+        assert response.get_json()['name'] == 'Kitchen'
+        assert client.get('/devices/missing', headers=HEADERS).status_code == 404
+
+    def test_invalid_registration(self, client):
+        response = client.put('/devices/a', json={'groups': 'site-1'}, headers=HEADERS)
+
+        assert response.status_code == 400
+
+    def test_unknown_group(self, client):
+        assert client.get('/groups/nope', headers=HEADERS).status_code == 404
+        assert client.get('/status/summary?group=nope', headers=HEADERS).get_json() == {'devices': []}
+
+    def test_memory_checkpoint_keeps_registry(self, registry, configure_app):
+        # The memory backend checkpoints into the registry's file by default
+        store = MemoryStatusStore(checkpoint_path=registry.path, checkpoint_interval=None)
+        store.initialize()
+        client = configure_app(store=store, registry=registry, group_aggregates=GroupAggregates())
+        client.put('/devices/a', json={'name': 'Kitchen', 'groups': ['site-1']}, headers=HEADERS)
+        client.post('/status', json=make_device("a"), headers=HEADERS)
+
+        assert store.checkpoint()
+
+        response = client.get('/devices/a', headers=HEADERS)
+        assert response.status_code == 200
+        assert response.get_json()['name'] == 'Kitchen'
+        restored = MemoryStatusStore(checkpoint_path=registry.path, checkpoint_interval=None)
+        restored.initialize()
+        assert restored.get("a")['battery_level'] == 80
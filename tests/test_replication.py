@@ -0,0 +1,240 @@
+# Unit tests for leader/follower replication
+
+import pytest
+import json
+import socket
+import subprocess
+import sys
+import os
+import threading
+import time
+
+import requests
+
+# Add parent directory to path so we can import from app.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import app as app_module
+from replication import ChangeLog, Follower
+from storage import MemoryStatusStore, SQLiteStatusStore
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+
+
+class TestChangeLog:
+    # Versions, trimming and long polls
+
+    def test_changes_since(self):
+        log = ChangeLog()
+        for index in range(3):
+            log.append(make_device(f"d{index}"))
+
+        changes = log.changes_since(1)
+        assert [change['version'] for change in changes] == [2, 3]
+        assert changes[0]['row']['device_id'] == "d1"
+        assert log.changes_since(3) == []
+
+    def test_trimmed_changes_are_gone(self):
+        log = ChangeLog(size=2)
+        for index in range(4):
+            log.append(make_device(f"d{index}"))
+
+        assert log.changes_since(0) is None
+        assert [change['version'] for change in log.changes_since(2)] == [3, 4]
+
+    def test_wait_for_new_change(self):
+        log = ChangeLog()
+        threading.Timer(0.05, log.append, [make_device("late")]).start()
+
+        changes = log.changes_since(0, wait=5)
+
+        assert [change['row']['device_id'] for change in changes] == ["late"]
+
+
+class TestChangeOrder:
+    # Change log versions follow the store's commit order
+
+    @pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+    def test_concurrent_upserts_logged_in_commit_order(self, backend, tmp_path):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db')) if backend == 'sqlite' else MemoryStatusStore()
+        store.initialize()
+        log = ChangeLog()
+        first_committed = threading.Event()
+
+        def slow_first_listener(data):
+            # The first writer is delayed after its commit, before its log entry
+            if data['battery_level'] == 1:
+                first_committed.set()
+                time.sleep(0.1)
+            log.append(data)
+
+        store.add_listener(slow_first_listener)
+        first = threading.Thread(target=store.upsert, args=(make_device("d1", battery_level=1),))
+        first.start()
+        assert first_committed.wait(5)
+        store.upsert(make_device("d1", battery_level=2))
+        first.join()
+
+        changes = log.changes_since(0)
+        assert [change['row']['battery_level'] for change in changes] == [1, 2]
+        assert store.get("d1")['battery_level'] == changes[-1]['row']['battery_level']
+
+
+class LeaderResponse:
+    # The parts of requests.Response the follower uses
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.body = response.get_data()
+
+    def json(self):
+        return json.loads(self.body)
+
+    def iter_lines(self):
+        return iter(self.body.splitlines())
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+
+class LeaderSession:
+    # requests.Session stand-in that sends follower requests to the app's test client
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        path = url.split('http://leader', 1)[1]
+        return LeaderResponse(self.client.get(path, headers=headers, query_string=params))
+
+
+class TestFollower:
+    # Follower against an in-process leader
+
+    @pytest.fixture
+    def leader(self, monkeypatch):
+        store = MemoryStatusStore()
+        log = ChangeLog(size=2)
+        store.add_listener(log.append)
+        monkeypatch.setattr(app_module, 'store', store)
+        monkeypatch.setattr(app_module, 'change_log', log)
+        monkeypatch.setattr(app_module, 'ingest_log', None)
+        monkeypatch.setattr(app_module, 'fleet_table', None)
+        monkeypatch.setattr(app_module, 'summary_cache', None)
+        return app_module.app.test_client()
+
+    @pytest.fixture
+    def follower(self, leader):
+        replica = Follower(MemoryStatusStore(), 'http://leader', 'dev-key-123')
+        replica.session = LeaderSession(leader)
+        return replica
+
+    def test_snapshot_then_changes(self, leader, follower):
+        leader.post('/status', json=make_device("d1", battery_level=10), headers=HEADERS)
+        follower.poll()
+        leader.post('/status', json=make_device("d1", battery_level=20), headers=HEADERS)
+        leader.post('/status', json=make_device("d2"), headers=HEADERS)
+
+        assert follower.poll() == 2
+        assert follower.store.get("d1")['battery_level'] == 20
+        assert follower.status()['lag_versions'] == 0
+        assert follower.snapshots == 1
+
+    def test_resync_when_behind_the_log(self, leader, follower):
+        follower.poll()
+        for index in range(5):
+            leader.post('/status', json=make_device(f"d{index}"), headers=HEADERS)
+
+        follower.poll()  # 410 - the log only holds the last changes
+        follower.poll()
+
+        assert follower.snapshots == 2
+        assert follower.store.count() == 5
+
+    def test_resync_after_leader_restart(self, leader, follower, monkeypatch):
+        follower.poll()
+        restarted = ChangeLog()
+        app_module.store.add_listener(restarted.append)
+        monkeypatch.setattr(app_module, 'change_log', restarted)
+
+        follower.poll()
+        follower.poll()
+
+        assert follower.snapshots == 2
+        assert follower.epoch == restarted.epoch
+
+    def test_follower_rejects_writes(self, leader, follower, monkeypatch):
+        monkeypatch.setattr(app_module, 'follower', follower)
+
+        response = leader.post('/status', json=make_device("d1"), headers=HEADERS)
+
+        assert response.status_code == 403
+        assert leader.get('/replication/status', headers=HEADERS).get_json()['role'] == 'follower'
+
+
+def test_app_import_leaves_requests_unloaded():
+    # Only followers need requests; importing it costs every process start
+    script = "import sys, app; sys.exit('requests' in sys.modules)"
+
+    assert subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, timeout=60).returncode == 0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_node(port, tmp_path, **env):
+    # Start app.py with extra environment and wait until it is ready
+    node_env = dict(
+        os.environ, PORT=str(port), FLASK_DEBUG='0', DATABASE_PATH=str(tmp_path / f'node-{port}.db'),
+        MIGRATION_BACKFILL='0', **env
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_DIR, 'app.py')],
+        cwd=REPO_DIR, env=node_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health/live', timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError('node did not start')
+
+
+def test_leader_and_follower_processes(tmp_path):
+    # Two local processes: writes to the leader show up on the follower
+    leader_port, follower_port = free_port(), free_port()
+    leader = start_node(leader_port, tmp_path, REPLICATION_ROLE='leader')
+    follower = start_node(
+        follower_port, tmp_path, REPLICATION_ROLE='follower', STORAGE_BACKEND='memory',
+        MEMORY_CHECKPOINT_PATH='', REPLICATION_LEADER_URL=f'http://127.0.0.1:{leader_port}',
+        REPLICATION_POLL_WAIT='1'
+    )
+    try:
+        leader_url, follower_url = f'http://127.0.0.1:{leader_port}', f'http://127.0.0.1:{follower_port}'
+        requests.post(f'{leader_url}/status', json=make_device("replicated", 42), headers=HEADERS)
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            response = requests.get(f'{follower_url}/status/replicated', headers=HEADERS)
+            if response.status_code == 200:
+                break
+            time.sleep(0.05)
+        assert response.json()['battery_level'] == 42
+
+        status = requests.get(f'{follower_url}/replication/status', headers=HEADERS).json()
+        assert status['lag_versions'] == 0
+        response = requests.post(f'{follower_url}/status', json=make_device("x"), headers=HEADERS)
+        assert response.status_code == 403
+    finally:
+        follower.terminate()
+        leader.terminate()
+        follower.wait()
+        leader.wait()
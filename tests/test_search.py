@@ -0,0 +1,174 @@
+# Unit tests for device search with keyset pagination
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import storage
+from storage import PREFIX, SUBSTRING, MemoryStatusStore, SQLiteStatusStore
+from tests.conftest import make_device
+
+HEADERS = {'X-API-Key': 'dev-key-123'}
+ROOMS = ['kitchen', 'Bedroom', 'garage']
+
+
+def fleet():
+    # 30 devices: home-00-kitchen, home-00-Bedroom, ... with repeating battery levels
+    return [
+        make_device(f"home-{index // 3:02d}-{ROOMS[index % 3]}", battery_level=index % 7, rssi=-index,
+                    timestamp=f"2025-06-19T14:{index:02d}:00Z")
+        for index in range(30)
+    ]
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+    else:
+        store = MemoryStatusStore()
+    store.initialize()
+    store.batch_upsert(fleet())
+    return store
+
+
+def all_pages(store, limit=4, **options):
+    # Follow keyset pages to the end - returns device ids in order
+    device_ids = []
+    after = None
+    while True:
+        rows, after = store.search(limit=limit, after=after, **options)
+        device_ids += [row['device_id'] for row in rows]
+        if after is None:
+            return device_ids
+
+
+def expected(sort, descending=False, contains=None):
+    devices = [device for device in fleet() if contains is None or contains in device['device_id'].lower()]
+    key = 'timestamp' if sort == 'last_update' else sort
+    devices.sort(key=lambda device: (device[key], device['device_id']), reverse=descending)
+    return [device['device_id'] for device in devices]
+
+
+class TestStoreSearch:
+    # StatusStore.search on both backends
+
+    def test_prefix(self, store):
+        rows, after = store.search('home-01', match=PREFIX)
+
+        assert [row['device_id'] for row in rows] == ['home-01-Bedroom', 'home-01-garage', 'home-01-kitchen']
+        assert after is None
+
+    @pytest.mark.parametrize('query, device_ids', [
+        ('\U0010ffff', ['\U0010ffff', '\U0010ffff-x']),
+        ('home-01\U0010ffff', ['home-01\U0010ffff-x']),
+    ])
+    def test_prefix_ending_in_the_last_code_point(self, store, query, device_ids):
+        store.batch_upsert([make_device('\U0010ffff'), make_device('\U0010ffff-x'), make_device('home-01\U0010ffff-x')])
+
+        rows, after = store.search(query, match=PREFIX)
+
+        assert [row['device_id'] for row in rows] == device_ids
+
+    def test_substring_ignores_case(self, store):
+        assert all_pages(store, query='BEDROOM', match=SUBSTRING) == expected('device_id', contains='bedroom')
+
+    @pytest.mark.parametrize('sort', ['device_id', 'battery_level', 'rssi', 'last_update'])
+    @pytest.mark.parametrize('descending', [False, True])
+    def test_keyset_pages(self, store, sort, descending):
+        assert all_pages(store, sort=sort, descending=descending) == expected(sort, descending)
+
+    def test_sorted_substring_pages(self, store):
+        assert all_pages(store, query='kitchen', match=SUBSTRING, sort='battery_level') == expected('battery_level', contains='kitchen')
+
+
+class TestSQLiteSearch:
+    # Index use on SQLite
+
+    @pytest.fixture
+    def sqlite_store(self, tmp_path):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'))
+        store.initialize()
+        store.batch_upsert(fleet())
+        return store
+
+    def test_dense_matches_walk_the_sort_index(self, sqlite_store, monkeypatch):
+        monkeypatch.setattr(storage, 'SEARCH_PROBE_ROWS', 2)
+
+        assert all_pages(sqlite_store, query='kitchen', match=SUBSTRING, sort='rssi') == expected('rssi', contains='kitchen')
+        assert all_pages(sqlite_store, query='home-0', sort='battery_level') == [
+            device_id for device_id in expected('battery_level') if device_id.startswith('home-0')]
+
+    def test_upserts_do_not_grow_the_search_index(self, sqlite_store):
+        for battery_level in range(3):
+            sqlite_store.upsert(make_device("home-00-kitchen", battery_level=battery_level))
+
+        conn = sqlite_store.connect()
+        indexed = conn.execute("SELECT count(*) FROM device_search").fetchone()[0]
+        sqlite_store.release(conn)
+        assert indexed == 30
+
+    def test_substring_search_survives_renumbered_rowids(self, sqlite_store):
+        # VACUUM and table rebuilds may renumber rowids without firing triggers
+        conn = sqlite_store.connect()
+        conn.execute('UPDATE device_status SET rowid = rowid + 1000')
+        conn.commit()
+        sqlite_store.release(conn)
+
+        assert all_pages(sqlite_store, query='garage', match=SUBSTRING) == expected('device_id', contains='garage')
+
+    def test_deleted_devices_leave_the_search_index(self, sqlite_store):
+        sqlite_store.upsert(make_device("ab"))
+        conn = sqlite_store.connect()
+        conn.execute("DELETE FROM device_status WHERE device_id IN ('home-00-kitchen', 'ab')")
+        conn.commit()
+        indexed = conn.execute("SELECT count(*) FROM device_search").fetchone()[0]
+        sqlite_store.release(conn)
+
+        assert indexed == 29
+        assert 'home-00-kitchen' not in all_pages(sqlite_store, query='kitchen', match=SUBSTRING)
+
+
+class TestSearchEndpoint:
+    # GET /status/search
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        store = MemoryStatusStore()
+        store.batch_upsert(fleet())
+        monkeypatch.setattr(app_module, 'store', store)
+        return app_module.app.test_client()
+
+    def test_cursor_pages(self, client):
+        first = client.get('/status/search?q=garage&match=substring&sort=battery_level&limit=6', headers=HEADERS).get_json()
+        second = client.get(f'/status/search?q=garage&match=substring&sort=battery_level&limit=6&cursor={first["next_cursor"]}',
+                            headers=HEADERS).get_json()
+
+        device_ids = [device['device_id'] for device in first['devices'] + second['devices']]
+        assert device_ids == expected('battery_level', contains='garage')
+        assert second['next_cursor'] is None
+        assert set(first['devices'][0]) == {'device_id', 'timestamp', 'battery_level', 'rssi', 'online'}
+
+    @pytest.mark.parametrize('query', [
+        'q=ki&match=substring', 'sort=name', 'limit=0', 'order=up', 'match=regex', 'cursor=abc',
+    ])
+    def test_invalid_parameters(self, client, query):
+        assert client.get(f'/status/search?{query}', headers=HEADERS).status_code == 400
+
+    @pytest.mark.parametrize('after', [[{'a': 1}, 'x'], [80, ['x']], ['80', 'x'], [True, 'x']])
+    def test_cursor_with_mistyped_values(self, client, after):
+        cursor = app_module.encode_cursor('battery_level', after)
+
+        response = client.get(f'/status/search?sort=battery_level&cursor={cursor}', headers=HEADERS)
+
+        assert response.status_code == 400
+
+    def test_cursor_from_another_sort(self, client):
+        cursor = client.get('/status/search?limit=1&sort=rssi', headers=HEADERS).get_json()['next_cursor']
+
+        response = client.get(f'/status/search?cursor={cursor}', headers=HEADERS)
+
+        assert response.status_code == 400
@@ -0,0 +1,84 @@
+# Unit tests for columnar snapshot export
+
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+import snapshot
+from storage import MemoryStatusStore
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def make_store(count):
+    # Memory store with count devices
+    store = MemoryStatusStore()
+    store.batch_upsert([
+        {
+            "device_id": f"sensor-{i:03d}",
+            "timestamp": "2025-06-19T14:00:00Z",
+            "battery_level": i % 101,
+            "rssi": -40 - i,
+            "online": i % 2 == 0
+        }
+        for i in range(count)
+    ], created_at="2025-06-19T14:00:05")
+    return store
+
+
+class TestWriteSnapshot:
+    # snapshot.write_snapshot
+
+    def test_parquet_partitioned_by_date(self, tmp_path):
+        snapshot_time = datetime(2025, 6, 19, 15, 30, 0, tzinfo=timezone.utc)
+
+        path, count = snapshot.write_snapshot(
+            make_store(25), str(tmp_path), row_group_size=10, snapshot_time=snapshot_time
+        )
+
+        assert count == 25
+        assert path == os.path.join(
+            str(tmp_path), 'device_status', 'snapshot_date=2025-06-19', 'device_status-153000.parquet'
+        )
+        parquet_file = pq.ParquetFile(path)
+        assert parquet_file.metadata.num_row_groups == 3
+        table = parquet_file.read()
+        assert table.column('device_id')[0].as_py() == "sensor-000"
+        assert table.schema.field('battery_level').type == pa.uint8()
+        assert table.column('timestamp')[0].as_py() == datetime(2025, 6, 19, 14, 0, tzinfo=timezone.utc)
+
+    def test_arrow_ipc(self, tmp_path):
+        path, count = snapshot.write_snapshot(make_store(5), str(tmp_path), fmt='arrow')
+
+        table = pa.ipc.open_file(path).read_all()
+        assert table.num_rows == 5
+        assert table.column('online').to_pylist() == [True, False, True, False, True]
+
+    def test_empty_store(self, tmp_path):
+        path, count = snapshot.write_snapshot(MemoryStatusStore(), str(tmp_path))
+
+        assert count == 0
+        assert pq.read_table(path).num_rows == 0
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            snapshot.write_snapshot(make_store(1), str(tmp_path), fmt='csv')
+
+
+class TestSnapshotCommand:
+    # flask snapshot
+
+    def test_command_writes_file(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(app_module, 'store', make_store(3))
+        runner = app_module.app.test_cli_runner()
+
+        result = runner.invoke(args=['snapshot', '--out', str(tmp_path)])
+
+        assert result.exit_code == 0
+        assert 'Wrote 3 devices' in result.output
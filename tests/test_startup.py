@@ -0,0 +1,143 @@
+# Unit tests for start-up warm-up, readiness and connection pooling
+
+import pytest
+import subprocess
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import app as app_module
+import metrics
+from fleet_table import FleetTable
+from health import HealthMonitor
+from registry import DeviceRegistry
+from startup import DeferredListener, Warmup
+from storage import MemoryStatusStore, SQLiteStatusStore
+from tests.conftest import make_device
+
+
+class TestDeferredListener:
+    # Events during a load are replayed after it
+
+    def test_hold_and_release(self):
+        seen = []
+        listener = DeferredListener(seen.append)
+        listener({'n': 1})
+        listener.hold()
+        listener({'n': 2})
+        listener({'n': 3})
+
+        assert seen == [{'n': 1}]
+        listener.release()
+        listener({'n': 4})
+        assert [event['n'] for event in seen] == [1, 2, 3, 4]
+
+    def test_load_does_not_overwrite_newer_reading(self):
+        store = MemoryStatusStore()
+        store.upsert(make_device("d1", battery_level=10))
+        table = FleetTable()
+        listener = DeferredListener(table.upsert)
+        store.add_listener(listener)
+
+        listener.hold()
+        rows = list(store.iterate_all())  # Scan sees the old reading
+        store.upsert(make_device("d1", battery_level=90))
+        for row in rows:
+            table.upsert(row)
+        listener.release()
+
+        assert table.aggregate()['battery_level']['max'] == 90
+
+
+class TestWarmup:
+    # Ordered steps, timings and failures
+
+    def test_runs_steps_in_order(self):
+        calls = []
+        warmup = Warmup()
+        warmup.add('first', lambda: calls.append('first'))
+        warmup.add('second', lambda: calls.append('second'))
+
+        warmup.start(background=True)
+
+        assert warmup.wait(5)
+        assert calls == ['first', 'second']
+        assert list(warmup.status()['steps']) == ['first', 'second']
+
+    def test_failure_stays_not_ready(self):
+        warmup = Warmup()
+        warmup.add('broken', lambda: 1 / 0)
+        warmup.run()
+
+        status = warmup.status()
+        assert status['ready'] is False
+        assert 'division by zero' in status['error']
+
+
+class TestReadiness:
+    # GET /health/ready
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(app_module, 'store', MemoryStatusStore())
+        monkeypatch.setattr(app_module, 'registry', DeviceRegistry(str(tmp_path / 'test.db')))
+        monkeypatch.setattr(app_module, 'ingest_log', None)
+        monkeypatch.setattr(app_module, 'fleet_table', None)
+        monkeypatch.setattr(app_module, 'summary_cache', None)
+        monkeypatch.setattr(app_module, 'MIGRATION_BACKFILL', False)
+        monkeypatch.setattr(app_module, 'warmup', Warmup())
+        monkeypatch.setattr(app_module, 'health_monitor', HealthMonitor(lambda: [], lambda: 0))
+        return app_module.app.test_client()
+
+    def test_not_ready_before_init(self, client):
+        response = client.get('/health/ready')
+
+        assert response.status_code == 503
+        assert response.get_json()['ready'] is False
+        assert client.get('/health').status_code == 200
+
+    def test_ready_after_init(self, client):
+        app_module.init_db()
+        response = client.get('/health/ready')
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert 'statements' in body['warmup']['steps']
+        assert body['import_seconds'] > 0
+
+
+class TestConnectionPool:
+    # SQLiteStatusStore reuses connections and their prepared statements
+
+    def test_connections_are_reused(self, tmp_path):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'), pool_size=2)
+        store.initialize()
+        store.warm_up()
+        metrics.registry.reset()
+
+        for index in range(20):
+            store.upsert(make_device(f"d{index}"))
+            store.get(f"d{index}")
+
+        assert metrics.registry.collect()['counters'].get(('sqlite_connections_total', ()), 0) == 0
+        store.close()
+
+    def test_failed_write_is_rolled_back_before_reuse(self, tmp_path):
+        store = SQLiteStatusStore(str(tmp_path / 'test.db'), pool_size=1)
+        store.initialize()
+        conn = store.connect()
+        conn.execute("DELETE FROM device_status")
+        store.release(conn)
+
+        assert not store.connect().in_transaction
+
+
+def test_numpy_is_not_imported_at_startup(tmp_path):
+    # NumPy loads on the first fleet aggregate, not with the app
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / 'test.db'))
+    output = subprocess.check_output(
+        [sys.executable, '-c', "import sys, app; print('numpy' in sys.modules)"], cwd=REPO_DIR, env=env
+    )
+    assert output.decode().strip() == 'False'
@@ -0,0 +1,209 @@
+# Unit tests for the storage backends
+
+import pytest
+import subprocess
+import sys
+import os
+import time
+
+# Add parent directory to path so we can import from app.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import app as app_module
+from storage import MemoryStatusStore, SQLiteStatusStore, create_store
+from tests.conftest import make_device
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def store(request, tmp_path):
+    # Run each test against both backends
+    if request.param == 'sqlite':
+        backend = SQLiteStatusStore(str(tmp_path / 'test.db'))
+    else:
+        backend = MemoryStatusStore()
+    backend.initialize()
+    yield backend
+    backend.close()
+
+
+class TestStatusStore:
+    # Behaviour shared by every StatusStore implementation
+
+    def test_get_unknown_device(self, store):
+        assert store.get("missing") is None
+
+    def test_upsert_then_get(self, store):
+        store.upsert(make_device("sensor-1", battery_level=55, online=False))
+
+        row = store.get("sensor-1")
+        assert row['device_id'] == "sensor-1"
+        assert row['battery_level'] == 55
+        assert row['rssi'] == -60
+        assert bool(row['online']) == False
+
+    def test_upsert_replaces_existing(self, store):
+        store.upsert(make_device("sensor-1", battery_level=90))
+        store.upsert(make_device("sensor-1", battery_level=10))
+
+        assert store.get("sensor-1")['battery_level'] == 10
+        assert len(list(store.iterate_summary())) == 1
+
+    def test_batch_upsert(self, store):
+        written = store.batch_upsert([make_device(f"sensor-{i}") for i in range(5)])
+
+        assert written == 5
+        assert len(list(store.iterate_summary())) == 5
+
+    def test_get_many(self, store):
+        store.batch_upsert([make_device(f"sensor-{i}", battery_level=i) for i in range(5)])
+
+        rows = store.get_many(["sensor-3", "missing", "sensor-0", "sensor-3"])
+        assert sorted(rows) == ["sensor-0", "sensor-3"]
+        assert rows["sensor-3"]['battery_level'] == 3
+
+    def test_get_many_spans_chunks(self, store):
+        store.batch_upsert([make_device(f"sensor-{i:04d}") for i in range(1200)])
+
+        rows = store.get_many([f"sensor-{i:04d}" for i in range(0, 1300)])
+        assert len(rows) == 1200
+
+    def test_iterate_summary_sorted(self, store):
+        for device_id in ["c-device", "a-device", "b-device"]:
+            store.upsert(make_device(device_id))
+
+        ids = [row['device_id'] for row in store.iterate_summary()]
+        assert ids == ["a-device", "b-device", "c-device"]
+
+    def test_listener_called_on_upsert(self, store):
+        seen = []
+        store.add_listener(lambda data: seen.append(data['device_id']))
+
+        store.upsert(make_device("sensor-1"))
+        store.batch_upsert([make_device("sensor-2"), make_device("sensor-3")])
+
+        assert seen == ["sensor-1", "sensor-2", "sensor-3"]
+
+
+class TestMemoryCheckpoint:
+    # Checkpointing of the in-memory engine
+
+    def test_checkpoint_round_trip(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.db')
+        store = MemoryStatusStore(checkpoint_path=path, checkpoint_interval=None)
+        store.initialize()
+        store.upsert(make_device("sensor-1", battery_level=42))
+
+        assert store.checkpoint() == True
+        assert store.checkpoint() == False  # Nothing changed since last checkpoint
+
+        restored = MemoryStatusStore(checkpoint_path=path, checkpoint_interval=None)
+        restored.initialize()
+        assert restored.get("sensor-1")['battery_level'] == 42
+
+    def test_checkpoint_readable_by_sqlite_store(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.db')
+        store = MemoryStatusStore(checkpoint_path=path, checkpoint_interval=None)
+        store.upsert(make_device("sensor-1"))
+        store.close()
+
+        assert SQLiteStatusStore(path).get("sensor-1")['device_id'] == "sensor-1"
+
+    def test_failed_checkpoint_keeps_the_loop_running(self, tmp_path):
+        path = str(tmp_path / 'missing' / 'checkpoint.db')  # Unwritable until the directory exists
+        store = MemoryStatusStore(checkpoint_path=path, checkpoint_interval=0.01)
+        written = []
+        checkpoint = store.checkpoint
+        store.checkpoint = lambda: written.append(checkpoint())
+        store.initialize()
+        store.upsert(make_device("sensor-1"))
+        time.sleep(0.05)
+
+        os.mkdir(tmp_path / 'missing')
+        deadline = time.monotonic() + 5
+        while True not in written and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert True in written  # Written by the loop, not by close()
+        assert SQLiteStatusStore(path).get("sensor-1")['device_id'] == "sensor-1"
+        store.close()
+
+    def test_sigterm_writes_a_final_checkpoint(self, tmp_path):
+        path = str(tmp_path / 'checkpoint.db')
+        env = dict(os.environ, STORAGE_BACKEND='memory', DATABASE_PATH=path, MEMORY_CHECKPOINT_INTERVAL='3600')
+        script = (
+            "import os, signal, app; app.init_db(); app.store.upsert({'device_id': 'sensor-1', "
+            "'timestamp': '2025-06-19T14:00:00Z', 'battery_level': 80, 'rssi': -60, 'online': True}); "
+            "os.kill(os.getpid(), signal.SIGTERM)"
+        )
+        subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, env=env, timeout=60)
+
+        assert SQLiteStatusStore(path).get("sensor-1")['device_id'] == "sensor-1"
+
+
+class TestCreateStore:
+    # Backend selection from the environment
+
+    def test_default_is_sqlite(self, monkeypatch):
+        monkeypatch.delenv('STORAGE_BACKEND', raising=False)
+        assert isinstance(create_store('x.db'), SQLiteStatusStore)
+
+    def test_memory_backend(self, monkeypatch):
+        monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+        assert isinstance(create_store('x.db'), MemoryStatusStore)
+
+    def test_unknown_backend(self, monkeypatch):
+        monkeypatch.setenv('STORAGE_BACKEND', 'cassandra')
+        with pytest.raises(ValueError):
+            create_store('x.db')
+
+
+class TestEndpointsWithMemoryStore:
+    # The Flask handlers only talk to the StatusStore interface
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        monkeypatch.setattr(app_module, 'store', MemoryStatusStore())
+        return app_module.app.test_client()
+
+    def test_post_get_and_summary(self, client):
+        headers = {'X-API-Key': 'dev-key-123'}
+
+        response = client.post('/status', json=make_device("mem-1", battery_level=33), headers=headers)
+        assert response.status_code == 200
+
+        response = client.get('/status/mem-1', headers=headers)
+        assert response.status_code == 200
+        assert response.get_json()['battery_level'] == 33
+
+        response = client.get('/status/summary', headers=headers)
+        assert response.get_json() == {'devices': [{
+            'device_id': "mem-1",
+            'battery_level': 33,
+            'online': True,
+            'last_update': "2025-06-19T14:00:00Z"
+        }]}
+
+    def test_query_in_request_order(self, client):
+        headers = {'X-API-Key': 'dev-key-123'}
+        for device_id in ["mem-1", "mem-2"]:
+            client.post('/status', json=make_device(device_id), headers=headers)
+
+        response = client.post('/status/query', json={'device_ids': ["mem-2", "nope", "mem-1"]}, headers=headers)
+        body = response.get_json()
+        assert response.status_code == 200
+        assert [device['device_id'] for device in body['devices']] == ["mem-2", "nope", "mem-1"]
+        assert body['devices'][1] == {'device_id': "nope", 'error': 'Device not found'}
+        assert body['not_found'] == ["nope"]
+
+        response = client.get('/status?ids=mem-1,nope', headers=headers)
+        assert response.get_json()['not_found'] == ["nope"]
+        assert response.get_json()['devices'][0]['battery_level'] == 80
+
+    def test_query_validation(self, client, monkeypatch):
+        headers = {'X-API-Key': 'dev-key-123'}
+
+        assert client.post('/status/query', json={'device_ids': "mem-1"}, headers=headers).status_code == 400
+        assert client.get('/status', headers=headers).status_code == 400
+        monkeypatch.setattr(app_module, 'QUERY_MAX_IDS', 2)
+        assert client.post('/status/query', json=["a", "b", "c"], headers=headers).status_code == 413
+        assert client.post('/status/query', json=["a"]).status_code == 401
@@ -0,0 +1,154 @@
+# Unit tests for multi-tenant isolation and quotas
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from storage import MemoryStatusStore
+from tenants import (
+    DEFAULT_TENANT, QuotaExceeded, TenantManager, TokenBucket, create_tenant_manager,
+    parse_quota_overrides, parse_tenant_map
+)
+from tests.conftest import make_device
+
+DEFAULT_KEY = {'X-API-Key': 'dev-key-123'}
+ACME_KEY = {'X-API-Key': 'acme-key'}
+GLOBEX_KEY = {'X-API-Key': 'globex-key'}
+
+
+class TestConfiguration:
+    # Parsing API_KEY_TENANTS and TENANT_QUOTAS
+
+    def test_parse_tenant_map(self):
+        assert parse_tenant_map("a:acme, b:globex,") == {'a': 'acme', 'b': 'globex'}
+        assert parse_tenant_map("") == {}
+
+    def test_tenant_name_must_be_path_safe(self):
+        with pytest.raises(ValueError):
+            parse_tenant_map("a:../etc")
+
+    def test_parse_quota_overrides(self):
+        assert parse_quota_overrides("acme:max_devices=5:ingest_rate=2.5") == {
+            'acme': {'max_devices': 5.0, 'ingest_rate': 2.5}
+        }
+        with pytest.raises(ValueError):
+            parse_quota_overrides("acme:speed=1")
+
+    def test_mapped_keys_must_be_valid(self, monkeypatch):
+        monkeypatch.setenv('API_KEY_TENANTS', 'unknown-key:acme')
+
+        with pytest.raises(ValueError):
+            create_tenant_manager(['dev-key-123'])
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=1, burst=3)
+
+        assert bucket.take(3) == 0
+        assert bucket.take(1) > 0
+        assert bucket.take(10) == float('inf')
+
+
+class TestTenantIsolation:
+    # Each tenant reads and writes its own partition
+
+    @pytest.fixture
+    def client(self, tmp_path, monkeypatch):
+        manager = TenantManager(
+            {'acme-key': 'acme', 'globex-key': 'globex'}, str(tmp_path / 'tenants'),
+            overrides={'globex': {'max_devices': 2, 'ingest_rate': 100, 'ingest_burst': 10}}
+        )
+        monkeypatch.setattr(app_module, 'tenants', manager)
+        monkeypatch.setattr(app_module, 'VALID_API_KEYS', ['dev-key-123', 'acme-key', 'globex-key'])
+        monkeypatch.setattr(app_module, 'store', MemoryStatusStore())
+        monkeypatch.setattr(app_module, 'ingest_log', None)
+        monkeypatch.setattr(app_module, 'fleet_table', None)
+        monkeypatch.setattr(app_module, 'summary_cache', None)
+        self.manager = manager
+        yield app_module.app.test_client()
+        manager.close()
+
+    def test_summary_scoped_to_tenant(self, client):
+        client.post('/status', json=make_device("shared-id", battery_level=10), headers=ACME_KEY)
+        client.post('/status', json=make_device("shared-id", battery_level=90), headers=DEFAULT_KEY)
+        client.post('/status', json=make_device("acme-only"), headers=ACME_KEY)
+
+        acme = client.get('/status/summary', headers=ACME_KEY).get_json()['devices']
+        default = client.get('/status/summary', headers=DEFAULT_KEY).get_json()['devices']
+        assert [device['device_id'] for device in acme] == ["acme-only", "shared-id"]
+        assert [device['battery_level'] for device in default] == [90]
+        assert client.get('/status/acme-only', headers=GLOBEX_KEY).status_code == 404
+
+    def test_partition_is_separate_file(self, client, tmp_path):
+        client.post('/status', json=make_device("d1"), headers=ACME_KEY)
+
+        assert os.path.exists(tmp_path / 'tenants' / 'acme.db')
+        assert self.manager.partition('acme').store.count() == 1
+
+    def test_registry_scoped_to_tenant(self, client):
+        client.put('/devices/d1', json={'groups': ['site-1']}, headers=ACME_KEY)
+
+        assert client.get('/devices/d1', headers=ACME_KEY).status_code == 200
+        assert client.get('/devices/d1', headers=GLOBEX_KEY).status_code == 404
+
+    def test_device_quota(self, client):
+        for device_id in ["d1", "d2"]:
+            assert client.post('/status', json=make_device(device_id), headers=GLOBEX_KEY).status_code == 200
+
+        # Updating a known device is fine, a third device is not
+        assert client.post('/status', json=make_device("d1"), headers=GLOBEX_KEY).status_code == 200
+        response = client.post('/status', json=make_device("d3"), headers=GLOBEX_KEY)
+        assert response.status_code == 403
+        assert client.post('/status', json=make_device("d3"), headers=ACME_KEY).status_code == 200
+
+    def test_ingest_rate_limit(self, client):
+        readings = [make_device("d1")] * 11
+        response = client.post('/status/batch', json=readings, headers=GLOBEX_KEY)
+
+        assert response.status_code == 429
+        assert response.get_json()['error'] == 'Tenant globex ingest rate exceeded'
+
+
+class TestMemoryPartitions:
+    # With STORAGE_BACKEND=memory each partition file holds the tenant's
+    # checkpoint and registry
+
+    def test_checkpoint_keeps_tenant_registries(self, tmp_path, monkeypatch, configure_app):
+        monkeypatch.setenv('STORAGE_BACKEND', 'memory')
+        monkeypatch.setenv('MEMORY_CHECKPOINT_INTERVAL', '0')
+        manager = TenantManager({'acme-key': 'acme', 'globex-key': 'globex'}, str(tmp_path / 'tenants'))
+        client = configure_app(tenants=manager, VALID_API_KEYS=['dev-key-123', 'acme-key', 'globex-key'])
+        for headers, battery_level in [(ACME_KEY, 10), (GLOBEX_KEY, 90)]:
+            client.put('/devices/d1', json={'name': 'Pump', 'groups': ['site-1']}, headers=headers)
+            client.post('/status', json=make_device("d1", battery_level=battery_level), headers=headers)
+
+        for tenant in manager.tenant_names():
+            assert manager.partition(tenant).store.checkpoint()
+
+        for headers, battery_level in [(ACME_KEY, 10), (GLOBEX_KEY, 90)]:
+            assert client.get('/devices/d1', headers=headers).get_json()['name'] == 'Pump'
+            assert client.get('/groups/site-1', headers=headers).get_json()['min_battery'] == battery_level
+        manager.close()
+        reopened = TenantManager({'acme-key': 'acme'}, str(tmp_path / 'tenants'))
+        assert reopened.partition('acme').store.get("d1")['battery_level'] == 10
+        assert reopened.partition('acme').registry.get("d1")['name'] == 'Pump'
+        reopened.close()
+
+
+class TestInflightLimit:
+    # TENANT_MAX_INFLIGHT caps concurrent requests per tenant
+
+    def test_enter_and_leave(self):
+        manager = TenantManager(defaults={'max_inflight': 1})
+        manager.enter('acme')
+
+        with pytest.raises(QuotaExceeded):
+            manager.enter('acme')
+        manager.enter('globex')  # Other tenants are unaffected
+        manager.leave('acme')
+        manager.enter('acme')
+
+    def test_unmapped_key_is_default_tenant(self):
+        assert TenantManager({'k': 'acme'}).tenant_for_key('other') == DEFAULT_TENANT